@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+import httpx
+
+from app.adapters.http_pool import HttpClientPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Handle:
+    version: str
+    name: str | None  # None: registration failed, retry after expires_at
+    expires_at: float
+
+
+class GeminiContextCache:
+    """
+    Registers each tenant's static prompt prefix as Gemini cached content (v1beta
+    `cachedContents`), one handle per (tenant, model). A handle is reused while the tenant
+    settings version is unchanged, its TTL is extended shortly before it expires, and a new
+    version replaces it (the old one is deleted). Prefixes below `min_tokens` (the API minimum)
+    are not registered, and failed registrations are retried only after `retry_seconds`.
+    Per process; a handle is just a name, so losing it only costs a re-registration.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        http: HttpClientPool | None = None,
+        ttl_seconds: int = 3600,
+        min_tokens: int = 1024,
+        refresh_margin_seconds: float = 120.0,
+        retry_seconds: float = 300.0,
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta",
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.api_key = api_key
+        self.http = http or HttpClientPool()
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_seconds = retry_seconds
+        self.base_url = base_url
+        self.clock = clock
+        self._handles: Dict[Tuple[str, str], _Handle] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.deleted = 0
+        self.failures = 0
+
+    def eligible(self, prefix: str) -> bool:
+        return len(prefix) // 4 >= self.min_tokens
+
+    async def handle(self, tenant_id: str, model: str, version: str, prefix: str) -> str | None:
+        """
+        Cached-content name to send with the request instead of `prefix`, or None to send it inline.
+        """
+        if not self.api_key or not self.eligible(prefix):
+            return None
+        key = (tenant_id, model)
+        async with self._lock(key):
+            current = self._handles.get(key)
+            now = self.clock()
+            if current is not None and current.version == version:
+                if current.name is None:
+                    return None if now < current.expires_at else await self._register(key, version, prefix)
+                if now < current.expires_at - self.refresh_margin_seconds:
+                    self.reused += 1
+                    return current.name
+                if now < current.expires_at and await self._extend(current):
+                    return current.name
+            if current is not None and current.name is not None:
+                await self._delete(current.name)
+            return await self._register(key, version, prefix)
+
+    def forget(self, tenant_id: str, model: str) -> None:
+        """
+        Drop a handle the API no longer accepts; the next call registers the prefix again.
+        """
+        self._handles.pop((tenant_id, model), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "handles": sum(1 for handle in self._handles.values() if handle.name is not None),
+            "created": self.created,
+            "reused": self.reused,
+            "refreshed": self.refreshed,
+            "deleted": self.deleted,
+            "failures": self.failures,
+        }
+
+    def _lock(self, key: Tuple[str, str]) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._locks, self._loop = {}, loop
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def _register(self, key: Tuple[str, str], version: str, prefix: str) -> str | None:
+        body = {
+            "model": f"models/{key[1]}",
+            "systemInstruction": {"parts": [{"text": prefix}]},
+            "ttl": f"{self.ttl_seconds}s",
+        }
+        try:
+            response = await self.http.client.post(
+                f"{self.base_url}/cachedContents", params={"key": self.api_key}, json=body
+            )
+            response.raise_for_status()
+            name = response.json()["name"]
+        except (httpx.HTTPError, KeyError, ValueError) as exc:
+            self.failures += 1
+            logger.warning("Gemini context cache registration failed for tenant=%s: %s", key[0], exc)
+            self._handles[key] = _Handle(version, None, self.clock() + self.retry_seconds)
+            return None
+        self.created += 1
+        self._handles[key] = _Handle(version, name, self.clock() + self.ttl_seconds)
+        return name
+
+    async def _extend(self, handle: _Handle) -> bool:
+        try:
+            response = await self.http.client.patch(
+                f"{self.base_url}/{handle.name}",
+                params={"key": self.api_key, "updateMask": "ttl"},
+                json={"ttl": f"{self.ttl_seconds}s"},
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            logger.warning("Gemini context cache refresh failed for %s: %s", handle.name, exc)
+            return False
+        self.refreshed += 1
+        handle.expires_at = self.clock() + self.ttl_seconds
+        return True
+
+    async def _delete(self, name: str) -> None:
+        try:
+            response = await self.http.client.delete(f"{self.base_url}/{name}", params={"key": self.api_key})
+            response.raise_for_status()
+            self.deleted += 1
+        except httpx.HTTPError as exc:
+            # It expires on its own; nothing references it any more
+            logger.info("Gemini context cache delete failed for %s: %s", name, exc)
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIORITIES = ("chat", "ingest")
+
+
+class ProviderUnavailableError(Exception):
+    """
+    Raised without calling the provider while the circuit breaker is open.
+    """
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket holding at most one minute of budget. A rate of 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.clock = clock
+        self._updated = clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def available(self) -> float:
+        if self.unlimited:
+            return float("inf")
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self.tokens
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """
+        Seconds until `amount` can be taken while leaving `reserve` (fraction of capacity) untouched.
+        """
+        if self.unlimited:
+            return 0.0
+        floor = reserve * self.capacity
+        amount = min(amount, self.capacity - floor)
+        return max(0.0, (amount + floor - self.available()) / self.rate)
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive upstream failures; after `reset_seconds`
+    one half-open probe is let through, and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_seconds: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open" and self.clock() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == "closed"
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """
+        The caller gave up on a call (cancelled) before it said anything about upstream health;
+        a half-open circuit lets the next call probe instead.
+        """
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Circuit opened after %s consecutive failures", self.failures)
+            self.state = "open"
+            self.opened_at = self.clock()
+            self._probing = False
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+class ProviderGovernor:
+    """
+    Client-side quota and health guard for one provider quota (e.g. Gemini generate or embeddings).
+    Requests-per-minute and tokens-per-minute buckets gate every call; "ingest" callers may not
+    dip into the `chat_reserve` share of either bucket, so bulk uploads cannot starve live chat.
+    Retryable failures back off exponentially with full jitter (Retry-After is honoured and pauses
+    all callers), and a circuit breaker fails fast while the upstream keeps failing.
+    """
+
+    def __init__(
+        self,
+        name: str = "gemini",
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        chat_reserve: float = 0.3,
+        max_retries: int = 2,
+        base_backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.chat_reserve = chat_reserve
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds, clock)
+        self.clock = clock
+        self._paused_until = 0.0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    async def acquire(self, priority: str = "chat", tokens: int = 0) -> None:
+        """
+        Wait until both buckets (and any Retry-After pause) allow the call, then take from them.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        reserve = self.chat_reserve if priority == "ingest" else 0.0
+        throttled = False
+        while True:
+            wait = max(
+                self._paused_until - self.clock(),
+                self.requests.wait_time(1, reserve),
+                self.tokens.wait_time(tokens, reserve),
+            )
+            if wait <= 0:
+                break
+            throttled = True
+            await asyncio.sleep(wait)
+        self.throttled += throttled
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        priority: str = "chat",
+        tokens: int = 0,
+        retryable: Callable[[Exception], bool] = is_retryable,
+    ) -> T:
+        """
+        Run `fn` under the quota, retrying retryable failures. Raises ProviderUnavailableError
+        when the circuit is open, otherwise the last error once retries are exhausted.
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise ProviderUnavailableError(f"{self.name} circuit is open")
+            try:
+                await self.acquire(priority, tokens)
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self.calls += 1
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                # Deadline, retrieval budget or a lost hedge: the outcome is unknown, not a failure
+                self.breaker.release_probe()
+                raise
+            except Exception as exc:
+                if not retryable(exc):
+                    self.breaker.record_success()  # upstream answered; the request itself was bad
+                    raise
+                retry_after = self._retry_after(exc)
+                if retry_after is not None:
+                    # Rate limited: pause every caller instead of counting it against upstream health
+                    self._paused_until = max(self._paused_until, self.clock() + retry_after)
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                if attempt == self.max_retries or self.breaker.state == "open":
+                    raise
+                self.retries += 1
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2**attempt))
+                logger.warning("%s call failed (%s); retry %s in %.2fs", self.name, exc, attempt + 1, delay)
+                await asyncio.sleep(max(delay, retry_after or 0.0))
+                continue
+            self.breaker.record_success()
+            return result
+        raise AssertionError("unreachable")  # pragma: no cover - loop always returns or raises
+
+    @staticmethod
+    def _retry_after(exc: Exception) -> float | None:
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+            try:
+                return float(exc.response.headers.get("retry-after", 1.0))
+            except ValueError:
+                return 1.0
+        return None
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": self.requests.per_minute,
+            "tokens_per_minute": self.tokens.per_minute,
+            "requests_available": None if self.requests.unlimited else round(self.requests.available(), 1),
+            "tokens_available": None if self.tokens.unlimited else round(self.tokens.available(), 1),
+            "chat_reserve": self.chat_reserve,
+            "paused_for_seconds": round(max(0.0, self._paused_until - self.clock()), 2),
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,59 @@
+import asyncio
+import importlib.util
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientPool:
+    """
+    One long-lived httpx.AsyncClient shared by the provider adapters, so chat turns and
+    embedding batches reuse pooled keep-alive connections instead of a new TCP+TLS handshake
+    per call. The client is created on first use and closed on app shutdown.
+    HTTP/2 is used only when the optional `h2` package is installed.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        timeout: float = 20.0,
+        http2: bool = True,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.info("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1 keep-alive")
+        self.transport = transport  # tests inject httpx.MockTransport here
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        The shared client. Must be used from inside the event loop; pooled connections are bound
+        to the loop that opened them, so a new loop (tests, scripts) gets a fresh client.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout, http2=self.http2, transport=self.transport
+            )
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
@@ -1,52 +1,108 @@
+import asyncio
+import json
 import logging
-from typing import Any, Dict
+import time
+from typing import Any, AsyncIterator, Dict, Tuple
 
 import httpx
 from fastapi import HTTPException
 from starlette import status
 
+from app.adapters.gemini_cache import GeminiContextCache
+from app.adapters.governor import ProviderGovernor, ProviderUnavailableError
+from app.adapters.http_pool import HttpClientPool
+from app.utils.histogram import LatencyHistogram
+
 logger = logging.getLogger(__name__)
 
 
+class _Attempt:
+    """
+    One request of a hedged call; `lost` is set when it is cancelled because the other won.
+    """
+
+    def __init__(self) -> None:
+        self.lost = False
+
+
 class GeminiClient:
-    def __init__(self, api_key: str, model: str = "gemini-2.5-flash") -> None:
+    """
+    Gemini generateContent client. generate() hedges slow calls: when the primary request has
+    not answered within the hedge threshold (the `hedge_percentile` latency of the primary
+    model, from its histogram; `hedge_default_delay` until `hedge_min_samples` are recorded),
+    a second request goes to `fallback_model` (or the same model), the first answer wins and
+    the other request is cancelled. Both requests go through the governor quota.
+    Callers may pass the prompt's static `prefix` as (version, text); with a `context_cache`
+    it is then sent as a Gemini cached-content handle and only the rest of the prompt inline.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-2.5-flash",
+        http: HttpClientPool | None = None,
+        governor: ProviderGovernor | None = None,
+        fallback_model: str | None = None,
+        hedging: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_default_delay: float = 3.0,
+        hedge_min_samples: int = 20,
+        context_cache: GeminiContextCache | None = None,
+    ) -> None:
         self.api_key = api_key
         self.model = model
+        self.http = http or HttpClientPool()
+        self.governor = governor or ProviderGovernor("gemini-generate")
         self.base_url = "https://generativelanguage.googleapis.com/v1"
+        self.fallback_model = fallback_model or None
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.context_cache = context_cache
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
         if not self.api_key:
             logger.warning("Gemini API key is not set. Requests will be skipped.")
 
-    async def generate(self, prompt: str, metadata: Dict[str, Any] | None = None) -> str:
+    def _payload(self, prompt: str, metadata: Dict[str, Any] | None) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"contents": [{"parts": [{"text": prompt}]}]}
+        if metadata:
+            payload["safetySettings"] = metadata.get("safetySettings", [])
+        return payload
+
+    async def generate(
+        self, prompt: str, metadata: Dict[str, Any] | None = None, prefix: Tuple[str, str] | None = None
+    ) -> str:
         """
         Call Gemini generateContent endpoint.
         """
         if not self.api_key:
             return "LLM is not configured yet. Please set GEMINI_API_KEY."
 
-        url = f"{self.base_url}/models/{self.model}:generateContent"
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        if metadata:
-            payload["safetySettings"] = metadata.get("safetySettings", [])
-
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.post(url, params={"key": self.api_key}, json=payload)
-                response.raise_for_status()
-                data = response.json()
-                candidates = data.get("candidates", [])
-                if not candidates:
-                    logger.error("Gemini returned empty candidates: %s", data)
-                    raise HTTPException(
-                        status_code=status.HTTP_502_BAD_GATEWAY,
-                        detail="Gemini returned no candidates",
-                    )
-                parts = candidates[0].get("content", {}).get("parts", [])
-                if not parts:
-                    raise HTTPException(
-                        status_code=status.HTTP_502_BAD_GATEWAY,
-                        detail="Gemini returned no parts",
-                    )
-                return parts[0].get("text", "")
+            data = await self._hedged_call(prompt, metadata, prefix, tokens=len(prompt) // 4 + 1)
+            candidates = data.get("candidates", [])
+            if not candidates:
+                logger.error("Gemini returned empty candidates: %s", data)
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail="Gemini returned no candidates",
+                )
+            parts = candidates[0].get("content", {}).get("parts", [])
+            if not parts:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail="Gemini returned no parts",
+                )
+            return parts[0].get("text", "")
+        except ProviderUnavailableError as exc:
+            logger.warning("Gemini call skipped: %s", exc)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="LLM temporarily unavailable",
+            ) from exc
         except httpx.HTTPStatusError as exc:
             logger.error("Gemini HTTP error: %s", exc.response.text)
             raise HTTPException(
@@ -59,3 +115,206 @@ class GeminiClient:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="LLM failure",
             ) from exc
+
+    def hedge_delay(self) -> float | None:
+        """
+        Seconds to wait for the primary model before hedging, or None when hedging is off.
+        """
+        if not self.hedging:
+            return None
+        histogram = self._histogram(self.model)
+        if histogram.total < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return histogram.percentile(self.hedge_percentile)
+
+    def latency_stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "models": {model: histogram.snapshot() for model, histogram in self.latency.items()},
+            "hedge_threshold_ms": round(delay * 1000, 1) if delay is not None else None,
+            "fallback_model": self.fallback_model,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    def _histogram(self, model: str) -> LatencyHistogram:
+        histogram = self.latency.get(model)
+        if histogram is None:
+            histogram = self.latency[model] = LatencyHistogram()
+        return histogram
+
+    async def _target(
+        self, model: str, prompt: str, metadata: Dict[str, Any] | None, prefix: Tuple[str, str] | None
+    ) -> Tuple[str, Dict[str, Any], str | None]:
+        """
+        Base URL, payload and context-cache handle (if any) for one call to `model`.
+        """
+        tenant_id = (metadata or {}).get("tenant_id")
+        if self.context_cache is not None and prefix and tenant_id and prompt.startswith(prefix[1]):
+            version, text = prefix
+            handle = await self.context_cache.handle(tenant_id, model, version, text)
+            if handle is not None:
+                payload = self._payload(prompt[len(text) :], metadata)
+                payload["cachedContent"] = handle
+                return self.context_cache.base_url, payload, handle
+        return self.base_url, self._payload(prompt, metadata), None
+
+    def _stale_handle(self, exc: httpx.HTTPStatusError, handle: str | None, tenant_id: str, model: str) -> bool:
+        """
+        A request carrying a cached-content handle was rejected (expired or deleted upstream):
+        forget the handle so the caller can resend the prompt inline.
+        """
+        if handle is None or exc.response.status_code not in (400, 403, 404):
+            return False
+        logger.warning("Gemini rejected cached content %s (%s); resending inline", handle, exc.response.status_code)
+        self.context_cache.forget(tenant_id, model)
+        return True
+
+    async def _call_model(
+        self,
+        model: str,
+        prompt: str,
+        metadata: Dict[str, Any] | None,
+        prefix: Tuple[str, str] | None,
+        tokens: int,
+        attempt: _Attempt | None = None,
+    ) -> Dict[str, Any]:
+        base_url, payload, handle = await self._target(model, prompt, metadata, prefix)
+        url = f"{base_url}/models/{model}:generateContent"
+        histogram = self._histogram(model)
+
+        async def post() -> httpx.Response:
+            start = time.perf_counter()
+            try:
+                response = await self.http.client.post(url, params={"key": self.api_key}, json=payload)
+            except asyncio.CancelledError:
+                if attempt is not None and attempt.lost:
+                    histogram.record(time.perf_counter() - start)  # lost a hedge race: at least this slow
+                raise
+            response.raise_for_status()
+            histogram.record(time.perf_counter() - start)
+            return response
+
+        try:
+            response = await self.governor.call(post, priority="chat", tokens=tokens)
+        except httpx.HTTPStatusError as exc:
+            if not self._stale_handle(exc, handle, (metadata or {}).get("tenant_id"), model):
+                raise
+            return await self._call_model(model, prompt, metadata, None, tokens, attempt)
+        return response.json()
+
+    async def _hedged_call(
+        self, prompt: str, metadata: Dict[str, Any] | None, prefix: Tuple[str, str] | None, tokens: int
+    ) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._call_model(self.model, prompt, metadata, prefix, tokens)
+        attempts: Dict[asyncio.Task, _Attempt] = {}
+
+        def start(model: str) -> asyncio.Task:
+            attempt = _Attempt()
+            task = asyncio.ensure_future(self._call_model(model, prompt, metadata, prefix, tokens, attempt))
+            attempts[task] = attempt
+            return task
+
+        primary = start(self.model)
+        pending = {primary}
+        won = False
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            self.hedges += 1
+            hedge_model = self.fallback_model or self.model
+            logger.info("Gemini %s slower than %.2fs; hedging with %s", self.model, delay, hedge_model)
+            hedge = start(hedge_model)
+            pending.add(hedge)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        won = True
+                        self.hedge_wins += task is hedge
+                        return task.result()
+                    error = task.exception()
+            raise error  # both attempts failed
+        finally:
+            for task in pending:
+                # Only a request that lost the race says something about this model's latency;
+                # one cancelled with the whole call (deadline, disconnect) does not
+                attempts[task].lost = won
+                task.cancel()
+
+    async def stream_generate(
+        self, prompt: str, metadata: Dict[str, Any] | None = None, prefix: Tuple[str, str] | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Call Gemini streamGenerateContent (SSE) and yield text deltas as they arrive.
+        Retries and rate limits apply to opening the stream; errors map like generate().
+        """
+        if not self.api_key:
+            yield "LLM is not configured yet. Please set GEMINI_API_KEY."
+            return
+
+        try:
+            response = await self._open_stream(prompt, metadata, prefix)
+        except ProviderUnavailableError as exc:
+            logger.warning("Gemini stream skipped: %s", exc)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="LLM temporarily unavailable",
+            ) from exc
+        except httpx.HTTPStatusError as exc:
+            logger.error("Gemini HTTP error: %s", exc.response.text)
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Gemini request failed",
+            ) from exc
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.exception("Gemini stream failed to open")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="LLM failure",
+            ) from exc
+
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[5:].strip() or "{}")
+                for candidate in chunk.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+        except httpx.HTTPError as exc:
+            logger.error("Gemini stream interrupted: %s", exc)
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Gemini stream interrupted",
+            ) from exc
+        finally:
+            await response.aclose()
+
+    async def _open_stream(
+        self, prompt: str, metadata: Dict[str, Any] | None, prefix: Tuple[str, str] | None
+    ) -> httpx.Response:
+        base_url, payload, handle = await self._target(self.model, prompt, metadata, prefix)
+        url = f"{base_url}/models/{self.model}:streamGenerateContent"
+
+        async def open_stream() -> httpx.Response:
+            client = self.http.client
+            request = client.build_request("POST", url, params={"key": self.api_key, "alt": "sse"}, json=payload)
+            response = await client.send(request, stream=True)
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+            response.raise_for_status()
+            return response
+
+        try:
+            return await self.governor.call(open_stream, priority="chat", tokens=len(prompt) // 4 + 1)
+        except httpx.HTTPStatusError as exc:
+            if not self._stale_handle(exc, handle, (metadata or {}).get("tenant_id"), self.model):
+                raise
+            return await self._open_stream(prompt, metadata, None)
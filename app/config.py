@@ -21,11 +21,103 @@ class Settings(BaseSettings):
     )
     auto_create_tables: bool = True
     followup_poll_interval_seconds: int = Field(default=15, description="Scheduler polling interval for follow-ups")
+    http_max_connections: int = Field(default=100, description="Shared provider HTTP pool: max open connections")
+    http_max_keepalive_connections: int = Field(default=20, description="Idle keep-alive connections kept in the pool")
+    http_keepalive_expiry_seconds: float = Field(default=30.0, description="Idle time before a pooled connection closes")
+    http_connect_timeout_seconds: float = Field(default=5.0, description="Provider connect timeout")
+    http_timeout_seconds: float = Field(default=20.0, description="Provider read/write/pool timeout")
+    http2_enabled: bool = Field(default=True, description="Use HTTP/2 to providers when the h2 package is installed")
+    llm_model: str = Field(default="gemini-2.5-flash", description="Gemini model for chat replies")
+    llm_fallback_model: str = Field(default="", description="Model used for hedged requests; empty = same model")
+    llm_hedge_enabled: bool = Field(default=True, description="Send a second request when the first one is slow")
+    llm_hedge_percentile: float = Field(default=0.95, description="Primary latency percentile that triggers a hedge")
+    llm_hedge_default_ms: int = Field(default=3000, description="Hedge threshold until enough latency samples exist")
+    llm_hedge_min_samples: int = Field(default=20, description="Samples needed before the percentile threshold is used")
+    gemini_context_cache_enabled: bool = Field(
+        default=True, description="Register each tenant's static prompt prefix as Gemini cached content"
+    )
+    gemini_context_cache_ttl_seconds: int = Field(default=3600, description="TTL of registered cached content")
+    gemini_context_cache_min_tokens: int = Field(
+        default=1024, description="Smallest prefix (estimated tokens) worth registering; the API rejects smaller"
+    )
+    llm_requests_per_minute: int = Field(default=1000, description="Client-side Gemini generate RPM budget; 0 = unlimited")
+    llm_tokens_per_minute: int = Field(default=1000000, description="Client-side Gemini generate TPM budget; 0 = unlimited")
+    embedding_requests_per_minute: int = Field(default=1500, description="Client-side embedding RPM budget; 0 = unlimited")
+    embedding_tokens_per_minute: int = Field(default=1000000, description="Client-side embedding TPM budget; 0 = unlimited")
+    provider_chat_reserve: float = Field(default=0.3, description="Share of each budget that KB ingestion may not use")
+    provider_max_retries: int = Field(default=2, description="Retries of 429/5xx/transport failures per provider call")
+    circuit_failure_threshold: int = Field(default=5, description="Consecutive upstream failures that open the circuit")
+    circuit_reset_seconds: float = Field(default=30.0, description="Open-circuit time before a probe request")
     embedding_provider: str = Field(default="gemini", description="gemini|local")
     embedding_model_name: str = Field(
         default="models/embedding-001",
         description="Gemini model name or local sentence-transformers model id",
     )
+    embedding_concurrency: int = Field(default=4, description="Gemini embedding batches in flight at once")
+    embedding_batch_size: int = Field(default=100, description="Max texts per Gemini embedding batch (API limit 100)")
+    embedding_batch_chars: int = Field(default=20000, description="Approximate character budget per embedding batch")
+    embedding_local_workers: int = Field(default=1, description="Worker threads for local sentence-transformers encoding")
+    embedding_local_queue_size: int = Field(default=8, description="Pending local encode jobs before callers wait")
+    embedding_local_batch_size: int = Field(default=32, description="Texts per local encode job")
+    embedding_batcher_enabled: bool = Field(default=True, description="Coalesce concurrent query embeddings")
+    embedding_batcher_max_batch: int = Field(default=32, description="Flush a coalesced batch at this size")
+    embedding_batcher_max_wait_ms: float = Field(default=5.0, description="Max wait before flushing a partial batch")
+    embedding_cache_enabled: bool = Field(default=True, description="Reuse embeddings of identical text")
+    embedding_cache_size: int = Field(default=10000, description="In-memory embedding cache entries")
+    embedding_cache_persist: bool = Field(default=True, description="Also persist ingest embeddings in the DB")
+    embedding_cache_retention_days: float = Field(
+        default=30.0, description="Delete persisted cache embeddings older than this; 0 = keep forever"
+    )
+    rag_top_k: int = Field(default=5, description="Number of KB chunks injected into the prompt")
+    vector_cache_max_mb: int = Field(default=512, description="Memory budget for cached per-tenant vector indexes")
+    ann_backend: str = Field(default="ivf", description="ivf|none; approximate search for large tenants")
+    ann_min_items: int = Field(default=20000, description="Tenants with fewer chunks use exact search")
+    ann_nlist: int = Field(default=0, description="IVF list count; 0 = 4*sqrt(n)")
+    ann_nprobe: int = Field(default=32, description="IVF lists probed per query (recall vs latency)")
+    embedding_quantization: str = Field(default="none", description="none|float16|int8 for cached vector indexes")
+    embedding_storage_dtype: str = Field(default="float32", description="float32|float16|int8 for stored KB vectors")
+    quantization_rescore_candidates: int = Field(
+        default=50, description="Shortlist size rescored at stored precision when quantization is on"
+    )
+    hybrid_search: bool = Field(default=True, description="Fuse BM25 lexical ranking with vector similarity")
+    hybrid_candidates: int = Field(default=50, description="Rows taken from each ranking before fusion")
+    rrf_k: int = Field(default=60, description="Reciprocal-rank fusion constant")
+    rag_stream_block_size: int = Field(
+        default=2048, description="Rows per block when loading or stream-scanning a tenant KB"
+    )
+    rag_stream_recheck_seconds: float = Field(
+        default=600.0, description="How long a tenant too big for the vector cache stays on the streaming scan"
+    )
+    query_cache_enabled: bool = Field(default=True, description="Cache query embeddings and top-k results per tenant")
+    query_cache_size: int = Field(default=512, description="Cached queries per tenant")
+    query_cache_ttl_seconds: float = Field(default=300.0, description="TTL of cached query embeddings/results")
+    response_cache_enabled: bool = Field(
+        default=True, description="Allow tenants to opt in to exact-match LLM reply caching (performance settings)"
+    )
+    semantic_cache_enabled: bool = Field(
+        default=True, description="Answer near-duplicate questions from cache unless a tenant opts out"
+    )
+    prompt_token_ceiling: int = Field(default=8000, description="Default max estimated prompt tokens per turn")
+    prompt_context_share: float = Field(
+        default=0.4, description="Share of the prompt budget (after persona/SOP) that KB context may use"
+    )
+    chat_debounce_enabled: bool = Field(default=True, description="Merge rapid-fire messages (typing_debounce_ms)")
+    chat_debounce_channels: str = Field(
+        default="whatsapp", description="Comma-separated channels whose requests are debounced"
+    )
+    chat_debounce_max_wait_ms: int = Field(default=5000, description="Longest a burst of messages is held back")
+    admission_enabled: bool = Field(default=True, description="Cap and fairly queue concurrent chat turns per tenant")
+    admission_max_concurrency: int = Field(default=32, description="Chat turns running at once across all tenants")
+    admission_tenant_concurrency: int = Field(default=8, description="Default chat turns one tenant may run at once")
+    admission_max_queue: int = Field(default=32, description="Queued chat turns per tenant before 429")
+    admission_max_wait_ms: int = Field(default=10000, description="Longest a chat turn waits for a slot before 429")
+    chat_deadline_ms: int = Field(default=25000, description="Default end-to-end chat deadline; 0 = none")
+    chat_context_budget_share: float = Field(
+        default=0.35, description="Fraction of the deadline retrieval may use before the turn continues without it"
+    )
+    chat_max_detached_retrievals: int = Field(
+        default=16, description="Background retrieval runs before new turns skip retrieval; 0 = no cap"
+    )
 
     @field_validator("cors_origins", mode="before")
     @classmethod
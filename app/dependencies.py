@@ -1,34 +1,173 @@
+from app.adapters.gemini_cache import GeminiContextCache
+from app.adapters.governor import ProviderGovernor
+from app.adapters.http_pool import HttpClientPool
 from app.adapters.llm_gemini import GeminiClient
 from app.config import settings
 from app.db import get_session
 from app.db import SessionLocal
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
 from app.services.embeddings import EmbeddingClient
 from app.services.followup import FollowUpService
 from app.services.ingest import IngestService
 from app.services.orchestrator import Orchestrator
 from app.services.post_processing import PostProcessor
 from app.services.prompt import PromptBuilder
+from app.services.query_cache import QueryCache
 from app.services.rag import RAGService
+from app.services.response_cache import ResponseCache
 from app.services.scheduler import FollowUpScheduler
+from app.services.semantic_cache import SemanticCache
 from app.services.tenant import TenantService
+from app.services.vector_cache import VectorIndexCache
 from app.services.contacts import ContactService
+from app.services.debounce import ChatDebouncer
+from app.services.admission import AdmissionController
 from app.services.sop import SopStateMachine, SopStateService
 
 # Shared singletons for now; swap with DI container later.
+http_pool = HttpClientPool(
+    max_connections=settings.http_max_connections,
+    max_keepalive_connections=settings.http_max_keepalive_connections,
+    keepalive_expiry=settings.http_keepalive_expiry_seconds,
+    connect_timeout=settings.http_connect_timeout_seconds,
+    timeout=settings.http_timeout_seconds,
+    http2=settings.http2_enabled,
+)
+_governor_options = dict(
+    chat_reserve=settings.provider_chat_reserve,
+    max_retries=settings.provider_max_retries,
+    failure_threshold=settings.circuit_failure_threshold,
+    reset_seconds=settings.circuit_reset_seconds,
+)
+llm_governor = ProviderGovernor(
+    "gemini-generate",
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    **_governor_options,
+)
+embedding_governor = ProviderGovernor(
+    "gemini-embeddings",
+    requests_per_minute=settings.embedding_requests_per_minute,
+    tokens_per_minute=settings.embedding_tokens_per_minute,
+    **_governor_options,
+)
+embedding_cache = (
+    EmbeddingCache(
+        session_factory=SessionLocal if settings.embedding_cache_persist else None,
+        max_entries=settings.embedding_cache_size,
+        retention_days=settings.embedding_cache_retention_days,
+    )
+    if settings.embedding_cache_enabled
+    else None
+)
 embedding_client = EmbeddingClient(
     api_key=settings.gemini_api_key,
     model=settings.embedding_model_name,
     provider=settings.embedding_provider,
+    cache=embedding_cache,
+    http=http_pool,
+    governor=embedding_governor,
+    max_concurrency=settings.embedding_concurrency,
+    max_batch_size=settings.embedding_batch_size,
+    max_batch_chars=settings.embedding_batch_chars,
+    local_workers=settings.embedding_local_workers,
+    local_queue_size=settings.embedding_local_queue_size,
+    local_batch_size=settings.embedding_local_batch_size,
+)
+embedding_batcher = (
+    EmbeddingBatcher(
+        embedding_client,
+        max_batch_size=settings.embedding_batcher_max_batch,
+        max_wait_ms=settings.embedding_batcher_max_wait_ms,
+    )
+    if settings.embedding_batcher_enabled
+    else None
+)
+query_cache = (
+    QueryCache(max_entries_per_tenant=settings.query_cache_size, ttl_seconds=settings.query_cache_ttl_seconds)
+    if settings.query_cache_enabled
+    else None
+)
+vector_index_cache = VectorIndexCache(max_bytes=settings.vector_cache_max_mb * 1024 * 1024)
+rag_service = RAGService(
+    embedding_client,
+    default_top_k=settings.rag_top_k,
+    index_cache=vector_index_cache,
+    ann_backend=settings.ann_backend,
+    ann_min_items=settings.ann_min_items,
+    ann_options={"nlist": settings.ann_nlist, "nprobe": settings.ann_nprobe},
+    quantization=settings.embedding_quantization,
+    storage_dtype=settings.embedding_storage_dtype,
+    rescore_candidates=settings.quantization_rescore_candidates,
+    hybrid=settings.hybrid_search,
+    hybrid_candidates=settings.hybrid_candidates,
+    rrf_k=settings.rrf_k,
+    query_cache=query_cache,
+    stream_block_size=settings.rag_stream_block_size,
+    stream_recheck_seconds=settings.rag_stream_recheck_seconds,
+    query_batcher=embedding_batcher,
 )
-rag_service = RAGService(embedding_client)
 post_processor = PostProcessor()
 _sop_machine = SopStateMachine()
-prompt_builder = PromptBuilder(_sop_machine)
-llm_client = GeminiClient(settings.gemini_api_key)
+prompt_builder = PromptBuilder(
+    _sop_machine, token_ceiling=settings.prompt_token_ceiling, context_share=settings.prompt_context_share
+)
+gemini_context_cache = (
+    GeminiContextCache(
+        settings.gemini_api_key,
+        http=http_pool,
+        ttl_seconds=settings.gemini_context_cache_ttl_seconds,
+        min_tokens=settings.gemini_context_cache_min_tokens,
+    )
+    if settings.gemini_context_cache_enabled
+    else None
+)
+llm_client = GeminiClient(
+    settings.gemini_api_key,
+    model=settings.llm_model,
+    http=http_pool,
+    governor=llm_governor,
+    fallback_model=settings.llm_fallback_model,
+    hedging=settings.llm_hedge_enabled,
+    hedge_percentile=settings.llm_hedge_percentile,
+    hedge_default_delay=settings.llm_hedge_default_ms / 1000,
+    hedge_min_samples=settings.llm_hedge_min_samples,
+    context_cache=gemini_context_cache,
+)
 followup_service = FollowUpService()
 tenant_service = TenantService()
 _sop_state_service = SopStateService(_sop_machine)
-orchestrator = Orchestrator(llm_client, rag_service, prompt_builder, post_processor, _sop_state_service)
+response_cache = ResponseCache() if settings.response_cache_enabled else None
+semantic_cache = SemanticCache() if settings.semantic_cache_enabled else None
+orchestrator = Orchestrator(
+    llm_client,
+    rag_service,
+    prompt_builder,
+    post_processor,
+    _sop_state_service,
+    response_cache=response_cache,
+    semantic_cache=semantic_cache,
+    session_factory=SessionLocal,
+    default_deadline_ms=settings.chat_deadline_ms,
+    context_budget_share=settings.chat_context_budget_share,
+    max_detached_retrievals=settings.chat_max_detached_retrievals,
+)
+chat_debouncer = (
+    ChatDebouncer(settings.chat_debounce_channels.split(","), max_wait_ms=settings.chat_debounce_max_wait_ms)
+    if settings.chat_debounce_enabled
+    else None
+)
+admission_controller = (
+    AdmissionController(
+        max_concurrency=settings.admission_max_concurrency,
+        tenant_concurrency=settings.admission_tenant_concurrency,
+        max_queue=settings.admission_max_queue,
+        max_wait_ms=settings.admission_max_wait_ms,
+    )
+    if settings.admission_enabled
+    else None
+)
 scheduler = FollowUpScheduler(poll_interval_seconds=settings.followup_poll_interval_seconds)
 ingest_service = IngestService()
 contact_service = ContactService()
@@ -36,14 +175,26 @@ sop_machine = _sop_machine
 sop_state_service = _sop_state_service
 
 __all__ = [
+    "http_pool",
+    "llm_governor",
+    "embedding_governor",
     "rag_service",
+    "vector_index_cache",
+    "query_cache",
     "embedding_client",
+    "embedding_cache",
+    "embedding_batcher",
     "post_processor",
     "prompt_builder",
     "llm_client",
+    "gemini_context_cache",
+    "response_cache",
+    "semantic_cache",
     "followup_service",
     "tenant_service",
     "orchestrator",
+    "chat_debouncer",
+    "admission_controller",
     "get_session",
     "SessionLocal",
     "scheduler",
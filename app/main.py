@@ -9,7 +9,7 @@ from starlette import status
 from app.config import settings
 from app.db import SessionLocal, engine
 from app.models.db_models import Base
-from app.routers import chat, followup, kb, tenant, contacts, sop
+from app.routers import chat, followup, kb, tenant, contacts, sop, metrics
 from app.utils.logging import configure_logging
 from app import dependencies
 
@@ -50,6 +50,7 @@ def create_app() -> FastAPI:
     app.include_router(followup.router, prefix="/followup", tags=["followup"])
     app.include_router(contacts.router, prefix="/contacts", tags=["contacts"])
     app.include_router(sop.router, prefix="/sop", tags=["sop"])
+    app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
     @app.on_event("startup")
     async def _startup():
@@ -58,6 +59,11 @@ def create_app() -> FastAPI:
                 await conn.run_sync(Base.metadata.create_all)
         await dependencies.scheduler.start(SessionLocal)
 
+    @app.on_event("shutdown")
+    async def _shutdown():
+        await dependencies.http_pool.aclose()
+        dependencies.embedding_client.close()
+
     @app.get("/health")
     async def health():
         return {"status": "ok"}
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, JSON, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, JSON, LargeBinary, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -19,6 +19,7 @@ class Tenant(Base):
     timezone = Column(String, nullable=False, default="Asia/Jakarta")
     followup_enabled = Column(Boolean, nullable=False, default=True)
     followup_interval_minutes = Column(Float, nullable=False, default=60.0)
+    performance = Column(JSON, nullable=False, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -35,7 +36,7 @@ class KnowledgeItemModel(Base):
     content = Column(Text, nullable=False)
     tags = Column(JSON, default=list)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    embedding = Column(JSON, default=list)  # store vector as list of floats (for sqlite/postgres json)
+    embedding = Column(LargeBinary, nullable=True)  # packed float32 + header, see services/vector_codec.py
 
     tenant = relationship("Tenant", back_populates="knowledge_items")
 
@@ -98,3 +99,15 @@ class SopStateModel(Base):
     user_id = Column(String, nullable=True)
     current_step = Column(String, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class EmbeddingCacheModel(Base):
+    __tablename__ = "embedding_cache"
+    __table_args__ = (UniqueConstraint("provider", "model", "text_hash", name="uq_embedding_cache_key"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    text_hash = Column(String(64), nullable=False)  # sha256 hex of the embedded text
+    embedding = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
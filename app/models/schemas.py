@@ -18,6 +18,9 @@ class ChatRequest(BaseModel):
     channel: Optional[str] = "web"
     messages: List[Message]
     typing_debounce_ms: Optional[int] = Field(default=800, description="Delay before responding to simulate natural wait")
+    kb_tags: List[str] = Field(
+        default_factory=list, description="Only retrieve knowledge items carrying any of these tags"
+    )
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
@@ -51,6 +54,7 @@ class PersonaSettings(BaseModel):
     style_prompt: str = Field(default="Ramah, informatif, ringkas")
     tone: str = Field(default="neutral")
     language: str = Field(default="id")
+    typing_speed_cps: float = Field(default=20.0, description="Simulated typing speed (chars/sec) for bubble delays")
 
 
 class SopStep(BaseModel):
@@ -63,6 +67,33 @@ class SalesSop(BaseModel):
     steps: List[SopStep] = Field(default_factory=list)
 
 
+class PerformanceSettings(BaseModel):
+    response_cache_enabled: bool = Field(
+        default=False, description="Reuse LLM replies for identical prompts (same model, settings and KB)"
+    )
+    response_cache_ttl_seconds: int = Field(default=600, description="Lifetime of a cached reply")
+    response_cache_max_entries: int = Field(default=256, description="Cached replies kept for this tenant")
+    semantic_cache_enabled: bool = Field(
+        default=True, description="Answer near-duplicate questions with the same context and SOP step from cache"
+    )
+    semantic_cache_threshold: float = Field(default=0.95, description="Minimum cosine similarity between questions")
+    semantic_cache_ttl_seconds: int = Field(default=3600, description="Lifetime of a semantically cached answer")
+    semantic_cache_max_entries: int = Field(default=512, description="Semantic cache entries kept for this tenant")
+    prompt_token_ceiling: int = Field(
+        default=0, description="Max estimated prompt tokens; 0 = server default (PROMPT_TOKEN_CEILING)"
+    )
+    deadline_ms: int = Field(default=0, description="End-to-end chat deadline; 0 = server default (CHAT_DEADLINE_MS)")
+    channel_deadline_ms: Dict[str, int] = Field(
+        default_factory=dict, description="Per-channel deadline overrides, e.g. {\"whatsapp\": 25000}"
+    )
+    max_concurrency: int = Field(
+        default=0, description="Chat turns run at once; 0 = server default (ADMISSION_TENANT_CONCURRENCY)"
+    )
+    admission_weight: float = Field(
+        default=1.0, description="Share of freed chat slots relative to other queued tenants"
+    )
+
+
 class TenantSettings(BaseModel):
     tenant_id: str
     api_key: Optional[str] = Field(default=None, description="API key per tenant")
@@ -72,6 +103,7 @@ class TenantSettings(BaseModel):
     timezone: str = Field(default="Asia/Jakarta")
     followup_enabled: bool = True
     followup_interval_minutes: int = 60
+    performance: PerformanceSettings = Field(default_factory=PerformanceSettings)
 
 
 class FollowUpRequest(BaseModel):
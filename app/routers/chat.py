@@ -1,10 +1,14 @@
+import json
 import logging
+from typing import Any, AsyncIterator, Dict, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from starlette import status
 
 from app import dependencies
 from app.models.schemas import ChatRequest, ChatResponse, TenantSettings
+from app.services.admission import AdmissionRejected, Lease
 from app.utils.security import ApiKeyDep
 from app.db import get_session
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,26 +16,110 @@ from sqlalchemy.ext.asyncio import AsyncSession
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 def _get_tenant_settings(tenant_id: str) -> TenantSettings:
     # Fallback placeholder; real fetch handled via tenant service
     return TenantSettings(tenant_id=tenant_id)
 
 
-@router.post("", response_model=ChatResponse)
-async def chat(
-    payload: ChatRequest,
-    tenant_key: ApiKeyDep,
-    session: AsyncSession = Depends(get_session),
-) -> ChatResponse:
+def _check_tenant(payload: ChatRequest, tenant_key: str) -> None:
     if tenant_key not in ("global", "open") and payload.tenant_id != tenant_key:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="tenant mismatch",
         )
+
+
+async def _resolve_tenant_settings(session: AsyncSession, payload: ChatRequest, tenant_key: str) -> TenantSettings:
+    _check_tenant(payload, tenant_key)
     tenant_settings = await dependencies.tenant_service.get(session, payload.tenant_id)
     if not tenant_settings:
         tenant_settings = _get_tenant_settings(payload.tenant_id)
+    return tenant_settings
+
+
+async def _debounce(payload: ChatRequest, tenant_key: str) -> ChatRequest | None:
+    """
+    Hold the request for its typing window (debounced channels only, before any DB work).
+    None means a newer message from the same user superseded it.
+    """
+    debouncer = dependencies.chat_debouncer
+    if debouncer is None or not debouncer.applies(payload):
+        return payload
+    _check_tenant(payload, tenant_key)
+    return await debouncer.submit(payload)
+
+
+async def _admit(session: AsyncSession, tenant_settings: TenantSettings) -> Lease | None:
+    """
+    Take a chat slot for the tenant (None when admission control is off). While queued the
+    request hands its DB connection back to the pool; shed requests get 429 + Retry-After.
+    """
+    admission = dependencies.admission_controller
+    if admission is None:
+        return None
+    try:
+        return await admission.acquire(
+            tenant_settings.tenant_id, tenant_settings.performance, before_wait=session.close
+        )
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=exc.reason,
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+class _LeasedStreamingResponse(StreamingResponse):
+    """
+    Streaming response that frees its admission slot once the response is over, however it
+    ends: the body generator may never start (client gone before the first chunk) and then
+    its own cleanup would never run.
+    """
+
+    def __init__(self, *args: Any, lease: Lease | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.lease = lease
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.lease is not None:
+                self.lease.release()
+
+
+def _merged_response(payload: ChatRequest) -> ChatResponse:
+    return ChatResponse(
+        bubbles=[],
+        full_text="",
+        metadata={"channel": payload.channel, "locale": payload.locale, "merged": True},
+    )
+
+
+async def _merged_events(payload: ChatRequest) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    yield "done", _merged_response(payload).model_dump()
+
+
+async def _sse(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("", response_model=ChatResponse)
+async def chat(
+    payload: ChatRequest,
+    tenant_key: ApiKeyDep,
+    session: AsyncSession = Depends(get_session),
+) -> ChatResponse:
+    merged = await _debounce(payload, tenant_key)
+    if merged is None:
+        return _merged_response(payload)
+    payload = merged
+    tenant_settings = await _resolve_tenant_settings(session, payload, tenant_key)
+    lease = await _admit(session, tenant_settings)
     try:
         return await dependencies.orchestrator.handle_chat(session, payload, tenant_settings)
     except HTTPException:
@@ -42,3 +130,46 @@ async def chat(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Chat processing failed",
         ) from exc
+    finally:
+        if lease is not None:
+            lease.release()
+
+
+@router.post("/stream")
+async def chat_stream(
+    payload: ChatRequest,
+    tenant_key: ApiKeyDep,
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    """
+    Server-Sent Events variant of /chat: a `bubble` event per completed bubble, then `done`
+    with the full ChatResponse (or `error`).
+    """
+    merged = await _debounce(payload, tenant_key)
+    if merged is None:
+        events = _merged_events(payload)
+        return StreamingResponse(_sse(events), media_type="text/event-stream", headers=_SSE_HEADERS)
+    payload = merged
+    tenant_settings = await _resolve_tenant_settings(session, payload, tenant_key)
+    lease = await _admit(session, tenant_settings)
+    try:
+        events = await dependencies.orchestrator.stream_chat(session, payload, tenant_settings)
+    except HTTPException:
+        if lease is not None:
+            lease.release()
+        raise
+    except Exception as exc:  # pragma: no cover - defensive
+        if lease is not None:
+            lease.release()
+        logger.exception("Chat stream setup failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Chat processing failed",
+        ) from exc
+    # The slot is held until the stream has been sent
+    return _LeasedStreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+        lease=lease,
+    )
@@ -7,6 +7,7 @@ from starlette import status
 from app import dependencies
 from app.db import get_session
 from app.models.schemas import KnowledgeUpsertRequest
+from app.services.embeddings import EmbeddingUnavailableError
 from app.utils.security import ApiKeyDep
 
 router = APIRouter()
@@ -26,7 +27,14 @@ async def upsert_kb(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="tenant not found")
     try:
         await dependencies.rag_service.upsert(session, payload.tenant_id, payload.items)
+        dependencies.orchestrator.invalidate_cached_replies(payload.tenant_id)
         return {"status": "ok", "count": len(payload.items)}
+    except EmbeddingUnavailableError as exc:
+        logger.warning("KB upsert rejected: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Embedding provider unavailable, retry later",
+        ) from exc
     except Exception as exc:  # pragma: no cover - defensive
         logger.exception("KB upsert failed")
         raise HTTPException(
@@ -52,9 +60,16 @@ async def upload_kb_file(
         tags_list = [t.strip() for t in (tags or "").split(",") if t.strip()]
         items = await dependencies.ingest_service.parse_file(file, tags_list)
         await dependencies.rag_service.upsert(session, tenant_id, items)
+        dependencies.orchestrator.invalidate_cached_replies(tenant_id)
         return {"status": "ok", "chunks": len(items)}
     except HTTPException:
         raise
+    except EmbeddingUnavailableError as exc:
+        logger.warning("KB upload rejected: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Embedding provider unavailable, retry later",
+        ) from exc
     except Exception as exc:  # pragma: no cover - defensive
         logger.exception("KB upload failed")
         raise HTTPException(
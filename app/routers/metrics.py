@@ -0,0 +1,74 @@
+import logging
+
+from fastapi import APIRouter
+
+from app import dependencies
+from app.utils.security import ApiKeyDep
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _scoped(stats: dict, tenant_key: str) -> dict:
+    """
+    Per-tenant breakdowns are visible to the global/open key only; a tenant-scoped key sees
+    its own entry (aggregate totals stay as they are).
+    """
+    if tenant_key in ("global", "open") or "tenants" not in stats:
+        return stats
+    return {**stats, "tenants": {t: v for t, v in stats["tenants"].items() if t == tenant_key}}
+
+
+@router.get("/embeddings")
+async def embedding_metrics(tenant_key: ApiKeyDep) -> dict:
+    batcher = dependencies.embedding_batcher
+    return {
+        "cache": dependencies.embedding_client.cache_stats(),
+        "batcher": batcher.stats() if batcher is not None else {},
+    }
+
+
+@router.get("/rag")
+async def rag_metrics(tenant_key: ApiKeyDep) -> dict:
+    query_cache = dependencies.query_cache
+    return {
+        "vector_index_cache": dependencies.vector_index_cache.stats(),
+        "query_cache": query_cache.stats() if query_cache is not None else {},
+        "streaming_tenants": len(dependencies.rag_service.streaming_tenants),
+    }
+
+
+@router.get("/governor")
+async def governor_metrics(tenant_key: ApiKeyDep) -> dict:
+    return {
+        "llm": dependencies.llm_governor.state(),
+        "embeddings": dependencies.embedding_governor.state(),
+    }
+
+
+@router.get("/llm")
+async def llm_metrics(tenant_key: ApiKeyDep) -> dict:
+    response_cache = dependencies.response_cache
+    semantic_cache = dependencies.semantic_cache
+    context_cache = dependencies.gemini_context_cache
+    return {
+        "response_cache": _scoped(response_cache.stats(), tenant_key) if response_cache is not None else {},
+        "semantic_cache": _scoped(semantic_cache.stats(), tenant_key) if semantic_cache is not None else {},
+        "latency": dependencies.llm_client.latency_stats(),
+        "context_cache": context_cache.stats() if context_cache is not None else {},
+    }
+
+
+@router.get("/chat")
+async def chat_metrics(tenant_key: ApiKeyDep) -> dict:
+    debouncer = dependencies.chat_debouncer
+    return {
+        "debounce": debouncer.stats() if debouncer is not None else {},
+        "pipeline": dependencies.orchestrator.pipeline.stats(),
+    }
+
+
+@router.get("/admission")
+async def admission_metrics(tenant_key: ApiKeyDep) -> dict:
+    admission = dependencies.admission_controller
+    return _scoped(admission.stats(), tenant_key) if admission is not None else {}
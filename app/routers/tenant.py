@@ -41,6 +41,7 @@ async def update_settings(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="tenant mismatch")
     try:
         updated = await dependencies.tenant_service.upsert(session, payload)
+        dependencies.orchestrator.invalidate_cached_replies(tenant_id)
         return updated
     except Exception as exc:  # pragma: no cover - defensive
         logger.exception("Failed to update tenant settings")
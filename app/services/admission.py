@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict
+
+from app.models.schemas import PerformanceSettings
+from app.utils.histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """
+    A chat turn was shed: the tenant's queue is full or the request waited too long.
+    """
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    tag: float  # virtual start time; the smallest eligible tag is served first
+    seq: int
+    future: asyncio.Future
+    enqueued: float
+
+
+class _Tenant:
+    def __init__(self) -> None:
+        self.waiters: Deque[_Waiter] = deque()
+        self.active = 0
+        self.limit = 1
+        self.weight = 1.0
+        self.last_tag = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.hold_seconds: float | None = None  # moving average of how long a turn keeps its slot
+        self.wait = LatencyHistogram(min_seconds=0.001, max_seconds=120.0)
+
+
+class Lease:
+    """
+    One admitted chat turn; `release` frees the slot (idempotent).
+    """
+
+    def __init__(self, controller: "AdmissionController", tenant: _Tenant, started: float, generation: int) -> None:
+        self._controller = controller
+        self._tenant = tenant
+        self._started = started
+        self._generation = generation
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self._tenant, self._started, self._generation)
+
+
+class AdmissionController:
+    """
+    Admission in front of the orchestrator. At most `max_concurrency` chat turns run at once
+    and each tenant at most its own limit (`performance.max_concurrency`, else
+    `tenant_concurrency`). Requests over the limit queue per tenant; freed slots go to the
+    queued request with the smallest virtual start tag (start-time fair queuing, each request
+    advancing its tenant by 1/`performance.admission_weight`), so a tenant flooding the queue
+    only delays itself. A full tenant queue or a wait longer than `max_wait_ms` is rejected
+    with a Retry-After estimate. State is per process.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        tenant_concurrency: int = 8,
+        max_queue: int = 32,
+        max_wait_ms: float = 10000.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_concurrency = max(max_concurrency, 1)
+        self.tenant_concurrency = max(tenant_concurrency, 1)
+        self.max_queue = max_queue
+        self.max_wait_ms = max_wait_ms
+        self.clock = clock
+        self._tenants: Dict[str, _Tenant] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._active = 0
+        self._virtual = 0.0
+        self._seq = 0
+        self._generation = 0
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        tenant_id: str,
+        performance: PerformanceSettings | None = None,
+        before_wait: Callable[[], Awaitable[Any]] | None = None,
+    ) -> AsyncIterator[Lease]:
+        lease = await self.acquire(tenant_id, performance, before_wait)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    async def acquire(
+        self,
+        tenant_id: str,
+        performance: PerformanceSettings | None = None,
+        before_wait: Callable[[], Awaitable[Any]] | None = None,
+    ) -> Lease:
+        """
+        Wait for a slot. `before_wait` runs only when the request has to queue (e.g. to hand
+        its DB connection back to the pool meanwhile).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiter futures are bound to their loop
+            self._tenants, self._active, self._virtual, self._loop = {}, 0, 0.0, loop
+            self._generation += 1
+        tenant = self._tenant(tenant_id, performance)
+        if not tenant.waiters and tenant.active < tenant.limit and self._active < self.max_concurrency:
+            return self._grant(tenant, 0.0)
+        if len(tenant.waiters) >= self.max_queue:
+            tenant.rejected += 1
+            logger.warning("Chat turn shed for tenant=%s: queue full (%d waiting)", tenant_id, len(tenant.waiters))
+            raise AdmissionRejected("Tenant queue is full", self._retry_after(tenant))
+
+        if before_wait is not None:
+            await before_wait()
+        self._seq += 1
+        tag = max(tenant.last_tag, self._virtual) + 1 / tenant.weight
+        waiter = _Waiter(tag, self._seq, loop.create_future(), self.clock())
+        tenant.last_tag = waiter.tag
+        tenant.waiters.append(waiter)
+        self._dispatch()  # a slot may have been free for an earlier-tagged tenant only
+        timeout = self.max_wait_ms / 1000 if self.max_wait_ms > 0 else None
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():  # granted just as the wait ran out
+                return waiter.future.result()
+            tenant.waiters.remove(waiter)
+            tenant.timed_out += 1
+            logger.warning("Chat turn shed for tenant=%s: no slot within %d ms", tenant_id, self.max_wait_ms)
+            raise AdmissionRejected("Timed out waiting for a chat slot", self._retry_after(tenant)) from None
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                waiter.future.result().release()
+            else:
+                tenant.waiters.remove(waiter)
+            raise
+
+    def _tenant(self, tenant_id: str, performance: PerformanceSettings | None) -> _Tenant:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            tenant = self._tenants[tenant_id] = _Tenant()
+        limit = performance.max_concurrency if performance is not None else 0
+        weight = performance.admission_weight if performance is not None else 1.0
+        tenant.limit = min(limit if limit > 0 else self.tenant_concurrency, self.max_concurrency)
+        tenant.weight = weight if weight > 0 else 1.0
+        return tenant
+
+    def _grant(self, tenant: _Tenant, waited: float) -> Lease:
+        tenant.active += 1
+        self._active += 1
+        tenant.admitted += 1
+        tenant.wait.record(waited)
+        return Lease(self, tenant, self.clock(), self._generation)
+
+    def _release(self, tenant: _Tenant, started: float, generation: int) -> None:
+        if generation != self._generation:
+            return  # leased before the state was reset for a new event loop
+        held = self.clock() - started
+        tenant.hold_seconds = held if tenant.hold_seconds is None else 0.8 * tenant.hold_seconds + 0.2 * held
+        tenant.active -= 1
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency:
+            eligible = [t for t in self._tenants.values() if t.waiters and t.active < t.limit]
+            if not eligible:
+                return
+            tenant = min(eligible, key=lambda t: (t.waiters[0].tag, t.waiters[0].seq))
+            waiter = tenant.waiters.popleft()
+            self._virtual = waiter.tag
+            waiter.future.set_result(self._grant(tenant, self.clock() - waiter.enqueued))
+
+    def _retry_after(self, tenant: _Tenant) -> int:
+        hold = tenant.hold_seconds if tenant.hold_seconds is not None else 1.0
+        return max(1, math.ceil(hold * (len(tenant.waiters) + 1) / tenant.limit))
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queued": sum(len(t.waiters) for t in self._tenants.values()),
+            "tenants": {
+                tenant_id: {
+                    "active": t.active,
+                    "queued": len(t.waiters),
+                    "limit": t.limit,
+                    "weight": t.weight,
+                    "admitted": t.admitted,
+                    "rejected": t.rejected,
+                    "timed_out": t.timed_out,
+                    "oldest_wait_ms": round((now - t.waiters[0].enqueued) * 1000, 1) if t.waiters else 0.0,
+                    "wait": t.wait.snapshot(),
+                }
+                for tenant_id, t in self._tenants.items()
+            },
+        }
@@ -0,0 +1,210 @@
+import logging
+import math
+from typing import Callable, Dict, List, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from app.services.vectors import normalize, top_k
+
+logger = logging.getLogger(__name__)
+
+
+class VectorSource(Protocol):
+    """
+    Row-addressable vectors owned by a tenant index (see TenantVectorIndex).
+    """
+
+    size: int
+
+    def rows(self, selector: np.ndarray | slice) -> np.ndarray: ...
+
+    def score(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray: ...
+
+
+class AnnBackend(Protocol):
+    """
+    Approximate search structure over rows of a tenant index. The vectors stay owned
+    by the index; backends only keep row numbers. `build` may run in a worker thread;
+    `update` runs on the event loop and must stay cheap.
+    """
+
+    @property
+    def nbytes(self) -> int: ...
+
+    def build(self, source: VectorSource) -> None: ...
+
+    def update(self, rows: Sequence[int], source: VectorSource) -> None: ...
+
+    def needs_rebuild(self, size: int) -> bool: ...
+
+    def search(
+        self, source: VectorSource, query: np.ndarray, k: int, mask: np.ndarray | None = None
+    ) -> List[Tuple[int, float]]: ...
+
+
+class IVFIndex:
+    """
+    Inverted-file index: spherical k-means centroids, one posting list of rows per centroid.
+    Search probes the `nprobe` closest lists and scores only their rows exactly.
+    Higher nprobe means better recall and more latency.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 0,
+        nprobe: int = 32,
+        kmeans_iters: int = 10,
+        train_sample: int = 100_000,
+        seed: int = 0,
+    ) -> None:
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iters = kmeans_iters
+        self.train_sample = train_sample
+        self.seed = seed
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.trained_size = 0
+        self._lists: List[np.ndarray] = []
+        self._pending: List[List[int]] = []
+        self._assign = np.zeros(0, dtype=np.int32)
+
+    def build(self, source: VectorSource) -> None:
+        n = source.size
+        nlist = self.nlist or max(1, int(4 * math.sqrt(n)))
+        nlist = min(nlist, n) if n else 1
+        rng = np.random.default_rng(self.seed)
+        if n > self.train_sample:
+            sample = source.rows(np.sort(rng.choice(n, self.train_sample, replace=False)))
+        else:
+            sample = source.rows(slice(0, n))
+        self.centroids = self._kmeans(sample, nlist, rng) if n else np.zeros((1, sample.shape[1]), np.float32)
+        assign = self._assign_all(source)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(1, len(self.centroids)))
+        self._lists = [arr.astype(np.int64) for arr in np.split(order, bounds)]
+        self._pending = [[] for _ in self._lists]
+        self._assign = assign.astype(np.int32)
+        self.trained_size = n
+        logger.info("Built IVF index rows=%s nlist=%s", n, len(self.centroids))
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.centroids.nbytes
+            + sum(arr.nbytes for arr in self._lists)
+            + sum(len(pending) for pending in self._pending) * 8
+            + self._assign.nbytes
+        )
+
+    def needs_rebuild(self, size: int) -> bool:
+        # The distribution may have drifted a lot once the index has doubled; retrain from scratch
+        return not self.trained_size or size >= 2 * self.trained_size
+
+    def update(self, rows: Sequence[int], source: VectorSource) -> None:
+        """
+        Assign new or changed rows to their nearest list. Retraining (see needs_rebuild) is
+        left to the owner, which runs `build` off the event loop.
+        """
+        if not self.trained_size:
+            return
+        rows_arr = np.asarray(rows, dtype=np.int64)
+        if rows_arr.size == 0:
+            return
+        if source.size > self._assign.shape[0]:
+            grown = np.full(max(source.size, self._assign.shape[0] * 2), -1, dtype=np.int32)
+            grown[: self._assign.shape[0]] = self._assign
+            self._assign = grown
+        new_lists = self._nearest(source.rows(rows_arr))
+        for row, target in zip(rows_arr.tolist(), new_lists.tolist()):
+            current = int(self._assign[row])
+            if current == target:
+                continue
+            if current >= 0:
+                self._flush(current)
+                self._lists[current] = self._lists[current][self._lists[current] != row]
+            self._pending[target].append(row)
+            self._assign[row] = target
+
+    def search(
+        self,
+        source: VectorSource,
+        query: np.ndarray,
+        k: int,
+        mask: np.ndarray | None = None,
+        nprobe: int | None = None,
+    ) -> List[Tuple[int, float]]:
+        if not self.trained_size or source.size == 0:
+            return []
+        probe = top_k(self.centroids @ query, nprobe or self.nprobe)
+        for idx in probe:
+            self._flush(int(idx))
+        candidates = np.concatenate([self._lists[int(idx)] for idx in probe])
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        if candidates.size == 0:
+            return []
+        scores = source.score(query, candidates)
+        return [(int(candidates[i]), float(scores[i])) for i in top_k(scores, k)]
+
+    def _flush(self, idx: int) -> None:
+        if self._pending[idx]:
+            self._lists[idx] = np.concatenate([self._lists[idx], np.asarray(self._pending[idx], dtype=np.int64)])
+            self._pending[idx] = []
+
+    def _assign_all(self, source: VectorSource, block: int = 4096) -> np.ndarray:
+        out = np.empty(source.size, dtype=np.int64)
+        for start in range(0, source.size, block):
+            stop = min(start + block, source.size)
+            out[start:stop] = self._nearest(source.rows(slice(start, stop)))
+        return out
+
+    def _nearest(self, vectors: np.ndarray, block: int = 4096) -> np.ndarray:
+        out = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], block):
+            out[start : start + block] = np.argmax(vectors[start : start + block] @ self.centroids.T, axis=1)
+        return out
+
+    def _kmeans(self, data: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+        self.centroids = data[rng.choice(data.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assign = self._nearest(data)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, data)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Reseed empty clusters with random points
+                sums[empty] = data[rng.choice(data.shape[0], int(empty.sum()))]
+            self.centroids = normalize(sums)
+        return self.centroids
+
+
+ANN_BACKENDS: Dict[str, Callable[..., AnnBackend]] = {
+    "ivf": IVFIndex,
+}
+
+
+def make_ann_backend(name: str, **knobs) -> AnnBackend | None:
+    """
+    Build an ANN backend by name. Returns None for "none"/unknown so callers fall back to exact search.
+    """
+    factory = ANN_BACKENDS.get(name)
+    if factory is None:
+        if name not in ("", "none"):
+            logger.warning("Unknown ANN backend %s; using exact search", name)
+        return None
+    return factory(**knobs)
+
+
+def recall_at_k(source: VectorSource, backend: AnnBackend, queries: np.ndarray, k: int = 10) -> float:
+    """
+    Fraction of exact top-k rows that the ANN backend also returns, averaged over queries.
+    """
+    if queries.shape[0] == 0 or source.size == 0:
+        return 1.0
+    found = 0
+    for query in queries:
+        exact = set(top_k(source.score(query), k).tolist())
+        approx = {row for row, _ in backend.search(source, query, k)}
+        found += len(exact & approx)
+    return found / (queries.shape[0] * min(k, source.size))
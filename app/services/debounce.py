@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from app.models.schemas import ChatRequest
+
+logger = logging.getLogger(__name__)
+
+
+def merge_requests(payloads: List[ChatRequest]) -> ChatRequest:
+    """
+    One request out of a burst: the latest request, with user messages that only appeared in
+    earlier requests inserted (in arrival order) before its trailing user turn. Clients that
+    resend the whole thread already carry them, so nothing is duplicated.
+    """
+    latest = payloads[-1]
+    messages = list(latest.messages)
+    seen = {(msg.role, msg.content) for msg in messages}
+    earlier = []
+    for payload in payloads[:-1]:
+        for msg in payload.messages:
+            if msg.role == "user" and (msg.role, msg.content) not in seen:
+                earlier.append(msg)
+                seen.add((msg.role, msg.content))
+    insert_at = len(messages)
+    while insert_at > 0 and messages[insert_at - 1].role == "user":
+        insert_at -= 1
+    messages[insert_at:insert_at] = earlier
+    return latest.model_copy(
+        update={"messages": messages, "metadata": {**latest.metadata, "merged_requests": len(payloads)}}
+    )
+
+
+class _Burst:
+    def __init__(self, started: float) -> None:
+        self.started = started
+        self.payloads: List[ChatRequest] = []
+        self.pending: asyncio.Future | None = None
+
+
+class ChatDebouncer:
+    """
+    Server-side typing debounce for chat channels where users send several short messages in a
+    row. Per (tenant, channel, user) the latest request waits `typing_debounce_ms`; a new
+    message within that window supersedes it (the superseded request returns at once and its
+    caller answers "merged"), and the last one runs the orchestrator once with all messages.
+    A burst never waits longer than `max_wait_ms` from its first message.
+    """
+
+    def __init__(self, channels: Iterable[str] = ("whatsapp",), max_wait_ms: float = 5000.0) -> None:
+        self.channels = {channel.strip().lower() for channel in channels if channel.strip()}
+        self.max_wait_ms = max_wait_ms
+        self._bursts: Dict[Tuple[str, str, str], _Burst] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.requests = 0
+        self.merged = 0
+        self.runs = 0
+
+    def applies(self, payload: ChatRequest) -> bool:
+        return bool(payload.typing_debounce_ms) and (payload.channel or "").lower() in self.channels
+
+    async def submit(self, payload: ChatRequest) -> ChatRequest | None:
+        """
+        Wait out the typing window. Returns the (merged) request to run, or None when a later
+        message superseded this one.
+        """
+        if not self.applies(payload):
+            return payload
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._bursts, self._loop = {}, loop  # futures are bound to their loop
+        self.requests += 1
+        key = (payload.tenant_id, (payload.channel or "").lower(), payload.user_id)
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst(loop.time())
+        burst.payloads.append(payload)
+        if burst.pending is not None and not burst.pending.done():
+            burst.pending.set_result(None)  # supersede the previous request of the burst
+        pending = burst.pending = loop.create_future()
+
+        window = payload.typing_debounce_ms / 1000
+        remaining = burst.started + self.max_wait_ms / 1000 - loop.time()
+        try:
+            await asyncio.wait_for(asyncio.shield(pending), timeout=max(min(window, remaining), 0))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if burst.pending is pending and self._bursts.get(key) is burst:
+                # The request that would have answered the burst went away; start over
+                del self._bursts[key]
+                logger.info("Debounced burst dropped for tenant=%s user=%s", payload.tenant_id, payload.user_id)
+            raise
+        if burst.pending is not pending:
+            self.merged += 1
+            return None
+        if self._bursts.get(key) is burst:
+            del self._bursts[key]
+        self.runs += 1
+        return merge_requests(burst.payloads) if len(burst.payloads) > 1 else payload
+
+    def stats(self) -> Dict[str, int | float | List[str]]:
+        return {
+            "channels": sorted(self.channels),
+            "open_bursts": len(self._bursts),
+            "requests": self.requests,
+            "merged": self.merged,
+            "runs": self.runs,
+            "llm_calls_saved_ratio": round(self.merged / self.requests, 4) if self.requests else 0.0,
+        }
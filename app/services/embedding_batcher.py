@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from app.services.embeddings import EmbeddingClient
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests (one per chat turn) into one
+    EmbeddingClient.embed call. A batch is flushed when it reaches max_batch_size or when its
+    first request has waited max_wait_ms, and each caller gets its own vector back.
+    Works for every provider since it sits in front of EmbeddingClient.embed.
+    """
+
+    def __init__(self, client: EmbeddingClient, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> None:
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pending futures belong to the old loop (tests, scripts); start over
+            self._pending, self._timer, self._loop = [], None, loop
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # Keep a reference until done so the task is not garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        try:
+            vectors = await self.client.embed([text for text, _ in batch])
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.exception("Batched embedding call failed")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for idx, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(vectors[idx] if idx < len(vectors) else [])
+
+    def stats(self) -> Dict[str, int | float]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+        }
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models.db_models import EmbeddingCacheModel
+from app.services.vector_codec import decode_embedding, encode_embedding
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (provider, model, sha256(text)):
+    an in-process LRU in front of the persistent embedding_cache table.
+    Only calls with `persistent=True` (KB ingest) touch the table; chat queries are one-off
+    texts and stay in memory. Rows older than `retention_days` are pruned after writes, at
+    most once per `prune_interval_seconds` (0 days keeps them forever).
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        max_entries: int = 10_000,
+        lookup_batch: int = 500,
+        retention_days: float = 30.0,
+        prune_interval_seconds: float = 3600.0,
+    ) -> None:
+        self.memory: LRUCache[np.ndarray] = LRUCache(max_entries)
+        self.session_factory = session_factory
+        self.lookup_batch = lookup_batch
+        self.retention_days = retention_days
+        self.prune_interval_seconds = prune_interval_seconds
+        self._last_prune: float | None = None
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.db_errors = 0
+        self.pruned = 0
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def get_many(
+        self, provider: str, model: str, texts: Sequence[str], persistent: bool = True
+    ) -> List[List[float] | None]:
+        """
+        Cached vectors aligned with `texts`; None where neither tier has the text.
+        """
+        hashes = [self.text_hash(text) for text in texts]
+        vectors: List[np.ndarray | None] = [self.memory.get((provider, model, h)) for h in hashes]
+        self.memory_hits += sum(vec is not None for vec in vectors)
+        missing = {h for h, vec in zip(hashes, vectors) if vec is None}
+        if missing and persistent and self.session_factory is not None:
+            found = await self._load(provider, model, missing)
+            for idx, h in enumerate(hashes):
+                if vectors[idx] is None and h in found:
+                    vectors[idx] = found[h]
+                    self.memory.put((provider, model, h), found[h])
+                    self.db_hits += 1
+        self.misses += sum(vec is None for vec in vectors)
+        return [vec.tolist() if vec is not None else None for vec in vectors]
+
+    async def put_many(
+        self,
+        provider: str,
+        model: str,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        persistent: bool = True,
+    ) -> None:
+        """
+        Store fresh embeddings. Empty or all-zero vectors (provider fallbacks) are never cached.
+        """
+        fresh: Dict[str, np.ndarray] = {}
+        for text, vec in zip(texts, vectors):
+            arr = np.asarray(vec, dtype=np.float32)
+            if arr.size and arr.any():
+                fresh[self.text_hash(text)] = arr
+        for h, arr in fresh.items():
+            self.memory.put((provider, model, h), arr)
+        if fresh and persistent and self.session_factory is not None:
+            await self._persist(provider, model, fresh)
+            now = time.monotonic()
+            if self._last_prune is None or now - self._last_prune >= self.prune_interval_seconds:
+                self._last_prune = now
+                await self.prune()
+
+    async def prune(self) -> int:
+        """
+        Delete persisted rows older than `retention_days`; returns the number removed.
+        """
+        if self.session_factory is None or self.retention_days <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    delete(EmbeddingCacheModel).where(EmbeddingCacheModel.created_at < cutoff)
+                )
+                await session.commit()
+        except Exception:  # pragma: no cover - defensive
+            self.db_errors += 1
+            logger.exception("Embedding cache prune failed")
+            return 0
+        removed = result.rowcount or 0
+        self.pruned += removed
+        if removed:
+            logger.info("Pruned %s embedding cache rows older than %s days", removed, self.retention_days)
+        return removed
+
+    async def _load(self, provider: str, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        pending = list(hashes)
+        try:
+            async with self.session_factory() as session:
+                for start in range(0, len(pending), self.lookup_batch):
+                    stmt = select(EmbeddingCacheModel.text_hash, EmbeddingCacheModel.embedding).where(
+                        EmbeddingCacheModel.provider == provider,
+                        EmbeddingCacheModel.model == model,
+                        EmbeddingCacheModel.text_hash.in_(pending[start : start + self.lookup_batch]),
+                    )
+                    for row in (await session.execute(stmt)).all():
+                        found[row.text_hash] = decode_embedding(row.embedding)[0]
+        except Exception:  # pragma: no cover - defensive
+            self.db_errors += 1
+            logger.exception("Embedding cache lookup failed; continuing with memory tier only")
+        return found
+
+    async def _persist(self, provider: str, model: str, fresh: Dict[str, np.ndarray]) -> None:
+        try:
+            async with self.session_factory() as session:
+                session.add_all(
+                    EmbeddingCacheModel(
+                        provider=provider,
+                        model=model,
+                        text_hash=h,
+                        embedding=encode_embedding(arr, model),
+                    )
+                    for h, arr in fresh.items()
+                )
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # Another worker stored some of these first; fine for a cache
+                    await session.rollback()
+        except Exception:  # pragma: no cover - defensive
+            self.db_errors += 1
+            logger.exception("Embedding cache write failed")
+
+    def stats(self) -> Dict[str, int | float]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "memory_evictions": self.memory.evictions,
+            "db_errors": self.db_errors,
+            "db_pruned": self.pruned,
+        }
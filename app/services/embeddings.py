@@ -1,22 +1,64 @@
 import asyncio
 import logging
-from typing import Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
 
 import httpx
 import numpy as np
 
+from app.adapters.governor import ProviderGovernor, ProviderUnavailableError, is_retryable
+from app.adapters.http_pool import HttpClientPool
+from app.services.embedding_cache import EmbeddingCache
+
 logger = logging.getLogger(__name__)
 
 
+class EmbeddingUnavailableError(Exception):
+    """
+    An ingest batch could not be embedded (retries exhausted or circuit open).
+    """
+
+
 class EmbeddingClient:
     """
     Embedding client with support for Gemini or local sentence-transformers.
     """
 
-    def __init__(self, api_key: str, model: str = "models/embedding-001", provider: str = "gemini") -> None:
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "models/embedding-001",
+        provider: str = "gemini",
+        cache: EmbeddingCache | None = None,
+        http: HttpClientPool | None = None,
+        max_concurrency: int = 4,
+        max_batch_size: int = 100,
+        max_batch_chars: int = 20_000,
+        governor: ProviderGovernor | None = None,
+        local_workers: int = 1,
+        local_queue_size: int = 8,
+        local_batch_size: int = 32,
+    ) -> None:
         self.api_key = api_key
         self.model = model
         self.provider = provider
+        self.cache = cache
+        self.http = http or HttpClientPool()
+        # Gemini batch dispatch: up to max_concurrency requests in flight, each capped by
+        # max_batch_size texts (API limit 100) and ~max_batch_chars characters
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+        # Rate limits, retries and circuit breaking for the Gemini embedding quota
+        self.governor = governor or ProviderGovernor("gemini-embeddings")
+        # Local encoding runs on a worker pool off the event loop; at most local_workers +
+        # local_queue_size jobs of local_batch_size texts are pending, further callers wait
+        self.local_workers = local_workers
+        self.local_queue_size = local_queue_size
+        self.local_batch_size = local_batch_size
+        self._executor: ThreadPoolExecutor | None = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
         self._local_model = None
         if provider == "gemini" and not api_key:
@@ -31,25 +73,127 @@ class EmbeddingClient:
                 logger.exception("Failed to load local embedding model %s", self.model)
                 raise exc
 
-    async def embed(self, texts: Iterable[str]) -> List[List[float]]:
+    async def embed(self, texts: Iterable[str], priority: str = "chat") -> List[List[float]]:
+        """
+        Vectors aligned with `texts`. `priority` is "chat" for live queries or "ingest" for
+        KB uploads, which may not use the provider quota reserved for chat. Only ingest
+        embeddings are persisted in the DB cache tier.
+        """
         texts_list = list(texts)
+        if self.cache is None or not texts_list:
+            return await self._embed_uncached(texts_list, priority)
+        persistent = priority == "ingest"
+        results = await self.cache.get_many(self.provider, self.model, texts_list, persistent)
+        # Only misses go to the provider; identical texts in one call are embedded once
+        missing: Dict[str, List[int]] = {}
+        for idx, (text, vec) in enumerate(zip(texts_list, results)):
+            if vec is None:
+                missing.setdefault(text, []).append(idx)
+        if missing:
+            fresh_texts = list(missing)
+            fresh = await self._embed_uncached(fresh_texts, priority)
+            for text, vec in zip(fresh_texts, fresh):
+                for idx in missing[text]:
+                    results[idx] = vec
+            await self.cache.put_many(self.provider, self.model, fresh_texts, fresh, persistent)
+        return results  # type: ignore[return-value]
+
+    def cache_stats(self) -> Dict[str, int | float]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    async def _embed_uncached(self, texts_list: List[str], priority: str = "chat") -> List[List[float]]:
         if self.provider == "local":
-            return self._embed_local(texts_list)
+            return await self._embed_local_offloaded(texts_list)
         # gemini provider
         if not self.api_key:
             return [[0.0] * 32 for _ in texts_list]
-        batch_size = 16
+        batches = self._plan_batches(texts_list)
+        # Batches run concurrently (bounded by the semaphore) and are reassembled in input order
+        outputs = await asyncio.gather(*(self._dispatch_batch(texts_list[a:b], priority) for a, b in batches))
         results: List[List[float]] = []
-        for i in range(0, len(texts_list), batch_size):
-            chunk = texts_list[i : i + batch_size]
-            batch_embeddings = await self._embed_batch_gemini(chunk)
-            results.extend(batch_embeddings)
-        if len(results) != len(texts_list):
-            logger.warning("Embeddings total mismatch; expected %s got %s", len(texts_list), len(results))
-            while len(results) < len(texts_list):
-                results.append([0.0] * 32)
+        for vectors in outputs:
+            results.extend(vectors)
         return results
 
+    def _plan_batches(self, texts_list: List[str]) -> List[tuple[int, int]]:
+        """
+        Split into [start, end) ranges of at most max_batch_size texts and roughly
+        max_batch_chars characters, so long chunks go in smaller requests.
+        """
+        batches: List[tuple[int, int]] = []
+        start = chars = 0
+        for idx, text in enumerate(texts_list):
+            full = idx - start >= self.max_batch_size
+            if idx > start and (full or chars + len(text) > self.max_batch_chars):
+                batches.append((start, idx))
+                start, chars = idx, 0
+            chars += len(text)
+        if start < len(texts_list):
+            batches.append((start, len(texts_list)))
+        return batches
+
+    def _semaphore(self, name: str, size: int) -> asyncio.Semaphore:
+        # asyncio primitives are loop-bound; recreate when a new loop (tests, scripts) shows up
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphores = {}
+            self._semaphore_loop = loop
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(size)
+        return self._semaphores[name]
+
+    async def _dispatch_batch(self, texts_list: List[str], priority: str = "chat") -> List[List[float]]:
+        """
+        Embed one batch through the governor, which retries only this batch on 429/5xx/transport
+        errors. Once its retries are exhausted or the circuit is open, chat queries get zero
+        vectors (RAG falls back to lexical search) while ingest raises EmbeddingUnavailableError,
+        so no zero vector is ever stored in the KB.
+        """
+        tokens = sum(len(text) for text in texts_list) // 4 + 1
+        async with self._semaphore("gemini", self.max_concurrency):
+            try:
+                return await self.governor.call(
+                    lambda: self._embed_batch_gemini(texts_list),
+                    priority=priority,
+                    tokens=tokens,
+                    retryable=lambda exc: is_retryable(exc) or isinstance(exc, ValueError),
+                )
+            except ProviderUnavailableError as exc:
+                logger.warning("Skipping embedding batch of %s: %s", len(texts_list), exc)
+                failure: Exception = exc
+            except httpx.HTTPStatusError as exc:
+                logger.error(
+                    "Embedding request failed (status %s): %s", exc.response.status_code, exc.response.text
+                )
+                failure = exc
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.exception("Embedding request failed")
+                failure = exc
+        if priority == "ingest":
+            raise EmbeddingUnavailableError(f"Embedding provider unavailable: {failure}") from failure
+        return [[0.0] * 32 for _ in texts_list]
+
+    async def _embed_local_offloaded(self, texts_list: List[str]) -> List[List[float]]:
+        """
+        Encode on the worker pool in local_batch_size jobs. One call holds at most one queue slot
+        at a time, so a large upload cannot starve chat queries queued behind it.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.local_workers, thread_name_prefix="embed-local")
+        loop = asyncio.get_running_loop()
+        slots = self._semaphore("local", self.local_workers + self.local_queue_size)
+        results: List[List[float]] = []
+        for start in range(0, len(texts_list), self.local_batch_size):
+            chunk = texts_list[start : start + self.local_batch_size]
+            async with slots:
+                results.extend(await loop.run_in_executor(self._executor, self._embed_local, chunk))
+        return results
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     def _embed_local(self, texts_list: List[str]) -> List[List[float]]:
         if not self._local_model:
             logger.error("Local embedding model not initialized")
@@ -59,6 +203,9 @@ class EmbeddingClient:
         return [np.asarray(v).tolist() for v in vectors]
 
     async def _embed_batch_gemini(self, texts_list: List[str]) -> List[List[float]]:
+        """
+        One batchEmbedContents request. Raises on HTTP errors and on a short response.
+        """
         url = f"{self.base_url}/models/embedding-001:batchEmbedContents"
         payload = {
             "requests": [
@@ -69,43 +216,9 @@ class EmbeddingClient:
                 for text in texts_list
             ]
         }
-        retries = 2
-        backoff = 1.0
-        for attempt in range(retries + 1):
-            try:
-                async with httpx.AsyncClient(timeout=20.0) as client:
-                    res = await client.post(url, params={"key": self.api_key}, json=payload)
-                    if res.status_code == 429 and attempt < retries:
-                        retry_after = float(res.headers.get("retry-after", backoff))
-                        await asyncio.sleep(retry_after)
-                        backoff *= 2
-                        continue
-                    res.raise_for_status()
-                    data = res.json()
-                    embeddings = []
-                    for item in data.get("embeddings", []):
-                        embeddings.append(item.get("values", []))
-                    if len(embeddings) != len(texts_list):
-                        logger.warning(
-                            "Embeddings count mismatch; expected %s got %s",
-                            len(texts_list),
-                            len(embeddings),
-                        )
-                    return embeddings
-            except httpx.HTTPStatusError as exc:
-                body = exc.response.text if exc.response else ""
-                logger.error(
-                    "Embedding request failed (status %s): %s",
-                    exc.response.status_code if exc.response else "?",
-                    body,
-                )
-                if exc.response is not None and exc.response.status_code == 429 and attempt < retries:
-                    retry_after = float(exc.response.headers.get("retry-after", backoff))
-                    await asyncio.sleep(retry_after)
-                    backoff *= 2
-                    continue
-                break
-            except Exception as exc:  # pragma: no cover - defensive
-                logger.exception("Embedding request failed")
-                break
-        return [[0.0] * 32 for _ in texts_list]
+        res = await self.http.client.post(url, params={"key": self.api_key}, json=payload)
+        res.raise_for_status()
+        embeddings = [item.get("values", []) for item in res.json().get("embeddings", [])]
+        if len(embeddings) != len(texts_list):
+            raise ValueError(f"Embeddings count mismatch; expected {len(texts_list)} got {len(embeddings)}")
+        return embeddings
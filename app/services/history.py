@@ -0,0 +1,152 @@
+import hashlib
+import re
+from typing import Dict, List, Sequence, Tuple
+
+from app.models.schemas import ChatRequest, Message
+from app.utils.cache import LRUCache
+
+_ELLIPSIS = "…"
+# Same rule as the bubble segmenter: terminal punctuation (optionally closed by a quote or
+# bracket) followed by whitespace or the end of the text, so "Rp150.000" or "v2.1" do not end one
+_SENTENCE_RE = re.compile(r"[.!?…]+[\"')\]»”’]*(?=\s|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token), the same rule the provider governor uses.
+    """
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[: max(max_tokens - 1, 0) * 4].rstrip() + _ELLIPSIS
+
+
+def fit_context(chunks: Sequence[str], max_tokens: int) -> List[str]:
+    """
+    Keep retrieved chunks in rank order while they fit; the first chunk is truncated rather
+    than dropped so some context always survives.
+    """
+    kept: List[str] = []
+    used = 0
+    for chunk in chunks:
+        cost = estimate_tokens(chunk)
+        if used + cost > max_tokens:
+            if not kept and max_tokens > 0:
+                kept.append(truncate_tokens(chunk, max_tokens))
+            break
+        kept.append(chunk)
+        used += cost
+    return kept
+
+
+def format_message(msg: Message) -> str:
+    media_note = f" [media: {msg.media_type} {msg.media_url}]" if msg.media_url else ""
+    return f"{msg.role.upper()}: {msg.content}{media_note}\n"
+
+
+def _summary_line(msg: Message, max_tokens: int) -> str:
+    text = " ".join(msg.content.split())
+    match = _SENTENCE_RE.search(text)
+    first = text[: match.end()] if match else text
+    return f"- {msg.role.upper()}: {truncate_tokens(first, max_tokens)}"
+
+
+class _Conversation:
+    def __init__(self) -> None:
+        self.lines: List[str] = []  # one extractive summary line per message, in order
+        self.fingerprints: List[str] = []
+
+
+class HistoryCompactor:
+    """
+    Token-budgeted history for the prompt: the newest messages are kept verbatim while they fit
+    (the last one always, truncated if it alone is too big); older ones collapse into an
+    extractive rolling summary (first sentence of each turn, newest lines kept within the
+    summary budget). Summary lines are cached per conversation and only computed for messages
+    that newly fall out of the verbatim window. Per process; a miss just recomputes the lines.
+    """
+
+    def __init__(
+        self, max_conversations: int = 2048, max_recent_messages: int = 20, line_tokens: int = 40
+    ) -> None:
+        self._conversations: LRUCache[_Conversation] = LRUCache(max_entries=max_conversations)
+        self.max_recent_messages = max_recent_messages
+        self.line_tokens = line_tokens
+        self.lines_built = 0
+
+    @staticmethod
+    def conversation_key(payload: ChatRequest) -> Tuple[str, str, str]:
+        return payload.tenant_id, payload.channel or "", payload.user_id
+
+    def assemble(
+        self, payload: ChatRequest, max_tokens: int, summary_share: float = 0.25
+    ) -> Tuple[str | None, List[str]]:
+        """
+        (summary or None, verbatim message lines) using at most about `max_tokens`.
+        """
+        messages = payload.messages
+        if not messages:
+            return None, []
+        summary_budget = int(max_tokens * summary_share)
+        recent_budget = max_tokens - summary_budget
+        recent: List[str] = []
+        used = 0
+        start = len(messages)
+        for msg in reversed(messages[-self.max_recent_messages :]):
+            line = format_message(msg)
+            cost = estimate_tokens(line)
+            if recent and used + cost > recent_budget:
+                break
+            if not recent and cost > recent_budget:
+                line = truncate_tokens(line.rstrip("\n"), max(recent_budget, 1)) + "\n"
+                cost = estimate_tokens(line)
+            recent.append(line)
+            used += cost
+            start -= 1
+        recent.reverse()
+        if start == 0:
+            return None, recent
+
+        lines = self._summary_lines(payload, start)
+        # Unused verbatim budget flows to the summary
+        budget = summary_budget + max(recent_budget - used, 0)
+        kept: List[str] = []
+        for line in reversed(lines):
+            cost = estimate_tokens(line) + 1
+            if cost > budget:
+                break
+            kept.append(line)
+            budget -= cost
+        kept.reverse()
+        omitted = start - len(kept)
+        header = f"({start} pesan sebelumnya diringkas" + (f", {omitted} tertua dilewati)" if omitted else ")")
+        return "\n".join([header, *kept]), recent
+
+    def _summary_lines(self, payload: ChatRequest, count: int) -> List[str]:
+        key = self.conversation_key(payload)
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            conversation = _Conversation()
+            self._conversations.put(key, conversation)
+        messages = payload.messages
+        # Clients resend the whole thread; checking the last cached message is enough to tell
+        # an unchanged prefix from an edited or different thread (which is rebuilt)
+        checked = min(len(conversation.fingerprints), count)
+        if checked and conversation.fingerprints[checked - 1] != self._fingerprint(messages[checked - 1]):
+            conversation.lines.clear()
+            conversation.fingerprints.clear()
+        for msg in messages[len(conversation.lines) : count]:
+            conversation.lines.append(_summary_line(msg, self.line_tokens))
+            conversation.fingerprints.append(self._fingerprint(msg))
+            self.lines_built += 1
+        return conversation.lines[:count]
+
+    @staticmethod
+    def _fingerprint(msg: Message) -> str:
+        return hashlib.blake2b(f"{msg.role}\x1f{msg.content}".encode("utf-8"), digest_size=8).hexdigest()
+
+    def stats(self) -> Dict[str, int | float]:
+        return {**self._conversations.stats(), "lines_built": self.lines_built}
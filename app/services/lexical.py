@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.vectors import top_k
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-_./,][0-9a-z]+)*")
+_PART_RE = re.compile(r"[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens that keep SKUs, model numbers and prices intact ("sku-123", "rp150.000")
+    and also emit their alphabetic/numeric parts so "SKU 123" or "150000" still match.
+    """
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+            digits = "".join(p for p in parts if p.isdigit())
+            if digits and any(ch in token for ch in ".,") and digits not in parts:
+                tokens.append(digits)  # 150.000 -> 150000
+    return tokens
+
+
+class BM25Index:
+    """
+    Incremental inverted index with Okapi BM25 scoring. Documents are addressed by row number
+    so they line up with the tenant vector index.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._doc_len = np.zeros(16, dtype=np.float32)
+        self._total_len = 0
+        self._entries = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._doc_terms)
+
+    @property
+    def nbytes(self) -> int:
+        # Rough estimate: ~100 bytes per posting entry across the dict layers
+        return self._entries * 100 + self._doc_len.nbytes
+
+    def upsert(self, row: int, text: str) -> None:
+        self.remove(row)
+        terms = Counter(tokenize(text))
+        if row >= self._doc_len.shape[0]:
+            grown = np.zeros(max(row + 1, self._doc_len.shape[0] * 2), dtype=np.float32)
+            grown[: self._doc_len.shape[0]] = self._doc_len
+            self._doc_len = grown
+        length = sum(terms.values())
+        self._doc_terms[row] = terms
+        self._doc_len[row] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[row] = tf
+        self._entries += len(terms)
+
+    def remove(self, row: int) -> None:
+        terms = self._doc_terms.pop(row, None)
+        if terms is None:
+            return
+        self._total_len -= int(self._doc_len[row])
+        self._doc_len[row] = 0
+        self._entries -= len(terms)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(row, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query_terms: Iterable[str], k: int, mask: np.ndarray | None = None) -> List[Tuple[int, float]]:
+        """
+        BM25 top-k as (row, score), best first. A row `mask` drops unselected postings before scoring.
+        """
+        n_docs = self.size
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs or 1.0
+        scores = np.zeros(self._doc_len.shape[0], dtype=np.float32)
+        matched = False
+        for term in set(query_terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            matched = True
+            doc_rows = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            tf = np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            if mask is not None:
+                keep = mask[doc_rows]
+                doc_rows, tf = doc_rows[keep], tf[keep]
+            norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_rows] / avg_len)
+            scores[doc_rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        if not matched:
+            return []
+        best = [int(row) for row in top_k(scores, k) if scores[row] > 0]
+        return [(row, float(scores[row])) for row in best]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], k: int, rrf_k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked (row, score) lists: score(row) = sum 1 / (rrf_k + rank).
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (row, _) in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -1,20 +1,55 @@
+import asyncio
 import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
 
+import numpy as np
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app.adapters.llm_gemini import GeminiClient
 from app.models.schemas import ChatRequest, ChatResponse, TenantSettings
+from app.services.pipeline import Deadline, DeadlineExceeded, PipelineResult, Stage, StagePipeline
 from app.services.post_processing import PostProcessor
 from app.services.prompt import PromptBuilder
 from app.services.rag import RAGService
+from app.services.response_cache import ResponseCache, settings_version
+from app.services.semantic_cache import SemanticCache, answer_scope
 from app.services.sop import SopStateService
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class _ReplyLookup:
+    """
+    Outcome of the reply-cache lookup for one turn: the cached text and which cache served it,
+    or the keys under which the generated reply should be stored.
+    """
+
+    text: str | None = None
+    source: str | None = None  # "exact" | "semantic"
+    exact_key: str | None = None
+    vector: np.ndarray | None = None
+    scope: str | None = None
+
+
 class Orchestrator:
+    """
+    Chat turn = a stage graph (retrieve ∥ sop → prompt → reply_cache) followed by generation,
+    all under one deadline taken from the tenant's performance settings (per channel, then per
+    tenant, then `default_deadline_ms`). Retrieval is optional: if it fails or uses more than
+    `context_budget_share` of the deadline the turn continues without context. With a
+    `session_factory`, retrieval and SOP tracking each run on their own session so they can
+    overlap, and retrieval past its budget is detached rather than cancelled (interrupting it
+    mid DB query or mid provider call is not safe). Without a factory both use the request
+    session one after the other, and retrieval is bounded only by the whole deadline, since a
+    detached run would keep using the session. Once `max_detached_retrievals` detached runs
+    are in flight, further turns skip retrieval instead of adding to the backlog.
+    """
+
     def __init__(
         self,
         llm_client: GeminiClient,
@@ -22,43 +57,273 @@ class Orchestrator:
         prompt_builder: PromptBuilder,
         post_processor: PostProcessor,
         sop_state_service: SopStateService | None = None,
+        response_cache: ResponseCache | None = None,
+        semantic_cache: SemanticCache | None = None,
+        session_factory: Callable[[], AsyncSession] | None = None,
+        default_deadline_ms: int = 0,
+        context_budget_share: float = 0.35,
+        max_detached_retrievals: int = 16,
     ) -> None:
         self.llm_client = llm_client
         self.rag_service = rag_service
         self.prompt_builder = prompt_builder
         self.post_processor = post_processor
         self.sop_state_service = sop_state_service
+        self.response_cache = response_cache
+        self.semantic_cache = semantic_cache
+        self.session_factory = session_factory
+        self.default_deadline_ms = default_deadline_ms
+        self.pipeline = StagePipeline(
+            [
+                Stage(
+                    "retrieve",
+                    self._retrieve_stage,
+                    optional=True,
+                    fallback=[],
+                    max_share=context_budget_share if session_factory else 1.0,
+                    detach=session_factory is not None,
+                ),
+                Stage("sop", self._sop_stage, after=() if session_factory else ("retrieve",), optional=True),
+                Stage("prompt", self._prompt_stage, after=("retrieve", "sop")),
+                Stage(
+                    "reply_cache", self._reply_cache_stage, after=("prompt",), optional=True, fallback=_ReplyLookup()
+                ),
+            ],
+            max_detached=max_detached_retrievals,
+        )
 
     async def handle_chat(
         self, session: AsyncSession, payload: ChatRequest, tenant_settings: TenantSettings
     ) -> ChatResponse:
+        deadline = self._deadline(payload, tenant_settings)
+        prepared = await self._prepare(session, payload, tenant_settings, deadline)
+        prompt, lookup = prepared.values["prompt"], prepared.values["reply_cache"]
+
+        if lookup.text is not None:
+            llm_text = lookup.text
+        else:
+            start = time.perf_counter()
+            try:
+                llm_text = await asyncio.wait_for(
+                    self.llm_client.generate(
+                        prompt,
+                        metadata={"tenant_id": payload.tenant_id},
+                        prefix=self.prompt_builder.static_prefix(tenant_settings),
+                    ),
+                    timeout=deadline.remaining(),
+                )
+            except asyncio.TimeoutError as exc:
+                raise self._deadline_error() from exc
+            except HTTPException:
+                raise
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.exception("LLM generation failed")
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate response"
+                ) from exc
+            prepared.timings_ms["generate"] = round((time.perf_counter() - start) * 1000, 2)
+            self._store_reply(tenant_settings, lookup, llm_text)
+
+        bubbles = self.post_processor.split_bubbles(llm_text, tenant_settings.persona)
+        return ChatResponse(
+            bubbles=bubbles,
+            full_text=llm_text,
+            metadata=self._metadata(payload, prepared, deadline),
+            retrieved_context=prepared.values["retrieve"],
+        )
+
+    async def stream_chat(
+        self, session: AsyncSession, payload: ChatRequest, tenant_settings: TenantSettings
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run retrieval and SOP tracking now (while the DB session is open), then return an
+        iterator of (event, data): one "bubble" per completed bubble, then "done" with the
+        full ChatResponse, or "error" if generation fails mid-stream.
+        """
+        deadline = self._deadline(payload, tenant_settings)
+        prepared = await self._prepare(session, payload, tenant_settings, deadline)
+        return self._stream_events(payload, tenant_settings, prepared, deadline)
+
+    def invalidate_cached_replies(self, tenant_id: str) -> None:
+        """
+        Drop every cached reply of the tenant (called after KB or settings writes).
+        """
+        if self.response_cache is not None:
+            self.response_cache.invalidate(tenant_id)
+        if self.semantic_cache is not None:
+            self.semantic_cache.invalidate(tenant_id)
+
+    async def _stream_events(
+        self, payload: ChatRequest, tenant_settings: TenantSettings, prepared: PipelineResult, deadline: Deadline
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        prompt, lookup = prepared.values["prompt"], prepared.values["reply_cache"]
+        parts: List[str] = []
+
+        async def deltas() -> AsyncIterator[str]:
+            if lookup.text is not None:
+                parts.append(lookup.text)
+                yield lookup.text
+                return
+            stream = self.llm_client.stream_generate(
+                prompt,
+                metadata={"tenant_id": payload.tenant_id},
+                prefix=self.prompt_builder.static_prefix(tenant_settings),
+            )
+            try:
+                while True:
+                    try:
+                        delta = await asyncio.wait_for(stream.__anext__(), timeout=deadline.remaining())
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError as exc:
+                        raise self._deadline_error() from exc
+                    parts.append(delta)
+                    yield delta
+            finally:
+                await stream.aclose()
+
+        bubbles = []
+        start = time.perf_counter()
         try:
-            retrieved_context = await self.rag_service.retrieve(session, payload)
+            async for bubble in self.post_processor.stream_bubbles(deltas(), tenant_settings.persona):
+                bubbles.append(bubble)
+                yield "bubble", bubble.model_dump()
+        except HTTPException as exc:
+            yield "error", {"status_code": exc.status_code, "detail": exc.detail}
+            return
         except Exception:  # pragma: no cover - defensive
-            logger.exception("Context retrieval failed, continuing without context")
-            retrieved_context = []
+            logger.exception("LLM streaming failed")
+            yield "error", {"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": "Failed to generate response"}
+            return
 
-        sop_current = None
-        if self.sop_state_service:
-            sop_state = await self.sop_state_service.update_from_history(session, tenant_settings.sop, payload)
-            sop_current = sop_state.current_step
+        full_text = "".join(parts)
+        if lookup.text is None:
+            prepared.timings_ms["generate"] = round((time.perf_counter() - start) * 1000, 2)
+        self._store_reply(tenant_settings, lookup, full_text)
+        response = ChatResponse(
+            bubbles=bubbles,
+            full_text=full_text,
+            metadata=self._metadata(payload, prepared, deadline),
+            retrieved_context=prepared.values["retrieve"],
+        )
+        yield "done", response.model_dump()
+
+    def _deadline(self, payload: ChatRequest, tenant_settings: TenantSettings) -> Deadline:
+        performance = tenant_settings.performance
+        deadline_ms = (
+            performance.channel_deadline_ms.get(payload.channel or "")
+            or performance.deadline_ms
+            or self.default_deadline_ms
+        )
+        return Deadline(deadline_ms / 1000 if deadline_ms > 0 else None)
+
+    @staticmethod
+    def _deadline_error() -> HTTPException:
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Response deadline exceeded")
+
+    @staticmethod
+    def _metadata(payload: ChatRequest, prepared: PipelineResult, deadline: Deadline) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {"channel": payload.channel, "locale": payload.locale}
+        lookup = prepared.values["reply_cache"]
+        if lookup.source is not None:
+            metadata["response_cache"] = lookup.source
+        metadata["timings_ms"] = {
+            **prepared.timings_ms,
+            "total": round((deadline.clock() - deadline.started) * 1000, 2),
+        }
+        if prepared.degraded:
+            metadata["degraded"] = list(prepared.degraded)
+        if payload.metadata.get("merged_requests"):
+            metadata["merged_requests"] = payload.metadata["merged_requests"]
+        return metadata
+
+    async def _lookup_reply(
+        self,
+        payload: ChatRequest,
+        tenant_settings: TenantSettings,
+        prompt: str,
+        retrieved_context: List[str],
+        sop_step: str | None,
+    ) -> _ReplyLookup:
+        """
+        Exact prompt match first, then a near-duplicate question with the same context and SOP step.
+        The returned lookup also carries the keys to store a freshly generated reply under.
+        """
+        lookup = _ReplyLookup()
+        if not self.llm_client.api_key:
+            return lookup  # the "not configured" placeholder is not a reply worth keeping
+        tenant_id = tenant_settings.tenant_id
+        performance = tenant_settings.performance
+        exact = self.response_cache is not None and performance.response_cache_enabled
+        semantic = self.semantic_cache is not None and performance.semantic_cache_enabled
+        if not exact and not semantic:
+            return lookup
+        settings_hash = settings_version(tenant_settings)
+        kb_version = self.rag_service.kb_version(tenant_id)
+
+        if exact:
+            lookup.exact_key = self.response_cache.make_key(prompt, self.llm_client.model, settings_hash, kb_version)
+            lookup.text = self.response_cache.get(tenant_id, lookup.exact_key, performance)
+            if lookup.text is not None:
+                lookup.source = "exact"
+                return lookup
+
+        if semantic:
+            lookup.vector = await self.rag_service.query_embedding(payload)
+            if lookup.vector is not None:
+                lookup.scope = answer_scope(
+                    self.llm_client.model, settings_hash, kb_version, retrieved_context, sop_step
+                )
+                lookup.text = self.semantic_cache.get(tenant_id, lookup.vector, lookup.scope, performance)
+                if lookup.text is not None:
+                    lookup.source = "semantic"
+        return lookup
 
-        prompt = self.prompt_builder.build_chat_prompt(payload, retrieved_context, tenant_settings, sop_current)
+    def _store_reply(self, tenant_settings: TenantSettings, lookup: _ReplyLookup, text: str) -> None:
+        if lookup.text is not None:
+            return
+        tenant_id = tenant_settings.tenant_id
+        if lookup.exact_key is not None:
+            self.response_cache.put(tenant_id, lookup.exact_key, text, tenant_settings.performance)
+        if lookup.vector is not None:
+            self.semantic_cache.put(tenant_id, lookup.vector, lookup.scope, text, tenant_settings.performance)
 
+    async def _prepare(
+        self, session: AsyncSession, payload: ChatRequest, tenant_settings: TenantSettings, deadline: Deadline
+    ) -> PipelineResult:
+        """
+        Run the stage graph up to (and including) the reply-cache lookup.
+        """
         try:
-            llm_text = await self.llm_client.generate(prompt, metadata={"tenant_id": payload.tenant_id})
-        except HTTPException:
-            raise
-        except Exception as exc:  # pragma: no cover - defensive
-            logger.exception("LLM generation failed")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate response"
-            ) from exc
-
-        bubbles = self.post_processor.split_bubbles(llm_text)
-        return ChatResponse(
-            bubbles=bubbles,
-            full_text=llm_text,
-            metadata={"channel": payload.channel, "locale": payload.locale},
-            retrieved_context=retrieved_context,
+            return await self.pipeline.run(
+                deadline, session=session, payload=payload, tenant_settings=tenant_settings
+            )
+        except DeadlineExceeded as exc:
+            raise self._deadline_error() from exc
+
+    async def _retrieve_stage(self, ctx: Dict[str, Any]) -> List[str]:
+        if self.session_factory is None:
+            return await self.rag_service.retrieve(ctx["session"], ctx["payload"])
+        async with self.session_factory() as retrieve_session:
+            return await self.rag_service.retrieve(retrieve_session, ctx["payload"])
+
+    async def _sop_stage(self, ctx: Dict[str, Any]) -> str | None:
+        if not self.sop_state_service:
+            return None
+        sop, payload = ctx["tenant_settings"].sop, ctx["payload"]
+        if self.session_factory is None:
+            state = await self.sop_state_service.update_from_history(ctx["session"], sop, payload)
+        else:
+            async with self.session_factory() as sop_session:
+                state = await self.sop_state_service.update_from_history(sop_session, sop, payload)
+        return state.current_step
+
+    async def _prompt_stage(self, ctx: Dict[str, Any]) -> str:
+        return self.prompt_builder.build_chat_prompt(
+            ctx["payload"], ctx["retrieve"], ctx["tenant_settings"], ctx["sop"]
+        )
+
+    async def _reply_cache_stage(self, ctx: Dict[str, Any]) -> _ReplyLookup:
+        return await self._lookup_reply(
+            ctx["payload"], ctx["tenant_settings"], ctx["prompt"], ctx["retrieve"], ctx["sop"]
         )
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """
+    A required stage did not finish within the request deadline.
+    """
+
+
+class StageSkipped(Exception):
+    """
+    A detach stage was not started: too many detached runs are still in flight.
+    """
+
+
+class Deadline:
+    """
+    End-to-end time budget of one request. `seconds=None` (or <= 0) means no deadline.
+    """
+
+    def __init__(self, seconds: float | None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.total = seconds if seconds and seconds > 0 else None
+        self.clock = clock
+        self.started = clock()
+
+    def remaining(self) -> float | None:
+        if self.total is None:
+            return None
+        return max(0.0, self.total - (self.clock() - self.started))
+
+    def budget(self, share: float = 1.0) -> float | None:
+        """
+        Time a stage may take: what is left, capped at `share` of the whole deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return min(remaining, self.total * share)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of the chat pipeline. `run` receives the shared context (request inputs plus the
+    results of earlier stages, by name). Optional stages that fail or run out of budget yield
+    `fallback` instead of failing the request; `max_share` caps the fraction of the deadline
+    the stage may use so that a slow optional stage leaves time for generation. A `detach`
+    stage is not cancelled when its budget runs out: the pipeline stops waiting and the run
+    finishes in the background (result discarded), for work that is unsafe to interrupt.
+    """
+
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    after: Tuple[str, ...] = ()
+    optional: bool = False
+    fallback: Any = None
+    max_share: float = 1.0
+    detach: bool = False
+
+
+# Detached stage runs still in flight; referenced here so they are not garbage collected
+_detached: set[asyncio.Task] = set()
+
+
+def _forget_detached(task: asyncio.Task) -> None:
+    _detached.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Detached stage run failed after the pipeline moved on: %r", task.exception())
+
+
+async def _wait_detached(stage: Stage, context: Dict[str, Any], budget: float | None) -> Any:
+    task = asyncio.ensure_future(stage.run(context))
+    try:
+        done, _ = await asyncio.wait({task}, timeout=budget)
+    finally:
+        if not task.done():
+            _detached.add(task)
+            task.add_done_callback(_forget_detached)
+    if not done:
+        raise asyncio.TimeoutError
+    return task.result()
+
+
+@dataclass
+class PipelineResult:
+    values: Dict[str, Any]
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    degraded: List[str] = field(default_factory=list)
+
+
+class StagePipeline:
+    """
+    Runs a declared stage graph: every stage starts as soon as the stages it depends on have
+    finished, so independent stages (retrieval and SOP tracking) overlap. While `max_detached`
+    detached runs (process-wide) are still finishing in the background, detach stages are not
+    started and take the optional fallback, so a slow backend cannot pile up work; 0 = no cap.
+    """
+
+    def __init__(self, stages: Sequence[Stage], max_detached: int = 0) -> None:
+        seen: set[str] = set()
+        for stage in stages:
+            if stage.name in seen:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            missing = [name for name in stage.after if name not in seen]
+            if missing:
+                # Dependencies must be declared first, which also rules out cycles
+                raise ValueError(f"Stage {stage.name} depends on undeclared stage(s): {', '.join(missing)}")
+            seen.add(stage.name)
+        self.stages = list(stages)
+        self.max_detached = max_detached
+        self.detach_skipped = 0
+
+    async def run(self, deadline: Deadline, **inputs: Any) -> PipelineResult:
+        context: Dict[str, Any] = dict(inputs)
+        result = PipelineResult(values={})
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage) -> None:
+            if stage.after:
+                await asyncio.gather(*(tasks[name] for name in stage.after))
+            budget = deadline.budget(stage.max_share)
+            start = time.perf_counter()
+            try:
+                if budget is not None and budget <= 0:
+                    raise asyncio.TimeoutError
+                if stage.detach:
+                    if self.max_detached > 0 and len(_detached) >= self.max_detached:
+                        self.detach_skipped += 1
+                        raise StageSkipped(f"{len(_detached)} detached runs in flight")
+                    value = await _wait_detached(stage, context, budget)
+                else:
+                    value = await asyncio.wait_for(stage.run(context), timeout=budget)
+            except Exception as exc:
+                if not stage.optional:
+                    if isinstance(exc, asyncio.TimeoutError):
+                        raise DeadlineExceeded(f"Stage {stage.name} exceeded the request deadline") from exc
+                    raise
+                logger.warning("Optional stage %s skipped (%s)", stage.name, type(exc).__name__)
+                result.degraded.append(stage.name)
+                value = stage.fallback
+            finally:
+                result.timings_ms[stage.name] = round((time.perf_counter() - start) * 1000, 2)
+            context[stage.name] = value
+            result.values[stage.name] = value
+
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "detached_in_flight": len(_detached),
+            "max_detached": self.max_detached,
+            "detach_skipped": self.detach_skipped,
+        }
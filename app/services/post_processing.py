@@ -1,13 +1,43 @@
-from textwrap import wrap
-from typing import List
+from typing import AsyncIterator, List
 
-from app.models.schemas import Bubble
+from app.models.schemas import Bubble, PersonaSettings
+from app.services.segmenter import BubbleSegmenter
 
 
 class PostProcessor:
-    def __init__(self, max_bubble_length: int = 280) -> None:
+    def __init__(self, max_bubble_length: int = 280, min_delay_ms: int = 400, max_delay_ms: int = 4000) -> None:
         self.max_bubble_length = max_bubble_length
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
 
-    def split_bubbles(self, text: str) -> List[Bubble]:
-        chunks = wrap(text, self.max_bubble_length, break_long_words=False, replace_whitespace=False)
-        return [Bubble(text=chunk.strip(), delay_ms=1200 if idx else 0) for idx, chunk in enumerate(chunks)]
+    def split_bubbles(self, text: str, persona: PersonaSettings | None = None) -> List[Bubble]:
+        segmenter = BubbleSegmenter(self.max_bubble_length)
+        chunks = segmenter.feed(text) + segmenter.flush()
+        return [Bubble(text=chunk, delay_ms=self.typing_delay_ms(chunk, idx, persona)) for idx, chunk in enumerate(chunks)]
+
+    async def stream_bubbles(
+        self, deltas: AsyncIterator[str], persona: PersonaSettings | None = None
+    ) -> AsyncIterator[Bubble]:
+        """
+        Streaming split_bubbles: each bubble is yielded as soon as the segmenter completes it.
+        """
+        segmenter = BubbleSegmenter(self.max_bubble_length)
+        idx = 0
+        async for delta in deltas:
+            for chunk in segmenter.feed(delta):
+                yield Bubble(text=chunk, delay_ms=self.typing_delay_ms(chunk, idx, persona))
+                idx += 1
+        for chunk in segmenter.flush():
+            yield Bubble(text=chunk, delay_ms=self.typing_delay_ms(chunk, idx, persona))
+            idx += 1
+
+    def typing_delay_ms(self, text: str, index: int, persona: PersonaSettings | None = None) -> int:
+        """
+        Time to "type" a bubble at the persona's speed, clamped. The first bubble goes out
+        immediately since generation latency already reads as typing.
+        """
+        if index == 0:
+            return 0
+        cps = persona.typing_speed_cps if persona is not None else PersonaSettings().typing_speed_cps
+        delay = len(text) / max(cps, 1.0) * 1000
+        return int(min(max(delay, self.min_delay_ms), self.max_delay_ms))
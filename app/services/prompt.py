@@ -1,19 +1,70 @@
 import logging
-from typing import List
+from typing import List, NamedTuple
 
 from app.models.schemas import ChatRequest, TenantSettings
+from app.services.history import HistoryCompactor, estimate_tokens, fit_context
+from app.services.response_cache import settings_version
 from app.services.sop import SopStateMachine
+from app.utils.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+_SECTION_TOKENS = 40  # section headings around context, summary and history
+_MIN_TURN_TOKENS = 256  # history floor, so the latest turn survives a prefix that fills the ceiling
+
+
+class PromptPrefix(NamedTuple):
+    version: str  # tenant settings version the prefix was compiled from
+    text: str
+
 
 class PromptBuilder:
     """
     Build structured prompts so instructions, persona, and SOP are consistently applied.
+    The static part (persona, SOP steps, task rules) is compiled once per tenant settings
+    version and memoized; it always starts the prompt so it can be served from Gemini's
+    context cache. Turn-specific parts (SOP hint, KB context, history) follow it and are
+    trimmed to a per-tenant token ceiling.
     """
 
-    def __init__(self, sop_machine: SopStateMachine | None = None) -> None:
+    def __init__(
+        self,
+        sop_machine: SopStateMachine | None = None,
+        max_prefixes: int = 1024,
+        history: HistoryCompactor | None = None,
+        token_ceiling: int = 8000,
+        context_share: float = 0.4,
+    ) -> None:
         self.sop_machine = sop_machine
+        self._prefixes: LRUCache[PromptPrefix] = LRUCache(max_entries=max_prefixes)
+        self.history = history or HistoryCompactor()
+        self.token_ceiling = token_ceiling
+        self.context_share = context_share
+
+    def static_prefix(self, tenant_settings: TenantSettings) -> PromptPrefix:
+        version = settings_version(tenant_settings)
+        key = (tenant_settings.tenant_id, version)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            prefix = PromptPrefix(version, self._compile_prefix(tenant_settings))
+            self._prefixes.put(key, prefix)
+        return prefix
+
+    @staticmethod
+    def _compile_prefix(tenant_settings: TenantSettings) -> str:
+        persona = tenant_settings.persona
+        sop_steps = "\n".join(f"{step.order}. {step.description}" for step in tenant_settings.sop.steps)
+        return (
+            f"Peran kamu: AI asisten {persona.persona} yang berbicara dengan gaya: {persona.style_prompt}. "
+            f"Tone: {persona.tone}. Bahasa utama: {persona.language}.\n"
+            f"Ikuti SOP berikut (urutkan sesuai kebutuhan percakapan):\n{sop_steps if sop_steps else '- Tidak ada SOP khusus.'}\n\n"
+            "Tugas:\n"
+            "- Jawab secara ringkas, jelas, dan empatik.\n"
+            "- Jika jawaban panjang, pecah menjadi beberapa bubble pendek.\n"
+            "- Lakukan upsell hanya jika sesuai konteks dan sopan.\n"
+            "- Jika konteks tidak cukup, minta klarifikasi singkat.\n"
+            "- Hormati jadwal kerja jika disediakan.\n\n"
+        )
 
     def build_chat_prompt(
         self,
@@ -22,33 +73,30 @@ class PromptBuilder:
         tenant_settings: TenantSettings,
         sop_current: str | None = None,
     ) -> str:
-        persona = tenant_settings.persona
-        sop_steps = "\n".join(f"{step.order}. {step.description}" for step in tenant_settings.sop.steps)
+        """
+        Prefix, SOP hint, KB context and history, kept under the tenant's token ceiling: context
+        gets at most `context_share` of what the fixed parts leave, history the rest (older turns
+        summarized by the HistoryCompactor).
+        """
         sop_hint = ""
         if self.sop_machine:
             sop_hint = self.sop_machine.sop_hint(tenant_settings.sop, sop_current)
-        context_block = "\n".join(retrieved_context) if retrieved_context else "Tidak ada konteks tambahan."
 
-        prompt = (
-            f"Peran kamu: AI asisten {persona.persona} yang berbicara dengan gaya: {persona.style_prompt}. "
-            f"Tone: {persona.tone}. Bahasa utama: {persona.language}.\n"
-            f"Ikuti SOP berikut (urutkan sesuai kebutuhan percakapan):\n{sop_steps if sop_steps else '- Tidak ada SOP khusus.'}\n\n"
-            f"Panduan langkah saat ini: {sop_hint}\n\n"
-            f"Gunakan konteks pengetahuan bisnis berikut jika relevan:\n{context_block}\n\n"
-            f"Percakapan terbaru:\n"
-        )
+        prefix = self.static_prefix(tenant_settings).text
+        hint = f"Panduan langkah saat ini: {sop_hint}\n\n"
+        ceiling = tenant_settings.performance.prompt_token_ceiling or self.token_ceiling
+        available = max(ceiling - estimate_tokens(prefix) - estimate_tokens(hint) - _SECTION_TOKENS, 0)
 
-        for msg in payload.messages[-10:]:
-            media_note = f" [media: {msg.media_type} {msg.media_url}]" if msg.media_url else ""
-            prompt += f"{msg.role.upper()}: {msg.content}{media_note}\n"
+        context = fit_context(retrieved_context, int(available * self.context_share))
+        context_block = "\n".join(context) if context else "Tidak ada konteks tambahan."
+        history_budget = max(available - estimate_tokens(context_block), _MIN_TURN_TOKENS)
+        summary, recent = self.history.assemble(payload, history_budget)
+
+        parts = [prefix, hint, f"Gunakan konteks pengetahuan bisnis berikut jika relevan:\n{context_block}\n\n"]
+        if summary:
+            parts.append(f"Ringkasan percakapan sebelumnya:\n{summary}\n\n")
+        parts.append("Percakapan terbaru:\n")
+        parts.extend(recent)
 
-        prompt += (
-            "\nTugas:\n"
-            "- Jawab secara ringkas, jelas, dan empatik.\n"
-            "- Jika jawaban panjang, pecah menjadi beberapa bubble pendek.\n"
-            "- Lakukan upsell hanya jika sesuai konteks dan sopan.\n"
-            "- Jika konteks tidak cukup, minta klarifikasi singkat.\n"
-            "- Hormati jadwal kerja jika disediakan.\n"
-        )
         logger.debug("Prompt built for tenant=%s user=%s", payload.tenant_id, payload.user_id)
-        return prompt
+        return "".join(parts)
@@ -0,0 +1,81 @@
+import logging
+from typing import Dict, Hashable, List
+
+import numpy as np
+
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form used as cache key: lowercase, collapsed whitespace, trailing punctuation dropped.
+    """
+    return " ".join(text.lower().split()).strip(" ?!.,")
+
+
+class QueryCache:
+    """
+    Per-tenant caches of query text -> embedding and (query, KB generation, options) -> top-k chunk ids.
+    The generation counter is bumped on every KB upsert in this process, so cached results never
+    outlive the knowledge they were computed from.
+    """
+
+    def __init__(self, max_entries_per_tenant: int = 512, ttl_seconds: float = 300.0) -> None:
+        self.max_entries_per_tenant = max_entries_per_tenant
+        self.ttl_seconds = ttl_seconds
+        self._generations: Dict[str, int] = {}
+        self._embeddings: Dict[str, LRUCache[np.ndarray]] = {}
+        self._results: Dict[str, LRUCache[List[str]]] = {}
+
+    def generation(self, tenant_id: str) -> int:
+        return self._generations.get(tenant_id, 0)
+
+    def bump(self, tenant_id: str) -> int:
+        self._generations[tenant_id] = self.generation(tenant_id) + 1
+        results = self._results.get(tenant_id)
+        if results is not None:
+            results.clear()  # every key carries the old generation now
+        return self._generations[tenant_id]
+
+    def get_embedding(self, tenant_id: str, query: str) -> np.ndarray | None:
+        return self._tenant(self._embeddings, tenant_id).get(normalize_query(query))
+
+    def put_embedding(self, tenant_id: str, query: str, vector: np.ndarray) -> None:
+        if vector.size and vector.any():
+            self._tenant(self._embeddings, tenant_id).put(normalize_query(query), vector)
+
+    def get_result(self, tenant_id: str, query: str, options: Hashable = None) -> List[str] | None:
+        key = (normalize_query(query), self.generation(tenant_id), options)
+        return self._tenant(self._results, tenant_id).get(key)
+
+    def put_result(
+        self, tenant_id: str, query: str, ids: List[str], options: Hashable = None, generation: int | None = None
+    ) -> None:
+        """
+        Cache a top-k id list. `generation` is the one read before the search started; if the KB
+        changed since, the result may predate the upsert and is dropped.
+        """
+        if generation is not None and generation != self.generation(tenant_id):
+            return
+        key = (normalize_query(query), self.generation(tenant_id), options)
+        self._tenant(self._results, tenant_id).put(key, list(ids))
+
+    def _tenant(self, caches: Dict[str, LRUCache], tenant_id: str) -> LRUCache:
+        cache = caches.get(tenant_id)
+        if cache is None:
+            cache = caches[tenant_id] = LRUCache(self.max_entries_per_tenant, self.ttl_seconds)
+        return cache
+
+    def stats(self) -> Dict[str, Dict[str, int | float]]:
+        def merged(caches: Dict[str, LRUCache]) -> Dict[str, int | float]:
+            totals: Dict[str, int | float] = {"entries": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+            for cache in caches.values():
+                for key in totals:
+                    totals[key] += cache.stats()[key]
+            lookups = totals["hits"] + totals["misses"]
+            totals["hit_rate"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+            return totals
+
+        return {"embeddings": merged(self._embeddings), "results": merged(self._results)}
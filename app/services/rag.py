@@ -1,25 +1,100 @@
+import asyncio
+import heapq
 import logging
-from typing import List
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
-import math
+import numpy as np
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.db_models import KnowledgeItemModel
 from app.models.schemas import ChatRequest, KnowledgeItem
+from app.services.ann import AnnBackend, make_ann_backend
+from app.services.embedding_batcher import EmbeddingBatcher
 from app.services.embeddings import EmbeddingClient
+from app.services.lexical import reciprocal_rank_fusion, tokenize
+from app.services.query_cache import QueryCache
+from app.services.vector_cache import TenantVectorIndex, VectorIndexCache, normalize_tags
+from app.services.vector_codec import decode_embedding, encode_embedding
+from app.services.vectors import normalize, top_k as top_k_indices
 
 logger = logging.getLogger(__name__)
 
 
+class _LoadLock:
+    """
+    Per-tenant load lock, dropped once no request is using it.
+    """
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
 class RAGService:
-    def __init__(self, embedding_client: EmbeddingClient) -> None:
+    def __init__(
+        self,
+        embedding_client: EmbeddingClient,
+        default_top_k: int = 5,
+        index_cache: VectorIndexCache | None = None,
+        ann_backend: str = "none",
+        ann_min_items: int = 20_000,
+        ann_options: Dict[str, Any] | None = None,
+        quantization: str = "none",
+        storage_dtype: str = "float32",
+        rescore_candidates: int = 50,
+        hybrid: bool = True,
+        hybrid_candidates: int = 50,
+        rrf_k: int = 60,
+        query_cache: QueryCache | None = None,
+        stream_block_size: int = 2048,
+        query_batcher: EmbeddingBatcher | None = None,
+        stream_recheck_seconds: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self.embedding_client = embedding_client
+        # Query embeddings of concurrent chat turns are coalesced into one provider call
+        self.query_batcher = query_batcher
+        self.default_top_k = default_top_k
+        self.index_cache = index_cache or VectorIndexCache()
+        # Tenants below ann_min_items always use the exact scan
+        self.ann_backend = ann_backend
+        self.ann_min_items = ann_min_items
+        self.ann_options = ann_options or {}
+        # Quantized indexes shortlist rescore_candidates rows, then rescore them from stored vectors
+        self.quantization = quantization
+        self.storage_dtype = storage_dtype
+        self.rescore_candidates = rescore_candidates
+        # Vector and BM25 rankings of hybrid_candidates rows each are fused with reciprocal-rank fusion
+        self.hybrid = hybrid
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.query_cache = query_cache
+        # Tenants whose index does not fit the cache budget are scanned from the DB in blocks
+        # (tenant -> when that was found); the fit is re-checked after a KB upsert or once
+        # stream_recheck_seconds have passed
+        self.stream_block_size = stream_block_size
+        self.stream_recheck_seconds = stream_recheck_seconds
+        self.clock = clock
+        self.streaming_tenants: Dict[str, float] = {}
+        self._kb_versions: Dict[str, int] = {}
+        self._load_locks: Dict[str, _LoadLock] = {}
+        self._ann_builds: Dict[str, asyncio.Task] = {}
+
+    def kb_version(self, tenant_id: str) -> int:
+        """
+        Counter bumped on every KB upsert of the tenant in this process (0 until the first one).
+        """
+        return self._kb_versions.get(tenant_id, 0)
 
     async def upsert(self, session: AsyncSession, tenant_id: str, items: List[KnowledgeItem]) -> None:
         try:
             contents = [item.content for item in items]
-            vectors = await self.embedding_client.embed(contents)
+            vectors = await self.embedding_client.embed(contents, priority="ingest")
+            written: List[tuple[KnowledgeItemModel, List[float]]] = []
             for item in items:
                 vec = vectors.pop(0) if vectors else []
                 db_item = None
@@ -34,57 +109,380 @@ class RAGService:
                     db_item.title = item.title
                     db_item.content = item.content
                     db_item.tags = item.tags
-                    db_item.embedding = vec
+                    db_item.embedding = encode_embedding(vec, self.embedding_client.model, self.storage_dtype)
                 else:
-                    session.add(
-                        KnowledgeItemModel(
-                            tenant_id=tenant_id,
-                            title=item.title,
-                            content=item.content,
-                            tags=item.tags,
-                            embedding=vec,
-                        )
+                    db_item = KnowledgeItemModel(
+                        tenant_id=tenant_id,
+                        title=item.title,
+                        content=item.content,
+                        tags=item.tags,
+                        embedding=encode_embedding(vec, self.embedding_client.model, self.storage_dtype),
                     )
+                    session.add(db_item)
+                written.append((db_item, vec))
             await session.commit()
+            self.index_cache.update(
+                tenant_id,
+                [str(row.id) for row, _ in written],
+                [row.content for row, _ in written],
+                [vec for _, vec in written],
+                [f"{row.title}\n{row.content}" for row, _ in written],
+                [row.tags for row, _ in written],
+            )
+            self._maybe_attach_ann(tenant_id, self.index_cache.peek(tenant_id))
+            self.streaming_tenants.pop(tenant_id, None)  # the KB changed; see whether it fits now
+            if self.query_cache is not None:
+                self.query_cache.bump(tenant_id)
+            self._kb_versions[tenant_id] = self.kb_version(tenant_id) + 1
             logger.info("Upserted %s knowledge items for tenant=%s", len(items), tenant_id)
         except Exception as exc:  # pragma: no cover - defensive
             await session.rollback()
             logger.exception("Failed to upsert knowledge")
             raise exc
 
-    async def retrieve(self, session: AsyncSession, payload: ChatRequest) -> List[str]:
+    async def retrieve(
+        self,
+        session: AsyncSession,
+        payload: ChatRequest,
+        top_k: int | None = None,
+        tags: Sequence[str] | None = None,
+    ) -> List[str]:
+        """
+        Top-k knowledge contents for the user turn. `tags` (default: the request's kb_tags or
+        metadata["kb_tags"]) restricts retrieval to items carrying any of them.
+        """
+        k = top_k if top_k is not None else self.default_top_k
         try:
-            user_query = " ".join(msg.content for msg in payload.messages if msg.role == "user")
-            user_vecs = await self.embedding_client.embed([user_query])
-            if not user_vecs:
-                return []
-            user_vec = user_vecs[0]
-
-            stmt = select(KnowledgeItemModel).where(KnowledgeItemModel.tenant_id == payload.tenant_id).limit(100)
-            result = await session.execute(stmt)
-            items = result.scalars().all()
+            user_query = self._user_query(payload)
+            tenant_id = payload.tenant_id
+            tag_filter = normalize_tags(tags if tags is not None else self._request_tags(payload))
+            options = (k, tag_filter)
+            # Read before any await: an upsert landing mid-search must not get this result cached
+            generation = self.query_cache.generation(tenant_id) if self.query_cache is not None else None
+            cached = await self._cached_result(session, tenant_id, user_query, options)
+            if cached is not None:
+                return cached
 
-            scored = []
-            for item in items:
-                if not item.embedding:
-                    continue
-                score = self._cosine_similarity(user_vec, item.embedding)
-                scored.append((score, item.content))
-            scored.sort(key=lambda x: x[0], reverse=True)
-            return [text for _, text in scored[:5]]
+            query = await self._embed_query(tenant_id, user_query)
+            index = await self._get_index(session, tenant_id)
+            if index is None:
+                if tenant_id not in self.streaming_tenants or query is None or not query.any():
+                    return []
+                scored = await self._stream_search(session, tenant_id, query, k, tag_filter)
+                ids = [item_id for item_id, _ in scored]
+                if self.query_cache is not None:
+                    self.query_cache.put_result(tenant_id, user_query, ids, options, generation)
+                return await self._fetch_contents(session, ids)
+            if query is not None and (index.dim != query.shape[0] or not query.any()):
+                # Embeddings unavailable (e.g. zero vectors without an API key): lexical only
+                query = None
+            mask = index.tag_mask(tag_filter) if tag_filter else None
+            hits = await self._search(session, index, query, user_query, k, mask)
+            if self.query_cache is not None:
+                ids = [index.ids[row] for row, _ in hits]
+                self.query_cache.put_result(tenant_id, user_query, ids, options, generation)
+            return [index.contents[row] for row, _ in hits]
         except Exception as exc:  # pragma: no cover - defensive
             logger.exception("Failed to retrieve context")
             return []
 
+    async def query_embedding(self, payload: ChatRequest) -> np.ndarray | None:
+        """
+        Normalized embedding of the user turn, as used for retrieval (so usually a query-cache hit).
+        None when embeddings are unavailable.
+        """
+        try:
+            query = await self._embed_query(payload.tenant_id, self._user_query(payload))
+        except Exception:  # pragma: no cover - defensive
+            logger.exception("Failed to embed query")
+            return None
+        return query if query is not None and query.any() else None
+
+    @staticmethod
+    def _user_query(payload: ChatRequest) -> str:
+        return " ".join(msg.content for msg in payload.messages if msg.role == "user")
+
     @staticmethod
-    def _cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
-        if not vec_a or not vec_b:
-            return 0.0
-        if len(vec_a) != len(vec_b):
-            return 0.0
-        dot = sum(a * b for a, b in zip(vec_a, vec_b))
-        norm_a = math.sqrt(sum(a * a for a in vec_a))
-        norm_b = math.sqrt(sum(b * b for b in vec_b))
-        if norm_a == 0 or norm_b == 0:
-            return 0.0
-        return dot / (norm_a * norm_b)
+    def _request_tags(payload: ChatRequest) -> List[str]:
+        if payload.kb_tags:
+            return payload.kb_tags
+        tags = payload.metadata.get("kb_tags")
+        if isinstance(tags, str):
+            return tags.split(",")
+        return [str(tag) for tag in tags] if isinstance(tags, list) else []
+
+    async def _embed_query(self, tenant_id: str, user_query: str) -> np.ndarray | None:
+        if self.query_cache is not None:
+            cached = self.query_cache.get_embedding(tenant_id, user_query)
+            if cached is not None:
+                return cached
+        if self.query_batcher is not None:
+            user_vec = await self.query_batcher.embed(user_query)
+        else:
+            user_vec = (await self.embedding_client.embed([user_query]) or [[]])[0]
+        if not len(user_vec):
+            return None
+        query = normalize(np.asarray(user_vec, dtype=np.float32))
+        if self.query_cache is not None:
+            self.query_cache.put_embedding(tenant_id, user_query, query)
+        return query
+
+    async def _cached_result(
+        self, session: AsyncSession, tenant_id: str, user_query: str, options: Tuple
+    ) -> List[str] | None:
+        """
+        Contents for a cached top-k id list, or None when not cached or the index was evicted.
+        """
+        if self.query_cache is None:
+            return None
+        ids = self.query_cache.get_result(tenant_id, user_query, options)
+        if ids is not None and self._is_streaming(tenant_id):
+            return await self._fetch_contents(session, ids)
+        index = self.index_cache.peek(tenant_id)
+        if ids is None or index is None:
+            return None
+        rows = [index.row_of(item_id) for item_id in ids]
+        if any(row is None for row in rows):
+            return None
+        return [index.contents[row] for row in rows]
+
+    async def _search(
+        self,
+        session: AsyncSession,
+        index: TenantVectorIndex,
+        query: np.ndarray | None,
+        query_text: str,
+        k: int,
+        mask: np.ndarray | None = None,
+    ) -> List[tuple[int, float]]:
+        n = max(k, self.hybrid_candidates)
+        lexical = index.lexical.search(tokenize(query_text), n, mask) if self.hybrid else []
+        if query is None:
+            return lexical[:k]
+        depth = n if lexical else k
+        if index.quantized:
+            shortlist = index.search(query, max(depth, self.rescore_candidates), mask)
+            vector = await self._rescore(session, index, query, shortlist, depth)
+        else:
+            vector = index.search(query, depth, mask)
+        vector = [hit for hit in vector if hit[1] != 0.0]  # rows stored without a comparable vector
+        if not lexical:
+            return vector[:k]
+        return reciprocal_rank_fusion([vector, lexical], k, self.rrf_k)
+
+    async def _rescore(
+        self,
+        session: AsyncSession,
+        index: TenantVectorIndex,
+        query: np.ndarray,
+        shortlist: List[tuple[int, float]],
+        k: int,
+    ) -> List[tuple[int, float]]:
+        """
+        Re-rank a quantized shortlist using the stored (full precision) vectors.
+        """
+        if len(shortlist) <= 1:
+            return shortlist[:k]
+        rows = {uuid.UUID(index.ids[row]): row for row, _ in shortlist}
+        stmt = select(KnowledgeItemModel.id, KnowledgeItemModel.embedding).where(KnowledgeItemModel.id.in_(list(rows)))
+        try:
+            result = (await session.execute(stmt)).all()
+        except Exception:  # pragma: no cover - defensive
+            logger.exception("Rescore lookup failed; using quantized ranking")
+            return shortlist[:k]
+        exact = {}
+        for row in result:
+            vec, _ = decode_embedding(row.embedding)
+            if vec.shape[0] == index.dim:
+                exact[rows[row.id]] = float(normalize(vec) @ query)
+        scores = np.asarray([exact.get(row, score) for row, score in shortlist], dtype=np.float32)
+        return [(shortlist[i][0], float(scores[i])) for i in top_k_indices(scores, k)]
+
+    async def _stream_search(
+        self,
+        session: AsyncSession,
+        tenant_id: str,
+        query: np.ndarray,
+        k: int,
+        tag_filter: Tuple[str, ...] = (),
+    ) -> List[tuple[str, float]]:
+        """
+        Exact top-k over the tenant's stored vectors without materializing the KB: pages through
+        the id/embedding projection in stream_block_size blocks and keeps a running top-k heap.
+        Memory stays at one block regardless of KB size. Returns (id, score) best first.
+        """
+        columns = [KnowledgeItemModel.id, KnowledgeItemModel.embedding]
+        if tag_filter:
+            columns.append(KnowledgeItemModel.tags)
+        stmt = select(*columns).where(KnowledgeItemModel.tenant_id == tenant_id)
+        wanted = set(tag_filter)
+        heap: List[tuple[float, str]] = []
+        result = await session.stream(stmt.execution_options(yield_per=self.stream_block_size))
+        async for block in result.partitions(self.stream_block_size):
+            ids: List[str] = []
+            vectors: List[np.ndarray] = []
+            for row in block:
+                if wanted and not wanted.intersection(normalize_tags(row.tags)):
+                    continue
+                vec, model = decode_embedding(row.embedding)
+                if vec.shape[0] != query.shape[0] or (model and model != self.embedding_client.model):
+                    continue
+                ids.append(str(row.id))
+                vectors.append(vec)
+            if not vectors:
+                continue
+            scores = normalize(np.asarray(vectors, dtype=np.float32)) @ query
+            for i in top_k_indices(scores, k):
+                entry = (float(scores[i]), ids[i])
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        return [(item_id, score) for score, item_id in sorted(heap, reverse=True)]
+
+    async def _fetch_contents(self, session: AsyncSession, ids: List[str]) -> List[str]:
+        """
+        Contents for the given item ids, in the same order; ids that no longer exist are dropped.
+        """
+        if not ids:
+            return []
+        stmt = select(KnowledgeItemModel.id, KnowledgeItemModel.content).where(
+            KnowledgeItemModel.id.in_([uuid.UUID(item_id) for item_id in ids])
+        )
+        contents = {str(row.id): row.content for row in (await session.execute(stmt)).all()}
+        return [contents[item_id] for item_id in ids if item_id in contents]
+
+    async def _get_index(self, session: AsyncSession, tenant_id: str) -> TenantVectorIndex | None:
+        """
+        Cached or freshly loaded tenant index; None for tenants that only fit the streaming scan.
+        """
+        if self._is_streaming(tenant_id):
+            return None
+        index = self.index_cache.get(tenant_id)
+        if index is not None:
+            return index
+        entry = self._load_locks.get(tenant_id)
+        if entry is None:
+            entry = self._load_locks[tenant_id] = _LoadLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                return await self._load_and_cache(session, tenant_id)
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._load_locks[tenant_id]
+
+    async def _load_and_cache(
+        self, session: AsyncSession, tenant_id: str, attempts: int = 3
+    ) -> TenantVectorIndex | None:
+        for _ in range(attempts):
+            # Another request may have loaded it while we waited
+            if tenant_id in self.index_cache:
+                return self.index_cache.get(tenant_id)
+            if self._is_streaming(tenant_id):
+                return None
+            version = self.kb_version(tenant_id)
+            index = await self._load_index(session, tenant_id)
+            if index is None:
+                self.streaming_tenants[tenant_id] = self.clock()
+                logger.warning("Tenant=%s exceeds the vector cache budget; using streaming scan", tenant_id)
+                return None
+            if self.kb_version(tenant_id) != version:
+                # An upsert committed while loading; its rows may be missing from this snapshot
+                continue
+            self._maybe_attach_ann(tenant_id, index)
+            self.index_cache.put(tenant_id, index)
+            return index
+        logger.warning("Tenant=%s KB kept changing while loading; serving an uncached index", tenant_id)
+        return index
+
+    def _is_streaming(self, tenant_id: str) -> bool:
+        marked = self.streaming_tenants.get(tenant_id)
+        if marked is None:
+            return False
+        if self.clock() - marked >= self.stream_recheck_seconds:
+            del self.streaming_tenants[tenant_id]  # the cache budget may have room now
+            return False
+        return True
+
+    def _maybe_attach_ann(self, tenant_id: str, index: TenantVectorIndex | None) -> None:
+        """
+        Start a background ANN build once the tenant index is large enough (or its backend
+        wants retraining). Searches keep using the exact scan, or the old backend, until the
+        new one is swapped in.
+        """
+        if index is None or index.size < self.ann_min_items or tenant_id in self._ann_builds:
+            return
+        if index.ann is not None and not index.ann.needs_rebuild(index.size):
+            return
+        backend = make_ann_backend(self.ann_backend, **self.ann_options)
+        if backend is not None:
+            self._ann_builds[tenant_id] = asyncio.ensure_future(self._build_ann(tenant_id, index, backend))
+
+    async def _build_ann(self, tenant_id: str, index: TenantVectorIndex, backend: AnnBackend) -> None:
+        snapshot = index.begin_ann_build()
+        try:
+            # k-means over a large KB takes seconds; keep it off the event loop
+            await asyncio.to_thread(backend.build, snapshot)
+        except Exception:  # pragma: no cover - defensive
+            logger.exception("ANN build failed for tenant=%s; using exact search", tenant_id)
+            index.finish_ann_build(None)
+            return
+        finally:
+            self._ann_builds.pop(tenant_id, None)
+        index.finish_ann_build(backend)
+        logger.info("Attached %s ANN index for tenant=%s rows=%s", self.ann_backend, tenant_id, index.size)
+        cached = self.index_cache.peek(tenant_id)
+        if cached is index:
+            self.index_cache.put(tenant_id, index)  # re-check the budget now that it includes the ANN arrays
+        else:
+            self._maybe_attach_ann(tenant_id, cached)  # reloaded meanwhile
+
+    async def _load_index(self, session: AsyncSession, tenant_id: str) -> TenantVectorIndex | None:
+        """
+        Build the tenant index from the DB in blocks. Returns None as soon as the estimated
+        index size passes the cache budget. The dimension comes from the stored vectors (the
+        most common one), never from the query: a fallback query vector during an embedding
+        outage must not shape the cached index. Rows without a comparable vector (empty, other
+        dimension or another embedding model) still get a zero vector, so BM25 and tag filters
+        cover them; they score 0 and never rank in vector search.
+        """
+        stmt = select(
+            KnowledgeItemModel.id,
+            KnowledgeItemModel.title,
+            KnowledgeItemModel.content,
+            KnowledgeItemModel.tags,
+            KnowledgeItemModel.embedding,
+        ).where(KnowledgeItemModel.tenant_id == tenant_id)
+        ids: List[str] = []
+        contents: List[str] = []
+        texts: List[str] = []
+        tags: List[List[str] | None] = []
+        vectors: List[np.ndarray | None] = []
+        estimated = 0
+        result = await session.stream(stmt.execution_options(yield_per=self.stream_block_size))
+        async for block in result.partitions(self.stream_block_size):
+            for row in block:
+                vec, model = decode_embedding(row.embedding)
+                # Vectors from another embedding model are not comparable until re-embedded
+                comparable = vec.size > 0 and not (model and model != self.embedding_client.model)
+                text = f"{row.title}\n{row.content}"
+                ids.append(str(row.id))
+                contents.append(row.content)
+                texts.append(text)
+                tags.append(row.tags)
+                vectors.append(vec if comparable else None)
+                estimated += TenantVectorIndex.estimate_row_bytes(vec.shape[0], self.quantization, text)
+            if estimated > self.index_cache.max_bytes:
+                await result.close()
+                return None
+        dims = Counter(vec.shape[0] for vec in vectors if vec is not None)
+        dim = dims.most_common(1)[0][0] if dims else 0
+        zero = np.zeros(dim, dtype=np.float32)
+        vectors = [vec if vec is not None and vec.shape[0] == dim else zero for vec in vectors]
+        index = TenantVectorIndex.from_rows(
+            ids, contents, vectors, dim, quantization=self.quantization, texts=texts, tags=tags
+        )
+        logger.info("Loaded vector index tenant=%s rows=%s dim=%s", tenant_id, index.size, dim)
+        return index
@@ -0,0 +1,63 @@
+import hashlib
+import json
+from typing import Any, Dict
+
+from app.models.schemas import PerformanceSettings, TenantSettings
+from app.utils.cache import LRUCache
+
+
+def settings_version(tenant_settings: TenantSettings) -> str:
+    """
+    Short digest of everything in the tenant settings that can change a reply (the API key cannot).
+    """
+    data = tenant_settings.model_dump(mode="json", exclude={"api_key"})
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    Exact-match cache of LLM replies, one LRU per tenant. The key is a hash of the final prompt,
+    the model, the tenant settings version and the tenant KB version, so any change to persona,
+    SOP or knowledge base yields a new key; `invalidate` additionally drops a tenant's entries
+    right away. TTL and size come from each tenant's PerformanceSettings. Per process only.
+    """
+
+    def __init__(self) -> None:
+        self._tenants: Dict[str, LRUCache[str]] = {}
+
+    @staticmethod
+    def make_key(prompt: str, model: str, settings_hash: str, kb_version: int) -> str:
+        raw = "\x1f".join([model, settings_hash, str(kb_version), prompt])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache(self, tenant_id: str, performance: PerformanceSettings) -> LRUCache[str]:
+        cache = self._tenants.get(tenant_id)
+        if cache is None:
+            cache = self._tenants[tenant_id] = LRUCache(max_entries=performance.response_cache_max_entries)
+        cache.max_entries = performance.response_cache_max_entries  # shrinks on the next put
+        return cache
+
+    def get(self, tenant_id: str, key: str, performance: PerformanceSettings) -> str | None:
+        return self._cache(tenant_id, performance).get(key)
+
+    def put(self, tenant_id: str, key: str, text: str, performance: PerformanceSettings) -> None:
+        if not text:
+            return
+        self._cache(tenant_id, performance).put(key, text, ttl_seconds=performance.response_cache_ttl_seconds)
+
+    def invalidate(self, tenant_id: str) -> None:
+        cache = self._tenants.get(tenant_id)
+        if cache is not None:
+            cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        tenants = {tenant_id: cache.stats() for tenant_id, cache in self._tenants.items()}
+        hits = sum(s["hits"] for s in tenants.values())
+        misses = sum(s["misses"] for s in tenants.values())
+        return {
+            "entries": sum(s["entries"] for s in tenants.values()),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "tenants": tenants,
+        }
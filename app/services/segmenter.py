@@ -0,0 +1,103 @@
+from collections import deque
+from typing import Deque, List, Tuple
+
+# Cut strengths, weakest first
+WORD = 0
+SENTENCE = 1
+LINE = 2  # line breaks: list items, emoji-terminated lines
+PARAGRAPH = 3
+
+_SENTENCE_END = ".!?…"
+_CLOSERS = "\"')]»”’"
+
+
+def _is_emoji(ch: str) -> bool:
+    code = ord(ch)
+    return code >= 0x1F000 or 0x2600 <= code <= 0x27BF or 0x2B00 <= code <= 0x2BFF or code == 0xFE0F
+
+
+class BubbleSegmenter:
+    """
+    Incremental chat-bubble splitter. Text is fed as it streams in; every character is classified
+    exactly once, and candidate cut points (paragraph, line, sentence, word) are remembered.
+    A paragraph break always ends a bubble. Once a bubble would exceed `target_length`, it is cut
+    at the strongest (then latest) boundary past a quarter of the target, so sentences are kept
+    whole where possible; failing that at the latest boundary, else a hard cut.
+    Cuts are decided at fixed scan positions, so any chunking of the input gives the same bubbles.
+    """
+
+    def __init__(self, target_length: int = 280) -> None:
+        self.target_length = max(target_length, 2)
+        self._buffer = ""  # text not yet emitted, starting at absolute offset _start
+        self._start = 0
+        self._scanned = 0  # absolute offset of the next character to classify
+        self._boundaries: Deque[Tuple[int, int]] = deque()  # (absolute cut offset, strength)
+
+    def feed(self, delta: str) -> List[str]:
+        """
+        Add streamed text and return the bubbles it completed.
+        """
+        self._buffer += delta
+        out: List[str] = []
+        end = self._start + len(self._buffer)
+        # Classification only looks backwards, so new characters are final once seen
+        while self._scanned < end:
+            self._classify(self._scanned, out)
+            self._scanned += 1
+        return out
+
+    def flush(self) -> List[str]:
+        """
+        End of stream: return the remaining text as the last bubble(s).
+        """
+        out: List[str] = []
+        self._cut(self._start + len(self._buffer), out)
+        return out
+
+    def _char(self, pos: int) -> str:
+        idx = pos - self._start
+        return self._buffer[idx] if 0 <= idx < len(self._buffer) else ""
+
+    def _classify(self, pos: int, out: List[str]) -> None:
+        ch = self._char(pos)
+        if ch.isspace():
+            prev = self._char(pos - 1)
+            if ch == "\n" and prev == "\n":
+                self._cut(pos, out)  # paragraph: always ends the bubble
+                return
+            if ch == "\n":
+                strength = LINE
+            elif prev in _SENTENCE_END or (prev and _is_emoji(prev)):
+                strength = SENTENCE
+            elif prev and prev in _CLOSERS and self._char(pos - 2) in _SENTENCE_END:
+                strength = SENTENCE
+            else:
+                strength = WORD
+            if prev and not prev.isspace():
+                self._boundaries.append((pos, strength))
+        if pos - self._start >= self.target_length:
+            self._cut(self._best_cut(), out)
+
+    def _best_cut(self) -> int:
+        limit = self._start + self.target_length
+        floor = self._start + self.target_length // 4
+        best: Tuple[int, int] | None = None
+        latest: int | None = None
+        for pos, strength in self._boundaries:
+            if pos > limit:
+                break
+            latest = pos
+            if pos >= floor and (best is None or strength >= best[1]):
+                best = (pos, strength)
+        if best is not None:
+            return best[0]
+        return latest if latest is not None and latest > self._start else limit
+
+    def _cut(self, pos: int, out: List[str]) -> None:
+        text = self._buffer[: pos - self._start].strip()
+        if text:
+            out.append(text)
+        self._buffer = self._buffer[pos - self._start :]
+        self._start = pos
+        while self._boundaries and self._boundaries[0][0] <= pos:
+            self._boundaries.popleft()
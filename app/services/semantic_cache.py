@@ -0,0 +1,119 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from app.models.schemas import PerformanceSettings
+
+
+class _Entry(NamedTuple):
+    vector: np.ndarray
+    scope: str
+    text: str
+    expires_at: float
+
+
+class _TenantEntries:
+    def __init__(self) -> None:
+        self.entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self) -> Dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def answer_scope(
+    model: str, settings_hash: str, kb_version: int, context: Sequence[str], sop_step: str | None
+) -> str:
+    """
+    Everything besides the question that must match for an answer to be reused: the retrieved
+    context set (order-insensitive), the SOP step, the model and the tenant settings/KB versions.
+    """
+    digest = hashlib.sha256()
+    for part in (model, settings_hash, str(kb_version), sop_step or ""):
+        digest.update(part.encode("utf-8") + b"\x1f")
+    for chunk in sorted(context):
+        digest.update(hashlib.sha256(chunk.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+class SemanticCache:
+    """
+    Per-tenant cache of answers keyed by question embedding. A lookup only considers entries with
+    the same scope (see `answer_scope`) and returns the closest one whose cosine similarity reaches
+    the tenant's threshold. Entries expire after the tenant TTL and the least recently used are
+    evicted beyond the tenant's max entries. Lookups are a single matrix-vector product over the
+    tenant's entries in that scope. Per process only.
+    """
+
+    def __init__(self) -> None:
+        self._tenants: Dict[str, _TenantEntries] = {}
+
+    def get(
+        self, tenant_id: str, vector: np.ndarray, scope: str, performance: PerformanceSettings
+    ) -> str | None:
+        tenant = self._tenants.setdefault(tenant_id, _TenantEntries())
+        now = time.monotonic()
+        keys: List[int] = []
+        vectors: List[np.ndarray] = []
+        for key, entry in list(tenant.entries.items()):
+            if entry.expires_at <= now:
+                del tenant.entries[key]
+                tenant.expirations += 1
+            elif entry.scope == scope and entry.vector.shape == vector.shape:
+                keys.append(key)
+                vectors.append(entry.vector)
+        if vectors:
+            scores = np.stack(vectors) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= performance.semantic_cache_threshold:
+                tenant.hits += 1
+                tenant.entries.move_to_end(keys[best])
+                return tenant.entries[keys[best]].text
+        tenant.misses += 1
+        return None
+
+    def put(
+        self, tenant_id: str, vector: np.ndarray, scope: str, text: str, performance: PerformanceSettings
+    ) -> None:
+        if not text:
+            return
+        tenant = self._tenants.setdefault(tenant_id, _TenantEntries())
+        tenant.entries[tenant.next_id] = _Entry(
+            vector, scope, text, time.monotonic() + performance.semantic_cache_ttl_seconds
+        )
+        tenant.next_id += 1
+        while len(tenant.entries) > max(performance.semantic_cache_max_entries, 0):
+            tenant.entries.popitem(last=False)
+            tenant.evictions += 1
+
+    def invalidate(self, tenant_id: str) -> None:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            tenant.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        tenants = {tenant_id: tenant.stats() for tenant_id, tenant in self._tenants.items()}
+        hits = sum(s["hits"] for s in tenants.values())
+        misses = sum(s["misses"] for s in tenants.values())
+        return {
+            "entries": sum(s["entries"] for s in tenants.values()),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "tenants": tenants,
+        }
@@ -25,6 +25,7 @@ class TenantService:
             timezone=tenant.timezone,
             followup_enabled=tenant.followup_enabled,
             followup_interval_minutes=int(tenant.followup_interval_minutes),
+            performance=tenant.performance or {},
         )
 
     async def upsert(self, session: AsyncSession, payload: TenantSettings) -> TenantSettings:
@@ -39,6 +40,7 @@ class TenantService:
                 tenant.timezone = payload.timezone
                 tenant.followup_enabled = payload.followup_enabled
                 tenant.followup_interval_minutes = payload.followup_interval_minutes
+                tenant.performance = payload.performance.model_dump()
             else:
                 session.add(
                     Tenant(
@@ -50,6 +52,7 @@ class TenantService:
                         timezone=payload.timezone,
                         followup_enabled=payload.followup_enabled,
                         followup_interval_minutes=payload.followup_interval_minutes,
+                        performance=payload.performance.model_dump(),
                     )
                 )
             await session.commit()
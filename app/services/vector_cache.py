@@ -0,0 +1,454 @@
+import logging
+import sys
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.ann import AnnBackend
+from app.services.lexical import BM25Index
+from app.services.vectors import QUANTIZATION_MODES, dequantize, normalize, quantize, top_k
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tags(tags: Iterable[str] | None) -> Tuple[str, ...]:
+    """
+    Case-insensitive, de-duplicated, sorted tag tuple (also usable as a cache key).
+    """
+    return tuple(sorted({tag.strip().lower() for tag in tags or () if tag and tag.strip()}))
+
+
+class TagIndex:
+    """
+    Tag -> boolean row bitmap, aligned with the rows of a tenant index. Selecting rows for a
+    tag filter is a vectorized OR over a few bitmaps instead of a pass over every chunk.
+    """
+
+    def __init__(self, capacity: int = 16) -> None:
+        self.capacity = max(capacity, 16)
+        self.bitmaps: Dict[str, np.ndarray] = {}
+        self._tags_by_row: Dict[int, Tuple[str, ...]] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bitmap.nbytes for bitmap in self.bitmaps.values()) + len(self._tags_by_row) * 64
+
+    def set(self, row: int, tags: Iterable[str] | None) -> None:
+        for tag in self._tags_by_row.pop(row, ()):
+            self.bitmaps[tag][row] = False
+        normalized = normalize_tags(tags)
+        if not normalized:
+            return
+        if row >= self.capacity:
+            self._grow(max(row + 1, self.capacity * 2))
+        for tag in normalized:
+            bitmap = self.bitmaps.get(tag)
+            if bitmap is None:
+                bitmap = self.bitmaps[tag] = np.zeros(self.capacity, dtype=bool)
+            bitmap[row] = True
+        self._tags_by_row[row] = normalized
+
+    def mask(self, tags: Iterable[str], size: int) -> np.ndarray:
+        """
+        Rows (of the first `size`) carrying any of `tags`.
+        """
+        out = np.zeros(size, dtype=bool)
+        for tag in normalize_tags(tags):
+            bitmap = self.bitmaps.get(tag)
+            if bitmap is not None:
+                out |= bitmap[:size]
+        return out
+
+    def _grow(self, capacity: int) -> None:
+        for tag, bitmap in self.bitmaps.items():
+            grown = np.zeros(capacity, dtype=bool)
+            grown[: bitmap.shape[0]] = bitmap
+            self.bitmaps[tag] = grown
+        self.capacity = capacity
+
+
+class VectorSnapshot:
+    """
+    Read-only view of the first `size` rows of a tenant index for an ANN build in a worker
+    thread. Upserts meanwhile either write rows in place (re-assigned after the build) or
+    grow the index into new arrays, which leaves this view intact.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray | None, quantization: str) -> None:
+        self._codes = codes
+        self._scales = scales
+        self.quantization = quantization
+        self.size = codes.shape[0]
+
+    def rows(self, selector: np.ndarray | slice) -> np.ndarray:
+        scales = self._scales[selector] if self._scales is not None else None
+        return dequantize(self._codes[selector], scales, self.quantization)
+
+    def score(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        return self.rows(rows if rows is not None else slice(0, self.size)) @ query
+
+
+class TenantVectorIndex:
+    """
+    In-memory search index for one tenant: a contiguous matrix of normalized vectors
+    plus parallel id/content lookups. Rows are updated in place on upsert.
+    Vectors are kept as float32, or as float16 / per-row-scaled int8 codes when quantized.
+    An optional ANN backend replaces the exact scan once attached. A BM25 index over
+    title/content shares the same row numbers for hybrid and lexical-only retrieval, and a
+    tag bitmap index restricts any of them to tagged rows before scoring.
+    """
+
+    # Tag filters selecting at most this share of rows are scored exactly instead of via ANN
+    FILTER_EXACT_FRACTION = 0.1
+
+    def __init__(self, dim: int, capacity: int = 0, quantization: str = "none") -> None:
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.dim = dim
+        self.quantization = quantization
+        codes, scales = quantize(np.zeros((max(capacity, 16), dim), dtype=np.float32), quantization)
+        self._codes = codes
+        self._scales = scales
+        self.size = 0
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._content_bytes = 0
+        self.ann: AnnBackend | None = None
+        self._ann_written: List[int] | None = None  # rows written while an ANN build runs
+        self.lexical = BM25Index()
+        self.tags = TagIndex(capacity)
+
+    @classmethod
+    def from_rows(
+        cls,
+        ids: Sequence[str],
+        contents: Sequence[str],
+        vectors: Sequence[Sequence[float]] | np.ndarray,
+        dim: int,
+        quantization: str = "none",
+        texts: Sequence[str] | None = None,
+        tags: Sequence[Sequence[str] | None] | None = None,
+    ) -> "TenantVectorIndex":
+        keep = [i for i, vec in enumerate(vectors) if vec is not None and len(vec) == dim]
+        index = cls(dim, capacity=len(keep), quantization=quantization)
+        if len(set(ids)) != len(ids):
+            index.upsert(ids, contents, vectors, texts, tags)
+            return index
+        for i in keep:
+            row = index._append(ids[i], contents[i])
+            index.lexical.upsert(row, texts[i] if texts is not None else contents[i])
+            if tags is not None:
+                index.tags.set(row, tags[i])
+        if keep:
+            # Bulk path: normalize and quantize the whole load at once
+            if isinstance(vectors, np.ndarray):
+                stacked = np.asarray(vectors[keep], dtype=np.float32)
+            else:
+                stacked = np.asarray([vectors[i] for i in keep], dtype=np.float32)
+            index._write(np.arange(len(keep)), normalize(stacked))
+        return index
+
+    @staticmethod
+    def estimate_row_bytes(dim: int, quantization: str, text: str) -> int:
+        """
+        Rough per-row footprint used to decide, while loading, whether a tenant fits the cache.
+        """
+        itemsize = {"none": 4, "float16": 2, "int8": 1}[quantization]
+        return dim * itemsize + 2 * sys.getsizeof(text) + 120
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Stored representation (float32, float16 or int8 codes) of the live rows.
+        """
+        return self._codes[: self.size]
+
+    @property
+    def quantized(self) -> bool:
+        return self.quantization != "none"
+
+    @property
+    def nbytes(self) -> int:
+        # Matrix plus a rough estimate of the Python-side lookups
+        scales = self._scales.nbytes if self._scales is not None else 0
+        return (
+            self._codes.nbytes
+            + scales
+            + self._content_bytes
+            + self.size * 120
+            + self.lexical.nbytes
+            + self.tags.nbytes
+            + (self.ann.nbytes if self.ann is not None else 0)
+        )
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        contents: Sequence[str],
+        vectors: Sequence[Sequence[float]] | np.ndarray,
+        texts: Sequence[str] | None = None,
+        tags: Sequence[Sequence[str] | None] | None = None,
+    ) -> int:
+        """
+        Insert or replace rows. Vectors with a different dimension are skipped.
+        `texts` (defaults to contents) feed the lexical index and `tags` the tag index.
+        Returns the number of rows written.
+        """
+        written: List[int] = []
+        accepted: List[Sequence[float]] = []
+        for pos, (item_id, content, vec) in enumerate(zip(ids, contents, vectors)):
+            if vec is None or len(vec) != self.dim:
+                continue
+            row = self._row_by_id.get(item_id)
+            if row is None:
+                row = self._append(item_id, content)
+            else:
+                self._content_bytes += sys.getsizeof(content) - sys.getsizeof(self.contents[row])
+                self.contents[row] = content
+            self.lexical.upsert(row, texts[pos] if texts is not None else content)
+            self.tags.set(row, tags[pos] if tags is not None else None)
+            written.append(row)
+            accepted.append(vec)
+        if not written:
+            return 0
+        self._write(np.asarray(written), normalize(np.asarray(accepted, dtype=np.float32)))
+        if self.ann is not None:
+            self.ann.update(written, self)
+        if self._ann_written is not None:
+            self._ann_written.extend(written)
+        return len(written)
+
+    def row_of(self, item_id: str) -> int | None:
+        return self._row_by_id.get(item_id)
+
+    def tag_mask(self, tags: Iterable[str]) -> np.ndarray:
+        """
+        Boolean mask over live rows carrying any of `tags`.
+        """
+        return self.tags.mask(tags, self.size)
+
+    def attach_ann(self, backend: AnnBackend) -> None:
+        backend.build(self)
+        self.ann = backend
+
+    def begin_ann_build(self) -> VectorSnapshot:
+        """
+        Snapshot to build a new ANN backend from off the event loop; rows written from now on
+        are recorded for `finish_ann_build`. The current backend (or exact scan) keeps serving.
+        """
+        self._ann_written = []
+        scales = self._scales[: self.size] if self._scales is not None else None
+        return VectorSnapshot(self._codes[: self.size], scales, self.quantization)
+
+    def finish_ann_build(self, backend: AnnBackend | None) -> None:
+        """
+        Catch the built backend up with rows written during the build and swap it in
+        (None: the build failed, keep the current one).
+        """
+        written, self._ann_written = self._ann_written or [], None
+        if backend is None:
+            return
+        if written:
+            backend.update(sorted(set(written)), self)
+        self.ann = backend
+
+    def rows(self, selector: np.ndarray | slice) -> np.ndarray:
+        """
+        Dequantized float32 vectors for the selected rows.
+        """
+        scales = self._scales[selector] if self._scales is not None else None
+        return dequantize(self._codes[selector], scales, self.quantization)
+
+    def score(self, query: np.ndarray, rows: np.ndarray | None = None, block: int = 16384) -> np.ndarray:
+        """
+        Cosine scores of `query` against the selected rows (all live rows by default).
+        Quantized matrices are dequantized block by block to bound temporary memory.
+        """
+        if rows is not None:
+            return self.rows(rows) @ query
+        if not self.quantized:
+            return self.matrix @ query
+        out = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, block):
+            stop = min(start + block, self.size)
+            out[start:stop] = self.rows(slice(start, stop)) @ query
+        return out
+
+    def _write(self, rows: np.ndarray, normalized: np.ndarray) -> None:
+        codes, scales = quantize(normalized, self.quantization)
+        self._codes[rows] = codes
+        if scales is not None:
+            self._scales[rows] = scales
+
+    def _append(self, item_id: str, content: str) -> int:
+        if self.size == self._codes.shape[0]:
+            capacity = self._codes.shape[0] * 2
+            grown = np.zeros((capacity, self.dim), dtype=self._codes.dtype)
+            grown[: self.size] = self._codes[: self.size]
+            self._codes = grown
+            if self._scales is not None:
+                grown_scales = np.ones(capacity, dtype=np.float32)
+                grown_scales[: self.size] = self._scales[: self.size]
+                self._scales = grown_scales
+        row = self.size
+        self.size += 1
+        self.ids.append(item_id)
+        self.contents.append(content)
+        self._row_by_id[item_id] = row
+        self._content_bytes += sys.getsizeof(content)
+        return row
+
+    def search(self, query: np.ndarray, k: int, mask: np.ndarray | None = None) -> List[Tuple[int, float]]:
+        """
+        Cosine search. `query` must already be normalized. Returns (row, score) best first.
+        With a row `mask` only the selected rows are scored: selective filters are scanned
+        exactly, broad ones go through the ANN backend with the mask applied to its candidates.
+        """
+        if self.size == 0:
+            return []
+        if mask is not None:
+            selected = np.flatnonzero(mask[: self.size])
+            if selected.size == 0:
+                return []
+            if self.ann is None or selected.size <= self.size * self.FILTER_EXACT_FRACTION:
+                scores = self.score(query, selected)
+                return [(int(selected[i]), float(scores[i])) for i in top_k(scores, k)]
+            return self.ann.search(self, query, k, mask=mask)
+        if self.ann is not None:
+            return self.ann.search(self, query, k)
+        scores = self.score(query)
+        return [(int(row), float(scores[row])) for row in top_k(scores, k)]
+
+
+class VectorIndexCache:
+    """
+    Process-level LRU of tenant indexes bounded by an approximate memory budget.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, TenantVectorIndex]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, tenant_id: str) -> bool:
+        return tenant_id in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(index.nbytes for index in self._entries.values())
+
+    def get(self, tenant_id: str) -> TenantVectorIndex | None:
+        index = self._entries.get(tenant_id)
+        if index is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(tenant_id)
+        return index
+
+    def peek(self, tenant_id: str) -> TenantVectorIndex | None:
+        """
+        Look up without touching LRU order or hit counters.
+        """
+        return self._entries.get(tenant_id)
+
+    def put(self, tenant_id: str, index: TenantVectorIndex) -> bool:
+        """
+        Cache an index. Returns False when the index alone exceeds the budget and was not cached.
+        """
+        if index.nbytes > self.max_bytes:
+            logger.warning(
+                "Vector index for tenant=%s (%s bytes) exceeds cache budget %s; not cached",
+                tenant_id,
+                index.nbytes,
+                self.max_bytes,
+            )
+            self._entries.pop(tenant_id, None)
+            return False
+        self._entries[tenant_id] = index
+        self._entries.move_to_end(tenant_id)
+        self._evict()
+        return tenant_id in self._entries
+
+    def update(
+        self,
+        tenant_id: str,
+        ids: Sequence[str],
+        contents: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        texts: Sequence[str] | None = None,
+        tags: Sequence[Sequence[str] | None] | None = None,
+    ) -> None:
+        """
+        Apply committed upserts to a cached index in place. Tenants not in the cache are left to load lazily.
+        """
+        index = self._entries.get(tenant_id)
+        if index is None:
+            return
+        dims = {len(v) for v in vectors if v is not None and len(v)}
+        if dims and dims != {index.dim}:
+            # Embedding model changed; rebuild from DB on next read
+            self.invalidate(tenant_id)
+            return
+        index.upsert(ids, contents, vectors, texts, tags)
+        if index.nbytes > self.max_bytes:
+            self.invalidate(tenant_id)
+            return
+        self._entries.move_to_end(tenant_id)
+        self._evict()
+
+    def invalidate(self, tenant_id: str) -> None:
+        self._entries.pop(tenant_id, None)
+
+    def _evict(self) -> None:
+        total = self.total_bytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            tenant_id, index = self._entries.popitem(last=False)
+            total -= index.nbytes
+            self.evictions += 1
+            logger.info("Evicted vector index for tenant=%s", tenant_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tenants": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def quantization_report(
+    vectors: np.ndarray, queries: np.ndarray, mode: str, k: int = 5, rescore_candidates: int = 50
+) -> Dict[str, float]:
+    """
+    Memory saved and recall@k of a quantized index versus full-precision search,
+    with and without exact rescoring of the shortlist.
+    """
+    ids = [str(i) for i in range(vectors.shape[0])]
+    full = TenantVectorIndex.from_rows(ids, ids, vectors, vectors.shape[1])
+    quant = TenantVectorIndex.from_rows(ids, ids, vectors, vectors.shape[1], quantization=mode)
+    queries = normalize(queries)
+    plain = rescored = 0
+    for query in queries:
+        exact = set(top_k(full.score(query), k).tolist())
+        approx = [row for row, _ in quant.search(query, max(k, rescore_candidates))]
+        plain += len(exact & set(approx[:k]))
+        exact_scores = full.score(query, np.asarray(approx))
+        rescored += len(exact & {approx[i] for i in top_k(exact_scores, k)})
+    total = max(len(queries) * min(k, vectors.shape[0]), 1)
+    full_bytes = full.matrix.nbytes
+    quant_bytes = quant.matrix.nbytes + (quant._scales[: quant.size].nbytes if quant._scales is not None else 0)
+    return {
+        "mode": mode,
+        "full_bytes": full_bytes,
+        "quantized_bytes": quant_bytes,
+        "memory_saved": 1 - quant_bytes / full_bytes if full_bytes else 0.0,
+        f"recall@{k}": plain / total,
+        f"recall@{k}_rescored": rescored / total,
+    }
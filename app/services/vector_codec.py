@@ -0,0 +1,66 @@
+import struct
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from app.services.vectors import dequantize, quantize
+
+# Layout: magic(2) | version(u8) | dtype(u8) | dim(u32) | model_len(u16) | model utf-8 | [scale f32] | payload
+# The scale is only present for int8 payloads.
+MAGIC = b"EV"
+VERSION = 1
+HEADER = struct.Struct("<2sBBIH")
+SCALE = struct.Struct("<f")
+
+DTYPE_FLOAT32 = 0
+DTYPE_FLOAT16 = 1
+DTYPE_INT8 = 2
+_DTYPES = {
+    DTYPE_FLOAT32: ("none", np.dtype("<f4")),
+    DTYPE_FLOAT16: ("float16", np.dtype("<f2")),
+    DTYPE_INT8: ("int8", np.dtype("i1")),
+}
+_CODES = {"float32": DTYPE_FLOAT32, "float16": DTYPE_FLOAT16, "int8": DTYPE_INT8}
+
+
+def encode_embedding(vector: Sequence[float] | np.ndarray, model: str = "", dtype: str = "float32") -> bytes | None:
+    """
+    Pack a vector with a dimension/model header. Empty vectors encode to None.
+    `dtype` is float32 (lossless), float16, or int8 with a per-vector scale.
+    """
+    if dtype not in _CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    arr = np.asarray(vector, dtype="<f4").ravel()
+    if arr.size == 0:
+        return None
+    code = _CODES[dtype]
+    mode, np_dtype = _DTYPES[code]
+    values, scale = quantize(arr, mode)
+    model_bytes = model.encode("utf-8")
+    blob = HEADER.pack(MAGIC, VERSION, code, arr.size, len(model_bytes)) + model_bytes
+    if scale is not None:
+        blob += SCALE.pack(float(scale))
+    return blob + values.astype(np_dtype).tobytes()
+
+
+def decode_embedding(blob: bytes | None) -> Tuple[np.ndarray, str]:
+    """
+    Return (vector, model). float32 payloads come back as a read-only zero-copy view over `blob`;
+    quantized payloads are expanded to float32.
+    """
+    if not blob:
+        return np.zeros(0, dtype=np.float32), ""
+    magic, version, dtype_code, dim, model_len = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION or dtype_code not in _DTYPES:
+        raise ValueError("Unsupported embedding blob header")
+    offset = HEADER.size + model_len
+    model = bytes(blob[HEADER.size : offset]).decode("utf-8")
+    mode, np_dtype = _DTYPES[dtype_code]
+    scale = None
+    if dtype_code == DTYPE_INT8:
+        scale = np.float32(SCALE.unpack_from(blob, offset)[0])
+        offset += SCALE.size
+    values = np.frombuffer(blob, dtype=np_dtype, count=dim, offset=offset)
+    if dtype_code == DTYPE_FLOAT32:
+        return values, model
+    return dequantize(values, scale, mode), model
@@ -0,0 +1,62 @@
+from typing import Sequence
+
+import numpy as np
+
+
+def as_matrix(vectors: Sequence[Sequence[float]], dim: int | None = None) -> np.ndarray:
+    """
+    Stack vectors into a contiguous float32 matrix. Rows with a different dimension are dropped.
+    """
+    if dim is None:
+        dim = next((len(v) for v in vectors if len(v)), 0)
+    rows = [v for v in vectors if len(v) == dim and dim > 0]
+    if not rows:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.ascontiguousarray(np.asarray(rows, dtype=np.float32))
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize a vector or each row of a matrix. Zero vectors stay zero.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first. Uses argpartition so cost is O(n) plus O(k log k).
+    """
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+
+
+def quantize(vectors: np.ndarray, mode: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Quantize rows for compact storage. Returns (codes, per-row scales); scales are only used by int8.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=-1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        codes = np.rint(vectors / scales[..., None]).astype(np.int8)
+        return codes, scales
+    return vectors, None
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray | None, mode: str) -> np.ndarray:
+    if mode == "int8":
+        return codes.astype(np.float32) * scales[..., None]
+    return codes.astype(np.float32, copy=False)
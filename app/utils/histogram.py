@@ -0,0 +1,56 @@
+import bisect
+import math
+from typing import Dict, List
+
+
+class LatencyHistogram:
+    """
+    Log-spaced latency buckets (~10% wide, 10 ms to 2 min), so recording is O(log n), percentiles
+    are cheap and memory is constant. Once `max_samples` are recorded all counts are halved,
+    which lets the distribution follow upstream drift while keeping its shape.
+    """
+
+    def __init__(
+        self, min_seconds: float = 0.01, max_seconds: float = 120.0, growth: float = 1.1, max_samples: int = 10000
+    ) -> None:
+        self.bounds: List[float] = []
+        bound = min_seconds
+        while bound < max_seconds:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_seconds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.max_samples = max_samples
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += 1
+        if self.total >= self.max_samples:
+            self.counts = [count // 2 for count in self.counts]
+            self.total = sum(self.counts)
+
+    def percentile(self, fraction: float) -> float | None:
+        """
+        Upper bound of the bucket holding the given quantile (0..1), or None without samples.
+        """
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(fraction * self.total))
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[min(idx, len(self.bounds) - 1)]
+        return self.bounds[-1]  # pragma: no cover - counts always sum to total
+
+    def snapshot(self) -> Dict[str, float | int | None]:
+        def ms(value: float | None) -> float | None:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "samples": self.total,
+            "p50_ms": ms(self.percentile(0.5)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+        }
@@ -0,0 +1,59 @@
+"""
+Recall and latency of the IVF index versus the exact scan at different nprobe values.
+
+Run: python benchmarks/bench_ann.py [n_chunks] [dim]
+"""
+
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.ann import IVFIndex, recall_at_k  # noqa: E402
+from app.services.vector_cache import TenantVectorIndex  # noqa: E402
+from app.services.vectors import normalize, top_k  # noqa: E402
+
+
+def _clustered(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(max(n // 500, 8), dim))
+    points = centers[rng.integers(0, centers.shape[0], n)] + 0.5 * rng.normal(size=(n, dim))
+    return normalize(points.astype(np.float32))
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    rng = np.random.default_rng(7)
+    matrix = _clustered(n, dim, rng)
+    ids = [str(i) for i in range(n)]
+    index = TenantVectorIndex.from_rows(ids, ids, matrix, dim)
+    queries = _clustered(100, dim, rng)
+
+    start = time.perf_counter()
+    for q in queries:
+        top_k(matrix @ q, 5)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    ivf = IVFIndex()
+    start = time.perf_counter()
+    ivf.build(index)
+    build_s = time.perf_counter() - start
+    print(f"chunks={n} dim={dim} nlist={len(ivf.centroids)} build={build_s:.1f}s exact={exact_ms:.2f}ms/query")
+
+    for nprobe in (1, 4, 8, 16, 32):
+        ivf.nprobe = nprobe
+        start = time.perf_counter()
+        for q in queries:
+            ivf.search(index, q, 5)
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = recall_at_k(index, ivf, queries, k=5)
+        print(f"nprobe={nprobe:3d} recall@5={recall:.3f} latency={ann_ms:.2f}ms/query")
+
+
+if __name__ == "__main__":
+    main()
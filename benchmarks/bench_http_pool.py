@@ -0,0 +1,88 @@
+"""
+Per-call latency of a fresh httpx.AsyncClient per request (the old adapter behaviour) versus the
+shared HttpClientPool, against a local stub of the Gemini endpoint. `handshake_ms` delays every new
+connection to stand in for the TCP+TLS round trips to the real API.
+
+Run: python benchmarks/bench_http_pool.py [calls] [handshake_ms]
+"""
+
+import asyncio
+import json
+import pathlib
+import sys
+import time
+
+import httpx
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.adapters.http_pool import HttpClientPool  # noqa: E402
+
+BODY = json.dumps({"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}).encode()
+
+
+async def _serve(handshake_ms: float):
+    connections = 0
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal connections
+        connections += 1
+        await asyncio.sleep(handshake_ms / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+                    + BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, lambda: connections
+
+
+async def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    handshake_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server, connection_count = await _serve(handshake_ms)
+    port = server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/v1/models/stub:generateContent"
+    payload = {"contents": [{"parts": [{"text": "halo"}]}]}
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        async with httpx.AsyncClient(timeout=20.0) as client:
+            (await client.post(url, json=payload)).raise_for_status()
+    fresh_ms = (time.perf_counter() - start) * 1000 / calls
+    fresh_conns = connection_count()
+
+    pool = HttpClientPool()
+    start = time.perf_counter()
+    for _ in range(calls):
+        (await pool.client.post(url, json=payload)).raise_for_status()
+    pooled_ms = (time.perf_counter() - start) * 1000 / calls
+    pooled_conns = connection_count() - fresh_conns
+    await pool.aclose()
+    server.close()
+    await server.wait_closed()
+
+    print(f"calls={calls} handshake={handshake_ms:.0f}ms")
+    print(f"fresh client per call: {fresh_ms:.2f}ms/call connections={fresh_conns}")
+    print(f"shared pool:           {pooled_ms:.2f}ms/call connections={pooled_conns}")
+    print(f"saved per call:        {fresh_ms - pooled_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
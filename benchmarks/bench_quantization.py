@@ -0,0 +1,38 @@
+"""
+Memory saved and recall@5 of float16/int8 cached indexes versus full precision.
+
+Run: python benchmarks/bench_quantization.py [n_chunks] [dim]
+"""
+
+import pathlib
+import sys
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.vector_cache import quantization_report  # noqa: E402
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    rng = np.random.default_rng(3)
+    centers = rng.normal(size=(max(n // 200, 8), dim))
+    vectors = centers[rng.integers(0, centers.shape[0], n)] + 0.5 * rng.normal(size=(n, dim))
+    queries = centers[rng.integers(0, centers.shape[0], 200)] + 0.5 * rng.normal(size=(200, dim))
+
+    print(f"chunks={n} dim={dim}")
+    for mode in ("float16", "int8"):
+        report = quantization_report(vectors.astype(np.float32), queries.astype(np.float32), mode)
+        print(
+            f"{mode:8s} memory {report['full_bytes'] / 2**20:8.1f} MiB -> {report['quantized_bytes'] / 2**20:8.1f} MiB "
+            f"(saved {report['memory_saved']:.0%})  recall@5={report['recall@5']:.3f} "
+            f"rescored={report['recall@5_rescored']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare the old per-row Python cosine loop with the vectorized scoring path.
+
+Run: python benchmarks/bench_retrieval.py [n_chunks] [dim]
+"""
+
+import math
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.vectors import as_matrix, normalize, top_k  # noqa: E402
+
+
+def _python_loop(query, vectors, k):
+    def cosine(a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        na = math.sqrt(sum(x * x for x in a))
+        nb = math.sqrt(sum(y * y for y in b))
+        return dot / (na * nb) if na and nb else 0.0
+
+    scored = sorted(((cosine(query, v), i) for i, v in enumerate(vectors)), reverse=True)
+    return [i for _, i in scored[:k]]
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    rng = np.random.default_rng(42)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32).tolist()
+    query = rng.normal(size=dim).astype(np.float32).tolist()
+
+    start = time.perf_counter()
+    baseline = _python_loop(query, vectors, 5)
+    loop_s = time.perf_counter() - start
+
+    matrix = normalize(as_matrix(vectors, dim))
+    q = normalize(np.asarray(query, dtype=np.float32))
+    start = time.perf_counter()
+    fast = top_k(matrix @ q, 5).tolist()
+    vec_s = time.perf_counter() - start
+
+    print(f"chunks={n} dim={dim}")
+    print(f"python loop : {loop_s * 1000:10.2f} ms")
+    print(f"numpy matvec: {vec_s * 1000:10.2f} ms  (speedup x{loop_s / max(vec_s, 1e-9):.0f})")
+    print(f"same top-5  : {baseline == fast}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""store knowledge_items.embedding as packed float32 blobs
+
+Revision ID: 20261017_0002
+Revises: 20251129_0001
+Create Date: 2026-10-17
+"""
+
+import json
+import struct
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_0002"
+down_revision = "20251129_0001"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of app/services/vector_codec.py (float32, version 1) so the migration
+# keeps working if the application codec evolves.
+_HEADER = struct.Struct("<2sBBIH")
+
+
+def _encode(values) -> bytes | None:
+    if isinstance(values, str):
+        values = json.loads(values)
+    if not values:
+        return None
+    return _HEADER.pack(b"EV", 1, 0, len(values), 0) + struct.pack(f"<{len(values)}f", *values)
+
+
+def _decode(blob) -> list[float] | None:
+    if not blob:
+        return None
+    _, _, _, dim, model_len = _HEADER.unpack_from(blob)
+    return list(struct.unpack_from(f"<{dim}f", blob, _HEADER.size + model_len))
+
+
+def _convert(source: sa.ColumnClause, target: sa.ColumnClause, convert) -> None:
+    conn = op.get_bind()
+    items = sa.table("knowledge_items", sa.column("id"), source, target)
+    source, target = source.name, target.name
+    last_id = None
+    while True:
+        stmt = sa.select(items.c.id, items.c[source]).order_by(items.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            stmt = stmt.where(items.c.id > last_id)
+        rows = conn.execute(stmt).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            items.update().where(items.c.id == sa.bindparam("row_id")).values({target: sa.bindparam("value")}),
+            [{"row_id": row[0], "value": convert(row[1])} for row in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.add_column("knowledge_items", sa.Column("embedding_blob", sa.LargeBinary(), nullable=True))
+    _convert(sa.column("embedding", sa.JSON()), sa.column("embedding_blob", sa.LargeBinary()), _encode)
+    with op.batch_alter_table("knowledge_items") as batch:
+        batch.drop_column("embedding")
+        batch.alter_column("embedding_blob", new_column_name="embedding")
+
+
+def downgrade() -> None:
+    op.add_column("knowledge_items", sa.Column("embedding_json", sa.JSON(), nullable=True))
+    _convert(sa.column("embedding", sa.LargeBinary()), sa.column("embedding_json", sa.JSON(none_as_null=True)), _decode)
+    with op.batch_alter_table("knowledge_items") as batch:
+        batch.drop_column("embedding")
+        batch.alter_column("embedding_json", new_column_name="embedding")
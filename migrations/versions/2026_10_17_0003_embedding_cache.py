@@ -0,0 +1,33 @@
+"""add embedding_cache table
+
+Revision ID: 20261017_0003
+Revises: 20261017_0002
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_0003"
+down_revision = "20261017_0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("id", sa.String(length=36), primary_key=True),
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("text_hash", sa.String(length=64), nullable=False),
+        sa.Column("embedding", sa.LargeBinary(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("provider", "model", "text_hash", name="uq_embedding_cache_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("embedding_cache")
@@ -0,0 +1,359 @@
+import asyncio
+import pathlib
+import sys
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.adapters.http_pool import HttpClientPool  # noqa: E402
+
+
+def test_http_pool_reuses_client_per_loop_and_closes():
+    pool = HttpClientPool(max_connections=4, timeout=3.0)
+
+    async def scenario():
+        first = pool.client
+        assert pool.client is first
+        assert first.timeout.read == 3.0
+        await pool.aclose()
+        assert first.is_closed
+        assert pool.client is not first  # recreated lazily after shutdown
+        return pool.client
+
+    from_first_loop = asyncio.run(scenario())
+    # A new event loop must not reuse connections bound to the old one
+    assert asyncio.run(scenario()) is not from_first_loop
+
+
+def test_embedding_batches_run_concurrently_in_order_and_retry_only_failures():
+    import json
+
+    import httpx
+
+    from app.adapters.governor import ProviderGovernor
+    from app.services.embeddings import EmbeddingClient
+
+    state = {"in_flight": 0, "peak": 0, "calls": 0, "failed_once": False}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        texts = [r["content"]["parts"][0]["text"] for r in json.loads(request.content)["requests"]]
+        state["calls"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.02)
+        state["in_flight"] -= 1
+        if "t7" in texts and not state["failed_once"]:
+            state["failed_once"] = True
+            return httpx.Response(503)
+        return httpx.Response(200, json={"embeddings": [{"values": [float(t[1:]), 1.0]} for t in texts]})
+
+    client = EmbeddingClient(
+        api_key="k",
+        http=HttpClientPool(transport=httpx.MockTransport(handler)),
+        max_concurrency=3,
+        max_batch_size=4,
+        governor=ProviderGovernor(base_backoff=0.0),
+    )
+    texts = [f"t{i}" for i in range(20)]
+    assert client._plan_batches(["x" * 10, "y" * 15, "z"]) == [(0, 3)]
+    client.max_batch_chars = 20
+    assert client._plan_batches(["x" * 10, "y" * 15, "z"]) == [(0, 1), (1, 3)]
+    client.max_batch_chars = 20_000
+
+    vectors = asyncio.run(client.embed(texts))
+    assert [v[0] for v in vectors] == [float(i) for i in range(20)]
+    assert state["peak"] == 3
+    assert state["calls"] == 6  # 5 batches + one retry of the failed batch only
+
+
+def test_governor_reserves_quota_for_chat():
+    from app.adapters.governor import ProviderGovernor
+
+    now = [0.0]
+    governor = ProviderGovernor(requests_per_minute=60, chat_reserve=0.5, clock=lambda: now[0])
+
+    async def scenario():
+        for _ in range(30):
+            await governor.acquire("ingest")
+        # Ingest has used its share; only chat may take the reserved half
+        assert governor.requests.wait_time(1, reserve=0.5) > 0
+        await governor.acquire("chat")
+        assert round(governor.requests.available()) == 29
+        now[0] += 2.0  # refills one request per second
+        assert governor.requests.wait_time(1, reserve=0.5) == 0
+
+    asyncio.run(scenario())
+
+
+def test_governor_circuit_breaker_fails_fast_and_recovers():
+    import httpx
+    import pytest
+
+    from app.adapters.governor import ProviderGovernor, ProviderUnavailableError
+
+    now = [0.0]
+    governor = ProviderGovernor(
+        max_retries=1, base_backoff=0.0, failure_threshold=3, reset_seconds=10, clock=lambda: now[0]
+    )
+    calls = []
+
+    async def failing():
+        calls.append("fail")
+        request = httpx.Request("POST", "https://upstream")
+        raise httpx.HTTPStatusError("boom", request=request, response=httpx.Response(503, request=request))
+
+    async def healthy():
+        calls.append("ok")
+        return "ok"
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await governor.call(failing)
+        assert governor.breaker.state == "open" and len(calls) == 3
+        with pytest.raises(ProviderUnavailableError):
+            await governor.call(healthy)
+        assert calls[-1] == "fail"  # rejected without touching the upstream
+        now[0] += 10
+        assert await governor.call(healthy) == "ok"
+        assert governor.state()["circuit"] == "closed" and governor.state()["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_governor_cancelled_half_open_probe_does_not_lock_circuit():
+    import httpx
+    import pytest
+
+    from app.adapters.governor import ProviderGovernor
+
+    now = [0.0]
+    governor = ProviderGovernor(max_retries=0, failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+
+    async def failing():
+        request = httpx.Request("POST", "https://upstream")
+        raise httpx.HTTPStatusError("boom", request=request, response=httpx.Response(503, request=request))
+
+    async def hanging():
+        await asyncio.sleep(10)
+
+    async def healthy():
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await governor.call(failing)
+        now[0] += 10
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(governor.call(hanging), timeout=0.01)  # the probe is cancelled
+        assert governor.breaker.state == "half_open"
+        assert await governor.call(healthy) == "ok"
+        assert governor.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_gemini_stream_generate_parses_sse_deltas():
+    import httpx
+
+    from app.adapters.llm_gemini import GeminiClient
+
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["url"] = str(request.url)
+        body = "".join(
+            f'data: {{"candidates": [{{"content": {{"parts": [{{"text": "{text}"}}]}}}}]}}\r\n\r\n'
+            for text in ("Halo ", "kak, ", "ada yang bisa dibantu?")
+        )
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    client = GeminiClient("k", http=HttpClientPool(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        return [delta async for delta in client.stream_generate("hi")]
+
+    assert asyncio.run(scenario()) == ["Halo ", "kak, ", "ada yang bisa dibantu?"]
+    assert ":streamGenerateContent" in seen["url"] and "alt=sse" in seen["url"]
+
+
+def _latency_stub(delays: dict, log: list):
+    """
+    Stand-in for generateContent that answers after a per-model delay (seconds).
+    """
+    import httpx
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        model = request.url.path.rsplit("/", 1)[-1].split(":")[0]
+        log.append(("start", model))
+        try:
+            await asyncio.sleep(delays[model])
+        except asyncio.CancelledError:
+            log.append(("cancelled", model))
+            raise
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": f"from {model}"}]}}]})
+
+    return httpx.MockTransport(handler)
+
+
+def test_gemini_hedges_slow_primary_with_fallback_model_and_cancels_loser():
+    import time
+
+    from app.adapters.llm_gemini import GeminiClient
+
+    log: list = []
+    client = GeminiClient(
+        "k",
+        model="slow-model",
+        http=HttpClientPool(transport=_latency_stub({"slow-model": 1.0, "fast-model": 0.01}, log)),
+        fallback_model="fast-model",
+        hedge_default_delay=0.05,
+    )
+
+    async def scenario():
+        start = time.perf_counter()
+        text = await client.generate("halo")
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0)  # let the cancelled loser unwind
+        return text, elapsed
+
+    text, elapsed = asyncio.run(scenario())
+    assert text == "from fast-model" and elapsed < 0.5
+    assert ("cancelled", "slow-model") in log
+    stats = client.latency_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert set(stats["models"]) == {"slow-model", "fast-model"}
+    assert stats["models"]["slow-model"]["samples"] == 1  # the loser's lower-bound latency
+
+
+def test_gemini_cancelled_request_does_not_skew_latency_histogram():
+    from app.adapters.llm_gemini import GeminiClient
+
+    log: list = []
+    client = GeminiClient(
+        "k",
+        model="slow-model",
+        http=HttpClientPool(transport=_latency_stub({"slow-model": 1.0}, log)),
+        hedge_default_delay=5.0,
+    )
+
+    async def scenario():
+        try:
+            await asyncio.wait_for(client.generate("halo"), timeout=0.05)  # e.g. the chat deadline
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert ("cancelled", "slow-model") in log
+    assert client.latency_stats()["models"]["slow-model"]["samples"] == 0
+
+
+def test_gemini_hedge_threshold_follows_latency_percentile():
+    from app.adapters.llm_gemini import GeminiClient
+
+    log: list = []
+    client = GeminiClient(
+        "k",
+        model="m",
+        http=HttpClientPool(transport=_latency_stub({"m": 0.02}, log)),
+        hedge_default_delay=5.0,
+        hedge_min_samples=5,
+    )
+    assert client.hedge_delay() == 5.0  # not enough samples yet
+
+    async def scenario():
+        for _ in range(5):
+            assert await client.generate("halo") == "from m"
+
+    asyncio.run(scenario())
+    assert client.hedges == 0 and len(log) == 5
+    assert 0.02 <= client.hedge_delay() < 0.1  # p95 of the recorded ~20 ms calls
+    assert GeminiClient("k", hedging=False).hedge_delay() is None
+
+
+def test_latency_histogram_percentiles():
+    from app.utils.histogram import LatencyHistogram
+
+    histogram = LatencyHistogram(max_samples=1000)
+    for ms in range(1, 101):
+        histogram.record(ms / 100)  # 10 ms .. 1 s
+    assert abs(histogram.percentile(0.5) - 0.5) <= 0.05
+    assert abs(histogram.percentile(0.95) - 0.95) <= 0.1
+    for _ in range(1000):
+        histogram.record(0.05)
+    assert histogram.total < 1000  # halved once full
+    assert histogram.percentile(0.5) <= 0.06
+
+
+def test_gemini_context_cache_reuses_refreshes_and_replaces_prefix_handle():
+    import json
+
+    import httpx
+
+    from app.adapters.gemini_cache import GeminiContextCache
+    from app.adapters.llm_gemini import GeminiClient
+    from app.models.schemas import ChatRequest, TenantSettings
+    from app.services.prompt import PromptBuilder
+
+    calls: list = []
+    now = [0.0]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        """
+        Local stand-in for the v1beta cachedContents API and generateContent.
+        """
+        path = request.url.path
+        body = json.loads(request.content or b"{}")
+        if path.endswith("/cachedContents") and request.method == "POST":
+            name = f"cachedContents/c{sum(1 for c in calls if c[0] == 'create') + 1}"
+            calls.append(("create", name, body["systemInstruction"]["parts"][0]["text"]))
+            return httpx.Response(200, json={"name": name})
+        if "/cachedContents/" in path:
+            calls.append((request.method.lower(), path.split("/v1beta/")[1]))
+            return httpx.Response(200, json={})
+        calls.append(("generate", body.get("cachedContent"), body["contents"][0]["parts"][0]["text"]))
+        if body.get("cachedContent") == "cachedContents/gone":
+            return httpx.Response(404, json={"error": "not found"})
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "ok"}]}}]})
+
+    http = HttpClientPool(transport=httpx.MockTransport(handler))
+    context_cache = GeminiContextCache("k", http=http, ttl_seconds=600, min_tokens=100, clock=lambda: now[0])
+    client = GeminiClient("k", http=http, hedging=False, context_cache=context_cache)
+    builder = PromptBuilder()
+    tenant = TenantSettings(tenant_id="t")
+    tenant.persona.style_prompt = "Ramah dan sabar. " * 40  # long enough to register
+    payload = ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": "harga?"}])
+
+    async def turn():
+        prefix = builder.static_prefix(tenant)
+        prompt = builder.build_chat_prompt(payload, ["Harga paket A 100rb"], tenant)
+        return await client.generate(prompt, metadata={"tenant_id": "t"}, prefix=prefix)
+
+    async def scenario():
+        assert await turn() == "ok"
+        assert await turn() == "ok"
+        now[0] = 590.0  # inside the refresh margin: TTL is extended, handle kept
+        await turn()
+        tenant.persona.tone = "formal"  # new settings version: new handle, old one deleted
+        await turn()
+        context_cache._handles[("t", client.model)].name = "cachedContents/gone"
+        await turn()
+        return await turn()
+
+    assert asyncio.run(scenario()) == "ok"
+    creates = [c for c in calls if c[0] == "create"]
+    generates = [c for c in calls if c[0] == "generate"]
+    assert [c[1] for c in creates] == ["cachedContents/c1", "cachedContents/c2", "cachedContents/c3"]
+    assert "Tone: neutral" in creates[0][2] and "Tone: formal" in creates[1][2]
+    assert [g[1] for g in generates[:4]] == ["cachedContents/c1"] * 3 + ["cachedContents/c2"]
+    assert all(g[2].startswith("Panduan langkah") for g in generates[:4])  # only the dynamic part is sent
+    # Rejected handle: resent inline with the full prompt, then re-registered on the next turn
+    assert generates[4][1] == "cachedContents/gone" and generates[5][1] is None
+    assert generates[5][2].startswith("Peran kamu") and generates[6][1] == "cachedContents/c3"
+    assert ("patch", "cachedContents/c1") in calls and ("delete", "cachedContents/c1") in calls
+    assert builder.static_prefix(tenant) is builder.static_prefix(tenant)  # memoized per version
+    stats = context_cache.stats()
+    assert stats["created"] == 3 and stats["refreshed"] == 1 and stats["deleted"] == 1
@@ -0,0 +1,127 @@
+import asyncio
+import pathlib
+import sys
+
+import pytest
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.schemas import PerformanceSettings  # noqa: E402
+from app.services.admission import AdmissionController, AdmissionRejected  # noqa: E402
+
+
+async def _drain(controller: AdmissionController, blocker, requests):
+    """
+    Queue `requests` [(tenant, performance)] behind `blocker` and return the order they were served.
+    """
+    served = []
+
+    async def turn(tenant_id, performance):
+        async with controller.admit(tenant_id, performance):
+            served.append(tenant_id)
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.ensure_future(turn(*request)) for request in requests]
+    await asyncio.sleep(0)
+    blocker.release()
+    await asyncio.gather(*tasks)
+    return served
+
+
+def test_per_tenant_limit_queues_only_that_tenant():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=4, tenant_concurrency=1)
+        first = await controller.acquire("a")
+        queued = asyncio.ensure_future(controller.acquire("a"))
+        other = await asyncio.wait_for(controller.acquire("b"), timeout=0.1)  # not blocked by tenant a
+        await asyncio.sleep(0)
+        assert not queued.done()
+        assert controller.stats()["tenants"]["a"]["queued"] == 1
+        first.release()
+        second = await asyncio.wait_for(queued, timeout=0.1)
+        second.release()
+        other.release()
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["queued"] == 0
+    assert stats["tenants"]["a"]["admitted"] == 2 and stats["tenants"]["a"]["wait"]["samples"] == 2
+
+
+def test_freed_slots_are_shared_fairly_by_weight():
+    async def scenario(weight_b):
+        controller = AdmissionController(max_concurrency=1, tenant_concurrency=1)
+        blocker = await controller.acquire("a")
+        light = PerformanceSettings(admission_weight=weight_b)
+        return await _drain(controller, blocker, [("a", None)] * 4 + [("b", light)] * 3)
+
+    # A campaign queued first by tenant a does not starve tenant b
+    assert asyncio.run(scenario(1.0)) == ["a", "b", "a", "b", "a", "b", "a"]
+    assert asyncio.run(scenario(3.0)) == ["b", "b", "a", "b", "a", "a", "a"]
+
+
+def test_full_queue_and_long_waits_are_shed_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, tenant_concurrency=1, max_queue=1, max_wait_ms=50)
+        blocker = await controller.acquire("a")
+        queued = asyncio.ensure_future(controller.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as late:
+            await queued
+        blocker.release()
+        return full.value, late.value, controller.stats()["tenants"]["a"]
+
+    full, late, stats = asyncio.run(scenario())
+    assert full.reason == "Tenant queue is full" and full.retry_after >= 1
+    assert late.retry_after >= 1
+    assert stats["rejected"] == 1 and stats["timed_out"] == 1 and stats["queued"] == 0 and stats["active"] == 0
+
+
+def test_stream_slot_is_released_when_client_disconnects_before_first_chunk():
+    from app.routers.chat import _LeasedStreamingResponse
+
+    async def events():
+        await asyncio.sleep(1)
+        yield "event: done\n\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    async def scenario():
+        controller = AdmissionController(max_concurrency=4, tenant_concurrency=1, max_wait_ms=50)
+        lease = await controller.acquire("a")
+        response = _LeasedStreamingResponse(events(), media_type="text/event-stream", lease=lease)
+        scope = {"type": "http", "asgi": {"spec_version": "2.3"}}
+        await response(scope, receive, send)
+        assert controller.stats()["tenants"]["a"]["active"] == 0
+        (await controller.acquire("a")).release()  # the tenant's only slot is free again
+
+    asyncio.run(scenario())
+
+
+def test_admission_metrics_show_only_the_callers_tenant(monkeypatch):
+    from app import dependencies
+    from app.routers import metrics
+
+    controller = AdmissionController(max_concurrency=4, tenant_concurrency=2)
+
+    async def scenario():
+        leases = [await controller.acquire("t1"), await controller.acquire("t2")]
+        scoped = await metrics.admission_metrics("t1")
+        full = await metrics.admission_metrics("global")
+        for lease in leases:
+            lease.release()
+        return scoped, full
+
+    monkeypatch.setattr(dependencies, "admission_controller", controller)
+    scoped, full = asyncio.run(scenario())
+    assert list(scoped["tenants"]) == ["t1"] and scoped["active"] == 2
+    assert sorted(full["tenants"]) == ["t1", "t2"]
@@ -0,0 +1,83 @@
+import asyncio
+import pathlib
+import sys
+import time
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.schemas import ChatRequest  # noqa: E402
+from app.services.debounce import ChatDebouncer, merge_requests  # noqa: E402
+
+
+def _request(*texts: str, channel: str = "whatsapp", debounce_ms: int = 150, user: str = "u") -> ChatRequest:
+    return ChatRequest(
+        tenant_id="t",
+        user_id=user,
+        channel=channel,
+        typing_debounce_ms=debounce_ms,
+        messages=[{"role": "user", "content": text} for text in texts],
+    )
+
+
+def test_burst_is_merged_into_one_run_and_superseded_requests_return_early():
+    debouncer = ChatDebouncer(channels=["whatsapp"])
+
+    async def send(delay: float, payload: ChatRequest):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        result = await debouncer.submit(payload)
+        return result, time.perf_counter() - start
+
+    async def scenario():
+        return await asyncio.gather(
+            send(0.0, _request("halo")),
+            send(0.05, _request("mau tanya")),
+            send(0.1, _request("harga paket A berapa?")),
+            send(0.0, _request("pesan user lain", user="other")),
+        )
+
+    (first, t1), (second, t2), (last, _), (other, _) = asyncio.run(scenario())
+    assert first is None and second is None
+    assert t1 < 0.1 and t2 < 0.1  # superseded as soon as the next message arrived
+    assert [m.content for m in last.messages] == ["halo", "mau tanya", "harga paket A berapa?"]
+    assert last.metadata["merged_requests"] == 3
+    assert [m.content for m in other.messages] == ["pesan user lain"]
+    stats = debouncer.stats()
+    assert stats["merged"] == 2 and stats["runs"] == 2 and stats["open_bursts"] == 0
+
+
+def test_other_channels_pass_through_and_bursts_are_capped():
+    debouncer = ChatDebouncer(channels=["whatsapp"], max_wait_ms=120)
+    web = _request("halo", channel="web")
+    assert asyncio.run(debouncer.submit(web)) is web
+
+    async def typing_forever():
+        results = []
+
+        async def send(delay, text):
+            await asyncio.sleep(delay)
+            results.append((text, await debouncer.submit(_request(text, debounce_ms=100))))
+
+        await asyncio.gather(*(send(i * 0.05, f"m{i}") for i in range(4)))
+        return results
+
+    results = dict(asyncio.run(typing_forever()))
+    # m0..m2 arrive within the 120 ms cap; the burst closes before m3, which starts a new one
+    ran = {text: payload for text, payload in results.items() if payload is not None}
+    assert set(ran) == {"m2", "m3"}
+    assert [m.content for m in ran["m2"].messages] == ["m0", "m1", "m2"]
+
+
+def test_merge_does_not_duplicate_full_history_clients():
+    history = [{"role": "assistant", "content": "Halo kak"}]
+    first = ChatRequest(tenant_id="t", user_id="u", messages=history + [{"role": "user", "content": "a"}])
+    second = ChatRequest(
+        tenant_id="t",
+        user_id="u",
+        messages=history + [{"role": "user", "content": "a"}, {"role": "user", "content": "b"}],
+    )
+    merged = merge_requests([first, second])
+    assert [m.content for m in merged.messages] == ["Halo kak", "a", "b"]
@@ -0,0 +1,156 @@
+import asyncio
+import pathlib
+import sys
+from datetime import datetime, timedelta
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.models.db_models import EmbeddingCacheModel  # noqa: E402
+from app.services.embedding_cache import EmbeddingCache  # noqa: E402
+from app.services.embeddings import EmbeddingClient  # noqa: E402
+from app.services.vector_codec import encode_embedding  # noqa: E402
+
+
+class FakeProviderClient(EmbeddingClient):
+    """EmbeddingClient whose provider call is replaced with a deterministic fake."""
+
+    def __init__(self, cache=None) -> None:
+        super().__init__(api_key="test", model="fake-model", provider="gemini", cache=cache)
+        self.provider_calls: list[list[str]] = []
+
+    async def _embed_uncached(self, texts_list, priority="chat"):
+        self.provider_calls.append(list(texts_list))
+        return [[float(len(text)), 1.0, 2.0] for text in texts_list]
+
+
+def test_embedding_cache_memory_and_db_tiers(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'emb.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(EmbeddingCacheModel.__table__.create)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        client = FakeProviderClient(EmbeddingCache(session_factory=factory, max_entries=100))
+        first = await client.embed(["a", "bb", "a"], priority="ingest")
+        assert first == [[1.0, 1.0, 2.0], [2.0, 1.0, 2.0], [1.0, 1.0, 2.0]]
+        assert client.provider_calls == [["a", "bb"]]  # duplicate text embedded once
+
+        second = await client.embed(["bb", "ccc", "a"], priority="ingest")
+        assert second[1] == [3.0, 1.0, 2.0]
+        assert client.provider_calls[-1] == ["ccc"]  # only the miss, in order
+        await client.embed(["chat query"])  # memory tier only
+
+        # Fresh process: empty memory tier, served from the DB table
+        restarted = FakeProviderClient(EmbeddingCache(session_factory=factory, max_entries=100))
+        assert await restarted.embed(["a", "ccc"], priority="ingest") == [[1.0, 1.0, 2.0], [3.0, 1.0, 2.0]]
+        assert restarted.provider_calls == []
+        stats = restarted.cache_stats()
+        assert stats["db_hits"] == 2 and stats["misses"] == 0
+        await restarted.embed(["chat query"])
+        assert restarted.provider_calls == [["chat query"]]
+        async with factory() as session:
+            assert await session.scalar(select(func.count()).select_from(EmbeddingCacheModel)) == 3
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_embedding_cache_prunes_expired_rows(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'emb.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(EmbeddingCacheModel.__table__.create)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with factory() as session:
+            session.add(
+                EmbeddingCacheModel(
+                    provider="gemini",
+                    model="m",
+                    text_hash=EmbeddingCache.text_hash("old"),
+                    embedding=encode_embedding([1.0, 2.0], "m"),
+                    created_at=datetime.utcnow() - timedelta(days=45),
+                )
+            )
+            await session.commit()
+
+        cache = EmbeddingCache(session_factory=factory, retention_days=30)
+        await cache.put_many("gemini", "m", ["new"], [[3.0, 4.0]])  # first write also prunes
+        assert cache.stats()["db_pruned"] == 1
+        restarted = EmbeddingCache(session_factory=factory, retention_days=30)
+        assert await restarted.get_many("gemini", "m", ["old", "new"]) == [None, [3.0, 4.0]]
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_zero_vectors_are_not_cached():
+    async def scenario():
+        cache = EmbeddingCache(max_entries=10)
+        await cache.put_many("gemini", "m", ["x", "y"], [[0.0, 0.0], []])
+        assert await cache.get_many("gemini", "m", ["x", "y"]) == [None, None]
+
+    asyncio.run(scenario())
+
+
+class SlowLocalModel:
+    """Stand-in for SentenceTransformer: blocking encode of ~1ms per text."""
+
+    def encode(self, texts, normalize_embeddings=True):
+        import time
+
+        time.sleep(0.001 * len(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+
+def test_local_encoding_keeps_event_loop_responsive():
+    import time
+
+    client = EmbeddingClient(api_key="", model="local-model", provider="gemini", local_batch_size=16)
+    client.provider = "local"
+    client._local_model = SlowLocalModel()
+
+    async def scenario():
+        upload = asyncio.create_task(client.embed([f"chunk {i}" for i in range(800)]))  # ~0.8s of encoding
+        await asyncio.sleep(0.01)
+        lags, chat_latencies = [], []
+        while not upload.done():
+            tick = time.perf_counter()
+            await asyncio.sleep(0.002)
+            lags.append(time.perf_counter() - tick - 0.002)
+            start = time.perf_counter()
+            assert await client.embed(["berapa harga?"]) == [[1.0, 0.0]]
+            chat_latencies.append(time.perf_counter() - start)
+        assert len(await upload) == 800
+        return lags, chat_latencies
+
+    lags, chat_latencies = asyncio.run(scenario())
+    client.close()
+    assert len(chat_latencies) >= 10
+    # A query waits for at most the upload job in progress (~16ms), never the whole upload
+    p99 = sorted(chat_latencies)[int(len(chat_latencies) * 0.99) - 1]
+    assert p99 < 0.2
+    assert max(lags) < 0.1
+
+
+def test_batcher_coalesces_concurrent_queries():
+    from app.services.embedding_batcher import EmbeddingBatcher
+
+    client = FakeProviderClient()
+    batcher = EmbeddingBatcher(client, max_batch_size=8, max_wait_ms=5)
+
+    async def scenario():
+        texts = ["x" * n for n in range(1, 21)]
+        vectors = await asyncio.gather(*(batcher.embed(text) for text in texts))
+        assert [vec[0] for vec in vectors] == [float(n) for n in range(1, 21)]
+        # 20 concurrent callers: two full batches flushed on size, the rest on the timer
+        assert [len(call) for call in client.provider_calls] == [8, 8, 4]
+        assert await batcher.embed("solo") == [4.0, 1.0, 2.0]
+
+    asyncio.run(scenario())
+    assert batcher.stats()["batches"] == 4 and batcher.stats()["requests"] == 21
@@ -0,0 +1,83 @@
+import pathlib
+import sys
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.schemas import ChatRequest, PerformanceSettings, TenantSettings  # noqa: E402
+from app.services.history import HistoryCompactor, estimate_tokens, fit_context  # noqa: E402
+from app.services.prompt import PromptBuilder  # noqa: E402
+from app.services.sop import SopStateMachine  # noqa: E402
+
+
+def _conversation(turns: int, filler: int = 30) -> ChatRequest:
+    messages = []
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"Pesan nomor {i}. " + "detail tambahan " * filler})
+    return ChatRequest(tenant_id="t", user_id="u", messages=messages)
+
+
+def test_prompt_stays_under_tenant_ceiling_with_summary_and_trimmed_context():
+    builder = PromptBuilder(SopStateMachine())
+    tenant = TenantSettings(tenant_id="t", performance=PerformanceSettings(prompt_token_ceiling=1500))
+    payload = _conversation(41)
+    payload.messages[-1].content = "Berapa harga paket A? " + "tolong jelaskan " * 2000  # pasted wall of text
+    context = [f"Dokumen {i}: " + "isi pengetahuan " * 200 for i in range(5)]
+
+    prompt = builder.build_chat_prompt(payload, context, tenant)
+    assert estimate_tokens(prompt) <= 1500
+    assert "Ringkasan percakapan sebelumnya:\n(40 pesan sebelumnya diringkas" in prompt
+    assert "- ASSISTANT: Pesan nomor 39." in prompt  # rolling summary keeps the newest lines
+    assert "USER: Berapa harga paket A?" in prompt  # latest turn always present, truncated
+    assert "Dokumen 0" in prompt and "Dokumen 4" not in prompt
+
+    roomy = TenantSettings(tenant_id="t", performance=PerformanceSettings(prompt_token_ceiling=100000))
+    short = _conversation(12, filler=1)
+    prompt = builder.build_chat_prompt(short, context, roomy)
+    assert "Ringkasan percakapan" not in prompt  # short chats keep every turn verbatim (old cap was 10)
+    assert "Pesan nomor 0." in prompt and "Dokumen 4" in prompt
+
+
+def test_summary_keeps_numbers_and_prompt_keeps_latest_turn_when_prefix_fills_ceiling():
+    history = HistoryCompactor(max_recent_messages=1)
+    payload = ChatRequest(
+        tenant_id="t",
+        user_id="u",
+        messages=[
+            {"role": "assistant", "content": "Paket A Rp150.000 per bulan (v2.1). Bonus ongkir."},
+            {"role": "user", "content": "Oke"},
+        ],
+    )
+    summary, _ = history.assemble(payload, 10000)
+    assert "- ASSISTANT: Paket A Rp150.000 per bulan (v2.1)." in summary
+
+    builder = PromptBuilder(SopStateMachine())
+    tenant = TenantSettings(tenant_id="t", performance=PerformanceSettings(prompt_token_ceiling=10))
+    prompt = builder.build_chat_prompt(_conversation(1, filler=5), [], tenant)
+    assert "USER: Pesan nomor 0. detail tambahan" in prompt  # not cut down to "…"
+
+
+def test_summary_lines_are_cached_and_extended_incrementally():
+    history = HistoryCompactor(max_recent_messages=4)
+    payload = _conversation(10, filler=1)
+    summary, recent = history.assemble(payload, 10000)
+    assert len(recent) == 4 and summary.startswith("(6 pesan sebelumnya diringkas)")
+    assert history.lines_built == 6
+
+    payload.messages.extend(_conversation(12, filler=1).messages[10:])  # two new turns
+    summary, _ = history.assemble(payload, 10000)
+    assert "- ASSISTANT: Pesan nomor 7." in summary
+    assert history.lines_built == 8  # only the two messages that left the window were summarized
+
+    payload.messages[7].content = "Thread berbeda."
+    history.assemble(payload, 10000)
+    assert history.lines_built == 16  # edited history: rebuilt
+
+
+def test_fit_context_keeps_rank_order_and_truncates_first_chunk():
+    assert fit_context(["a" * 40, "b" * 40, "c" * 40], 25) == ["a" * 40, "b" * 40]
+    only = fit_context(["x" * 400], 10)
+    assert len(only) == 1 and estimate_tokens(only[0]) <= 10
@@ -0,0 +1,260 @@
+import asyncio
+import pathlib
+import sys
+
+import numpy as np
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.schemas import ChatRequest, PerformanceSettings, TenantSettings  # noqa: E402
+from app.services.orchestrator import Orchestrator  # noqa: E402
+from app.services.post_processing import PostProcessor  # noqa: E402
+from app.services.prompt import PromptBuilder  # noqa: E402
+from app.services.response_cache import ResponseCache  # noqa: E402
+from app.services.semantic_cache import SemanticCache  # noqa: E402
+from app.services.sop import SopStateMachine  # noqa: E402
+
+REPLY = "Halo kak! " + " ".join(f"kalimat nomor {i} tentang produk kami." for i in range(12))
+
+
+class FakeLLM:
+    api_key = "test-key"
+    model = "fake-model"
+
+    def __init__(self, text: str = REPLY, step: int = 7) -> None:
+        self.text = text
+        self.step = step
+        self.calls = 0
+
+    async def generate(self, prompt, metadata=None, prefix=None):
+        self.calls += 1
+        return self.text
+
+    async def stream_generate(self, prompt, metadata=None, prefix=None):
+        self.calls += 1
+        for start in range(0, len(self.text), self.step):
+            yield self.text[start : start + self.step]
+
+
+class FakeRAG:
+    def __init__(self, context=None, vectors=None) -> None:
+        self.version = 0
+        self.context = context or ["Harga paket A 100rb"]
+        self.vectors = vectors or {}
+
+    async def retrieve(self, session, payload, top_k=None, tags=None):
+        return list(self.context)
+
+    async def query_embedding(self, payload):
+        vector = self.vectors.get(payload.messages[-1].content)
+        return np.asarray(vector, dtype=np.float32) / np.linalg.norm(vector) if vector else None
+
+    def kb_version(self, tenant_id):
+        return self.version
+
+
+def _payload(question: str = "harga?") -> ChatRequest:
+    return ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": question}])
+
+
+class FakeSessions:
+    """
+    Stand-in session factory counting the sessions opened and closed.
+    """
+
+    def __init__(self) -> None:
+        self.opened = 0
+        self.closed = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        self.opened += 1
+        return object()
+
+    async def __aexit__(self, *exc_info):
+        self.closed += 1
+
+
+def _orchestrator(llm=None, response_cache=None, semantic_cache=None, rag=None, sessions=None) -> Orchestrator:
+    return Orchestrator(
+        llm or FakeLLM(),
+        rag or FakeRAG(),
+        PromptBuilder(SopStateMachine()),
+        PostProcessor(max_bubble_length=60),
+        response_cache=response_cache,
+        semantic_cache=semantic_cache,
+        session_factory=sessions,
+    )
+
+
+def test_stream_chat_emits_bubbles_then_done():
+    orchestrator = _orchestrator()
+
+    async def scenario():
+        events = await orchestrator.stream_chat(None, _payload(), TenantSettings(tenant_id="t"))
+        return [event async for event in events]
+
+    events = asyncio.run(scenario())
+    expected = PostProcessor(max_bubble_length=60).split_bubbles(REPLY)
+    assert [name for name, _ in events] == ["bubble"] * len(expected) + ["done"]
+    assert [data["text"] for _, data in events[:-1]] == [bubble.text for bubble in expected]
+    done = events[-1][1]
+    assert done["full_text"] == REPLY and done["retrieved_context"] == ["Harga paket A 100rb"]
+    # Non-streaming endpoint stays equivalent
+    response = asyncio.run(orchestrator.handle_chat(None, _payload(), TenantSettings(tenant_id="t")))
+    assert [b.model_dump() for b in response.bubbles] == done["bubbles"]
+
+
+def test_stream_chat_yields_first_bubble_before_generation_ends():
+    from fastapi import HTTPException
+
+    class BrokenAfterFirstBubble(FakeLLM):
+        async def stream_generate(self, prompt, metadata=None, prefix=None):
+            yield "satu dua tiga empat lima enam tujuh delapan sembilan sepuluh sebelas dua belas tiga "
+            raise HTTPException(status_code=502, detail="Gemini stream interrupted")
+
+    async def scenario():
+        events = await _orchestrator(BrokenAfterFirstBubble()).stream_chat(
+            None, _payload(), TenantSettings(tenant_id="t")
+        )
+        return [event async for event in events]
+
+    events = asyncio.run(scenario())
+    assert events[0][0] == "bubble"
+    assert events[-1] == ("error", {"status_code": 502, "detail": "Gemini stream interrupted"})
+
+
+def test_response_cache_hits_until_settings_or_kb_change():
+    llm = FakeLLM()
+    cache = ResponseCache()
+    orchestrator = _orchestrator(llm, cache)
+    tenant = TenantSettings(tenant_id="t", performance=PerformanceSettings(response_cache_enabled=True))
+
+    first = asyncio.run(orchestrator.handle_chat(None, _payload(), tenant))
+    second = asyncio.run(orchestrator.handle_chat(None, _payload(), tenant))
+    assert llm.calls == 1
+    assert second.full_text == first.full_text and second.metadata["response_cache"] == "exact"
+
+    async def stream():
+        events = await orchestrator.stream_chat(None, _payload(), tenant)
+        return [event async for event in events]
+
+    events = asyncio.run(stream())
+    assert llm.calls == 1 and events[-1][1]["full_text"] == REPLY
+    assert [data["text"] for _, data in events[:-1]] == [b.text for b in first.bubbles]
+
+    # Any settings change (here the persona) or KB upsert produces a new key
+    tenant.persona.tone = "casual"
+    asyncio.run(orchestrator.handle_chat(None, _payload(), tenant))
+    orchestrator.rag_service.version += 1
+    asyncio.run(orchestrator.handle_chat(None, _payload(), tenant))
+    assert llm.calls == 3
+
+    cache.invalidate("t")
+    asyncio.run(orchestrator.handle_chat(None, _payload(), tenant))
+    assert llm.calls == 4
+    assert cache.stats()["tenants"]["t"]["hits"] == 2
+
+
+def test_response_cache_is_opt_in_per_tenant():
+    llm = FakeLLM()
+    orchestrator = _orchestrator(llm, ResponseCache())
+    for _ in range(2):
+        response = asyncio.run(orchestrator.handle_chat(None, _payload(), TenantSettings(tenant_id="t")))
+    assert llm.calls == 2 and "response_cache" not in response.metadata
+
+
+def test_semantic_cache_answers_near_duplicate_questions_with_same_context():
+    llm = FakeLLM()
+    rag = FakeRAG(
+        vectors={
+            "berapa harga paket A?": [1.0, 0.0, 0.0],
+            "harga paket A berapa ya?": [0.98, 0.1, 0.0],
+            "cara retur barang?": [0.0, 1.0, 0.0],
+        }
+    )
+    cache = SemanticCache()
+    orchestrator = _orchestrator(llm, semantic_cache=cache, rag=rag)
+    tenant = TenantSettings(tenant_id="t")
+
+    asyncio.run(orchestrator.handle_chat(None, _payload("berapa harga paket A?"), tenant))
+    response = asyncio.run(orchestrator.handle_chat(None, _payload("harga paket A berapa ya?"), tenant))
+    assert llm.calls == 1 and response.metadata["response_cache"] == "semantic"
+    assert response.full_text == REPLY
+
+    # Unrelated question, different retrieved context, or tenant opt-out: generate again
+    asyncio.run(orchestrator.handle_chat(None, _payload("cara retur barang?"), tenant))
+    rag.context = ["Harga paket A 120rb (promo)"]
+    asyncio.run(orchestrator.handle_chat(None, _payload("harga paket A berapa ya?"), tenant))
+    assert llm.calls == 3
+    opted_out = TenantSettings(tenant_id="t", performance=PerformanceSettings(semantic_cache_enabled=False))
+    asyncio.run(orchestrator.handle_chat(None, _payload("harga paket A berapa ya?"), opted_out))
+    assert llm.calls == 4
+
+    stats = cache.stats()["tenants"]["t"]
+    assert stats["hits"] == 1 and stats["entries"] == 3
+
+
+def test_semantic_cache_evicts_least_recently_used():
+    cache = SemanticCache()
+    performance = PerformanceSettings(semantic_cache_max_entries=2)
+    vectors = [np.eye(3, dtype=np.float32)[i] for i in range(3)]
+    for i, vector in enumerate(vectors):
+        cache.put("t", vector, "scope", f"answer {i}", performance)
+    assert cache.get("t", vectors[0], "scope", performance) is None
+    assert cache.get("t", vectors[2], "scope", performance) == "answer 2"
+    assert cache.get("t", vectors[2], "other-scope", performance) is None
+    assert cache.stats()["tenants"]["t"]["evictions"] == 1
+
+
+def test_deadline_skips_slow_retrieval_and_reports_timings():
+    class SlowRAG(FakeRAG):
+        finished = False
+
+        async def retrieve(self, session, payload, top_k=None, tags=None):
+            await asyncio.sleep(0.4)
+            self.finished = True
+            return list(self.context)
+
+    rag, sessions = SlowRAG(), FakeSessions()
+    orchestrator = _orchestrator(rag=rag, sessions=sessions)
+    tenant = TenantSettings(
+        tenant_id="t", performance=PerformanceSettings(deadline_ms=10000, channel_deadline_ms={"web": 400})
+    )
+
+    async def scenario():
+        response = await orchestrator.handle_chat("request-session", _payload(), tenant)
+        assert not rag.finished and sessions.closed == 0  # detached, not cancelled
+        await asyncio.sleep(0.4)
+        return response
+
+    response = asyncio.run(scenario())
+    assert rag.finished and sessions.opened == sessions.closed == 1  # finished on its own session
+    assert response.retrieved_context == [] and response.metadata["degraded"] == ["retrieve"]
+    assert response.full_text == REPLY
+    timings = response.metadata["timings_ms"]
+    assert {"retrieve", "sop", "prompt", "reply_cache", "generate", "total"} <= set(timings)
+    assert timings["retrieve"] < 300  # 35% of the 400 ms channel deadline
+
+
+def test_generation_past_deadline_returns_504():
+    from fastapi import HTTPException
+
+    class SlowLLM(FakeLLM):
+        async def generate(self, prompt, metadata=None, prefix=None):
+            await asyncio.sleep(1.0)
+            return self.text
+
+    orchestrator = _orchestrator(SlowLLM())
+    tenant = TenantSettings(tenant_id="t", performance=PerformanceSettings(deadline_ms=100))
+    try:
+        asyncio.run(orchestrator.handle_chat(None, _payload(), tenant))
+    except HTTPException as exc:
+        assert exc.status_code == 504
+    else:  # pragma: no cover - assertion helper
+        raise AssertionError("expected a 504")
@@ -0,0 +1,96 @@
+import asyncio
+import pathlib
+import sys
+import time
+
+import pytest
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.pipeline import Deadline, DeadlineExceeded, Stage, StagePipeline  # noqa: E402
+
+
+def _sleeper(seconds: float, value):
+    async def run(ctx):
+        await asyncio.sleep(seconds)
+        return value
+
+    return run
+
+
+def test_independent_stages_run_concurrently():
+    async def join(ctx):
+        return ctx["a"] + ctx["b"] + ctx["suffix"]
+
+    pipeline = StagePipeline(
+        [
+            Stage("a", _sleeper(0.1, "A")),
+            Stage("b", _sleeper(0.1, "B")),
+            Stage("join", join, after=("a", "b")),
+        ]
+    )
+    start = time.perf_counter()
+    result = asyncio.run(pipeline.run(Deadline(None), suffix="!"))
+    elapsed = time.perf_counter() - start
+    assert result.values["join"] == "AB!"
+    assert elapsed < 0.18
+    assert set(result.timings_ms) == {"a", "b", "join"} and not result.degraded
+
+
+def test_optional_stage_degrades_and_required_stage_hits_deadline():
+    async def boom(ctx):
+        raise RuntimeError("index offline")
+
+    pipeline = StagePipeline(
+        [
+            Stage("slow_context", _sleeper(1.0, ["ctx"]), optional=True, fallback=[], max_share=0.2),
+            Stage("broken", boom, optional=True, fallback="n/a"),
+            Stage("answer", _sleeper(0.01, "ok"), after=("slow_context", "broken")),
+        ]
+    )
+    start = time.perf_counter()
+    result = asyncio.run(pipeline.run(Deadline(0.5)))
+    assert time.perf_counter() - start < 0.3  # capped at 20% of the deadline
+    assert result.values == {"broken": "n/a", "slow_context": [], "answer": "ok"}
+    assert sorted(result.degraded) == ["broken", "slow_context"]
+
+    strict = StagePipeline([Stage("answer", _sleeper(1.0, "late"))])
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(strict.run(Deadline(0.05)))
+
+
+def test_stage_dependencies_must_be_declared_first():
+    with pytest.raises(ValueError):
+        StagePipeline([Stage("prompt", _sleeper(0, None), after=("retrieve",)), Stage("retrieve", _sleeper(0, []))])
+
+
+def test_detached_runs_are_capped():
+    finished = []
+
+    async def slow_lookup(ctx):
+        await asyncio.sleep(0.2)
+        finished.append(ctx["turn"])
+        return ["ctx"]
+
+    pipeline = StagePipeline(
+        [Stage("retrieve", slow_lookup, optional=True, fallback=[], detach=True)],
+        max_detached=2,
+    )
+
+    async def scenario():
+        first = await asyncio.gather(*(pipeline.run(Deadline(0.05), turn=turn) for turn in (1, 2)))
+        in_flight = pipeline.stats()["detached_in_flight"]
+        start = time.perf_counter()
+        skipped = await pipeline.run(Deadline(0.05), turn=3)
+        assert time.perf_counter() - start < 0.02  # went straight to the fallback
+        await asyncio.sleep(0.25)
+        return first, in_flight, skipped
+
+    first, in_flight, skipped = asyncio.run(scenario())
+    assert all(result.degraded == ["retrieve"] for result in first) and in_flight == 2
+    assert skipped.values["retrieve"] == [] and skipped.degraded == ["retrieve"]
+    assert sorted(finished) == [1, 2]
+    assert pipeline.stats() == {"detached_in_flight": 0, "max_detached": 2, "detach_skipped": 1}
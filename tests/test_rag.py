@@ -0,0 +1,547 @@
+import asyncio
+import math
+import pathlib
+import sys
+
+import numpy as np
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.vectors import as_matrix, normalize, top_k  # noqa: E402
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def test_vectorized_scores_match_python_cosine():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 32)).tolist()
+    query = rng.normal(size=32).tolist()
+
+    scores = normalize(as_matrix(vectors)) @ normalize(np.asarray(query, dtype=np.float32))
+    expected = [_cosine(query, v) for v in vectors]
+    assert np.allclose(scores, expected, atol=1e-5)
+
+    best = top_k(scores, 5).tolist()
+    assert best == sorted(range(200), key=lambda i: expected[i], reverse=True)[:5]
+
+
+def test_top_k_edge_cases():
+    scores = np.asarray([0.1, 0.9, 0.5], dtype=np.float32)
+    assert top_k(scores, 10).tolist() == [1, 2, 0]
+    assert top_k(scores, 0).tolist() == []
+    assert top_k(np.zeros(0, dtype=np.float32), 3).tolist() == []
+
+
+def test_as_matrix_drops_mismatched_rows():
+    matrix = as_matrix([[1.0, 0.0], [0.0], [], [0.0, 1.0]])
+    assert matrix.shape == (2, 2)
+    assert matrix.dtype == np.float32
+
+
+def test_tenant_index_upsert_in_place_and_grow():
+    from app.services.vector_cache import TenantVectorIndex
+
+    index = TenantVectorIndex.from_rows(["a", "b"], ["A", "B"], [[1.0, 0.0], [0.0, 1.0]], dim=2)
+    index.upsert(["b", "c"], ["B2", "C"], [[1.0, 1.0], [0.0, -1.0]])
+    assert index.size == 3
+    assert index.contents == ["A", "B2", "C"]
+    hits = index.search(normalize(np.asarray([0.0, 1.0])), 2)
+    assert [index.ids[row] for row, _ in hits] == ["b", "a"]
+
+    many = [f"id{i}" for i in range(100)]
+    index.upsert(many, many, [[1.0, float(i)] for i in range(100)])
+    assert index.size == 103
+    assert index.matrix.shape == (103, 2)
+
+
+def test_vector_index_cache_lru_budget():
+    from app.services.vector_cache import TenantVectorIndex, VectorIndexCache
+
+    def make(n):
+        ids = [str(i) for i in range(n)]
+        return TenantVectorIndex.from_rows(ids, ids, np.ones((n, 64)).tolist(), dim=64)
+
+    one = make(100).nbytes
+    cache = VectorIndexCache(max_bytes=int(one * 2.5))
+    cache.put("t1", make(100))
+    cache.put("t2", make(100))
+    assert cache.get("t1") is not None  # t1 becomes most recent
+    cache.put("t3", make(100))
+    assert "t2" not in cache
+    assert "t1" in cache and "t3" in cache
+    assert cache.stats()["evictions"] == 1
+
+    assert cache.put("huge", make(1000)) is False
+    assert "huge" not in cache
+
+    cache.update("t1", ["new"], ["new content"], [[2.0] * 64])
+    assert cache.get("t1").contents[-1] == "new content"
+    cache.update("t1", ["x"], ["x"], [[1.0] * 8])  # dimension change drops the index
+    assert "t1" not in cache
+
+
+def _clustered(n, dim, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))
+    return normalize(points.astype(np.float32))
+
+
+def test_ivf_recall_against_exact():
+    from app.services.ann import IVFIndex, recall_at_k
+    from app.services.vector_cache import TenantVectorIndex
+
+    matrix = _clustered(5000, 32, 50, seed=1)
+    ids = [str(i) for i in range(5000)]
+    index = TenantVectorIndex.from_rows(ids, ids, matrix, dim=32)
+    queries = _clustered(50, 32, 50, seed=2)
+    ivf = IVFIndex(nprobe=8)
+    ivf.build(index)
+    assert recall_at_k(index, ivf, queries, k=10) >= 0.9
+
+    ivf.nprobe = len(ivf.centroids)  # probing every list is exact
+    assert recall_at_k(index, ivf, queries, k=10) == 1.0
+
+
+def test_ann_index_updated_incrementally():
+    from app.services.ann import IVFIndex
+    from app.services.vector_cache import TenantVectorIndex
+
+    matrix = _clustered(2000, 16, 20, seed=3)
+    ids = [str(i) for i in range(2000)]
+    index = TenantVectorIndex.from_rows(ids, ids, matrix, dim=16)
+    index.attach_ann(IVFIndex(nprobe=4))
+
+    target = matrix[0] * -1.0
+    index.upsert(["new"], ["new"], [target.tolist()])
+    hits = index.search(normalize(target), 1)
+    assert index.ids[hits[0][0]] == "new"
+
+
+def test_ann_built_off_the_event_loop_and_swapped_in():
+    from app.services.ann import IVFIndex
+    from app.services.rag import RAGService
+    from app.services.vector_cache import TenantVectorIndex
+
+    matrix = _clustered(2000, 16, 20, seed=4)
+    ids = [str(i) for i in range(2000)]
+    index = TenantVectorIndex.from_rows(ids, ids, matrix, dim=16)
+    rag = RAGService(None, ann_backend="ivf", ann_min_items=1000, ann_options={"nprobe": 4})
+    rag.index_cache.put("t", index)
+    exact_bytes = index.nbytes
+
+    async def scenario():
+        rag._maybe_attach_ann("t", index)
+        assert index.ann is None and "t" in rag._ann_builds  # exact search serves meanwhile
+        target = matrix[0] * -1.0
+        index.upsert(["new"], ["new"], [target.tolist()])  # written during the build
+        assert index.ids[index.search(normalize(target), 1)[0][0]] == "new"
+        await rag._ann_builds["t"]
+        return target
+
+    target = asyncio.run(scenario())
+    assert isinstance(index.ann, IVFIndex) and not rag._ann_builds
+    assert index.ids[index.search(normalize(target), 1)[0][0]] == "new"  # caught up after the swap
+    assert index.nbytes > exact_bytes and rag.index_cache.stats()["bytes"] == index.nbytes
+
+
+def test_lazy_load_racing_an_upsert_is_not_cached_stale():
+    from app.services.rag import RAGService
+    from app.services.vector_cache import TenantVectorIndex
+
+    rag = RAGService(None)
+    rows = {"a": [1.0, 0.0]}
+    loads = []
+
+    async def load_index(session, tenant_id):
+        snapshot = dict(rows)
+        loads.append(len(snapshot))
+        await asyncio.sleep(0)
+        if len(loads) == 1:
+            # An upsert commits while the first load is reading; the cache had nothing to update
+            rows["b"] = [0.0, 1.0]
+            rag._kb_versions[tenant_id] = rag.kb_version(tenant_id) + 1
+        return TenantVectorIndex.from_rows(list(snapshot), list(snapshot), list(snapshot.values()), 2)
+
+    rag._load_index = load_index
+    index = asyncio.run(rag._get_index(None, "t"))
+    assert loads == [1, 2] and index.row_of("b") is not None
+    assert rag.index_cache.peek("t") is index
+    assert rag._load_locks == {}  # per-tenant lock dropped once the load is done
+
+
+def test_embedding_codec_roundtrip_zero_copy():
+    from app.services.vector_codec import decode_embedding, encode_embedding
+
+    blob = encode_embedding([0.25, -1.5, 3.0], "models/embedding-001")
+    vec, model = decode_embedding(blob)
+    assert model == "models/embedding-001"
+    assert vec.dtype == np.float32 and vec.tolist() == [0.25, -1.5, 3.0]
+    assert not vec.flags.writeable  # view over the blob, no copy
+    assert encode_embedding([]) is None
+    assert decode_embedding(None)[0].size == 0
+
+
+def test_quantized_index_memory_and_recall():
+    from app.services.vector_cache import TenantVectorIndex, quantization_report
+
+    vectors = _clustered(3000, 64, 30, seed=4)
+    queries = _clustered(40, 64, 30, seed=5)
+    report = quantization_report(vectors, queries, "int8", k=5, rescore_candidates=50)
+    assert report["memory_saved"] >= 0.7
+    assert report["recall@5_rescored"] >= 0.99
+
+    ids = [str(i) for i in range(3000)]
+    index = TenantVectorIndex.from_rows(ids, ids, vectors, dim=64, quantization="float16")
+    assert index.matrix.dtype == np.float16
+    index.upsert(["extra"], ["extra"], [vectors[0] * -1])
+    assert index.ids[index.search(normalize(vectors[0] * -1), 1)[0][0]] == "extra"
+
+
+def test_embedding_codec_quantized_dtypes():
+    from app.services.vector_codec import decode_embedding, encode_embedding
+
+    vec = np.linspace(-1, 1, 16, dtype=np.float32)
+    sizes = {}
+    for dtype in ("float32", "float16", "int8"):
+        blob = encode_embedding(vec, "m", dtype)
+        sizes[dtype] = len(blob)
+        decoded, model = decode_embedding(blob)
+        assert model == "m" and decoded.dtype == np.float32
+        assert np.allclose(decoded, vec, atol=0.01)
+    assert sizes["int8"] < sizes["float16"] < sizes["float32"]
+
+
+def test_tokenize_keeps_skus_and_prices():
+    from app.services.lexical import tokenize
+
+    tokens = tokenize("Harga SKU-123 cuma Rp150.000, tipe X200!")
+    for expected in ("harga", "sku-123", "sku", "123", "rp150.000", "150000", "x200", "200"):
+        assert expected in tokens
+
+
+def test_bm25_incremental_and_rrf():
+    from app.services.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+    bm25 = BM25Index()
+    bm25.upsert(0, "Paket hemat harga 100rb")
+    bm25.upsert(1, "Jam buka toko 09:00")
+    bm25.upsert(2, "Garansi resmi SKU-777")
+    assert [row for row, _ in bm25.search(tokenize("sku 777"), 3)] == [2]
+    bm25.upsert(2, "Garansi resmi")  # replaced text drops old terms
+    assert bm25.search(tokenize("sku 777"), 3) == []
+    assert bm25.search(tokenize("tidak ada"), 3) == []
+
+    fused = reciprocal_rank_fusion([[(1, 0.9), (2, 0.5)], [(2, 7.0), (0, 3.0)]], k=3)
+    assert [row for row, _ in fused] == [2, 1, 0]
+
+
+def test_lexical_fallback_with_zero_embeddings():
+    from app.services.lexical import tokenize
+    from app.services.vector_cache import TenantVectorIndex
+
+    index = TenantVectorIndex.from_rows(
+        ["a", "b"],
+        ["Ongkir gratis", "Harga SKU-9"],
+        [[0.0] * 4, [0.0] * 4],
+        dim=4,
+        texts=["Ongkir\nOngkir gratis", "Harga\nHarga SKU-9"],
+    )
+    hits = index.lexical.search(tokenize("berapa harga sku-9?"), 5)
+    assert [index.contents[row] for row, _ in hits] == ["Harga SKU-9"]
+
+
+def test_query_cache_generation_and_ttl(monkeypatch):
+    from app.services.query_cache import QueryCache
+    from app.utils import cache as cache_module
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    qc = QueryCache(max_entries_per_tenant=8, ttl_seconds=60)
+
+    qc.put_result("t1", "Berapa  harga SKU-9?", ["a", "b"], options=5)
+    assert qc.get_result("t1", "berapa harga sku-9", options=5) == ["a", "b"]
+    assert qc.get_result("t1", "berapa harga sku-9", options=3) is None
+    assert qc.get_result("t2", "berapa harga sku-9", options=5) is None
+
+    qc.bump("t1")  # KB changed: old results must not be served
+    assert qc.get_result("t1", "berapa harga sku-9", options=5) is None
+
+    qc.put_embedding("t1", "ongkir", np.ones(4, dtype=np.float32))
+    qc.put_embedding("t1", "kosong", np.zeros(4, dtype=np.float32))
+    assert qc.get_embedding("t1", "Ongkir?") is not None
+    assert qc.get_embedding("t1", "kosong") is None
+    now[0] += 61
+    assert qc.get_embedding("t1", "ongkir") is None
+    assert qc.stats()["embeddings"]["expirations"] == 1
+
+
+def test_query_result_not_cached_across_a_concurrent_upsert(tmp_path):
+    from app.models.schemas import ChatRequest
+    from app.services.query_cache import QueryCache
+    from app.services.rag import RAGService
+    from app.services.vector_codec import encode_embedding
+
+    rows = [(f"Produk {i}", encode_embedding([float(i + 1), 1.0], "m")) for i in range(3)]
+
+    class SlowClient:
+        model = "m"
+
+        def __init__(self):
+            self.gate = asyncio.Event()
+
+        async def embed(self, texts, priority="chat"):
+            await self.gate.wait()
+            return [[1.0, 1.0] for _ in texts]
+
+    async def scenario():
+        engine, factory = await _kb_engine(tmp_path, rows)
+        client = SlowClient()
+        rag = RAGService(client, query_cache=QueryCache())
+        payload = ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": "produk"}])
+        async with factory() as session:
+            task = asyncio.ensure_future(rag.retrieve(session, payload))
+            await asyncio.sleep(0.01)  # parked in the query embedding
+            rag.query_cache.bump("t")  # an upsert commits meanwhile
+            client.gate.set()
+            assert await task
+            stale = rag.query_cache.stats()["results"]["entries"]
+            await rag.retrieve(session, payload)
+            fresh = rag.query_cache.stats()["results"]["entries"]
+        await engine.dispose()
+        return stale, fresh
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_tag_filter_applied_before_scoring():
+    from app.services.ann import IVFIndex
+    from app.services.lexical import tokenize
+    from app.services.vector_cache import TenantVectorIndex
+
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    ids = [str(i) for i in range(400)]
+    tags = [["promo"] if i % 2 else ["Brand-X"] for i in range(400)]
+    index = TenantVectorIndex.from_rows(ids, ids, vectors, 16, texts=[f"item {i}" for i in ids], tags=tags)
+
+    mask = index.tag_mask(["brand-x"])
+    assert mask.sum() == 200 and not mask[1::2].any()
+    query = normalize(vectors[1])  # an odd (promo) row
+    hits = index.search(query, 5, mask)
+    assert hits and all(row % 2 == 0 for row, _ in hits)
+    assert index.search(query, 5, index.tag_mask(["missing"])) == []
+    assert all(row % 2 == 0 for row, _ in index.lexical.search(tokenize("item 1 item 2"), 5, mask))
+
+    # Re-tagging a row moves it between bitmaps; ANN search honours the mask too
+    index.upsert(["1"], ["1"], [vectors[1]], tags=[["brand-x"]])
+    index.attach_ann(IVFIndex(nlist=8, nprobe=8))
+    hits = index.search(query, 5, index.tag_mask(["BRAND-X"]))
+    assert hits[0][0] == 1 and all(row % 2 == 0 or row == 1 for row, _ in hits)
+
+
+async def _kb_engine(tmp_path, rows):
+    """
+    SQLite KB for tenant "t" seeded with (content, embedding blob) rows.
+    """
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.models.db_models import Base, KnowledgeItemModel, Tenant
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'kb.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Tenant.__table__, KnowledgeItemModel.__table__])
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as session:
+        session.add(Tenant(tenant_id="t", api_key="k", persona={}, sop={}))
+        session.add_all(
+            KnowledgeItemModel(tenant_id="t", title=content, content=content, tags=[], embedding=blob)
+            for content, blob in rows
+        )
+        await session.commit()
+    return engine, factory
+
+
+def test_embedding_outage_does_not_shape_cached_index(tmp_path):
+    from app.models.schemas import ChatRequest
+    from app.services.rag import RAGService
+    from app.services.vector_codec import encode_embedding
+
+    vectors = np.random.default_rng(6).normal(size=(20, 8)).astype(np.float32)
+
+    class FlakyClient:
+        model = "m"
+        down = True
+
+        async def embed(self, texts, priority="chat"):
+            # EmbeddingClient's chat fallback while the provider is down: a short zero vector
+            return [[0.0] * 32 if self.down else vectors[3].tolist() for _ in texts]
+
+    async def scenario():
+        rows = [(f"produk {i}", encode_embedding(vec, "m")) for i, vec in enumerate(vectors)]
+        engine, factory = await _kb_engine(tmp_path, rows)
+        client = FlakyClient()
+        rag = RAGService(client)
+        payload = ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": "info produk"}])
+        async with factory() as session:
+            await rag.retrieve(session, payload)
+            index = rag.index_cache.peek("t")
+            assert index.dim == 8 and index.size == 20  # not dim=32 with every row dropped
+            client.down = False
+            payload.messages[0].content = "katalog"  # new query: no cached embedding or result
+            assert (await rag.retrieve(session, payload))[0] == "produk 3"
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_lexical_fallback_over_real_dimension_kb(tmp_path):
+    from app.models.schemas import ChatRequest
+    from app.services.rag import RAGService
+    from app.services.vector_codec import encode_embedding
+
+    vectors = np.random.default_rng(7).normal(size=(10, 8)).astype(np.float32)
+    rows = [(f"Produk {i}", encode_embedding(vec, "m")) for i, vec in enumerate(vectors)]
+    rows += [
+        ("Harga SKU-9 100rb", encode_embedding(vectors[0], "other-model")),  # not re-embedded yet
+        ("Ongkir gratis Jabodetabek", encode_embedding([0.0] * 32, "m")),  # ingested during an outage
+    ]
+
+    class DownClient:
+        model = "m"
+
+        async def embed(self, texts, priority="chat"):
+            return [[0.0] * 32 for _ in texts]
+
+    async def scenario():
+        engine, factory = await _kb_engine(tmp_path, rows)
+        rag = RAGService(DownClient())
+        payload = ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": "produk 4"}])
+        async with factory() as session:
+            assert (await rag.retrieve(session, payload))[0] == "Produk 4"
+            payload.messages[0].content = "berapa harga sku-9?"
+            assert (await rag.retrieve(session, payload))[0] == "Harga SKU-9 100rb"
+            payload.messages[0].content = "ongkir"
+            assert await rag.retrieve(session, payload) == ["Ongkir gratis Jabodetabek"]
+        await engine.dispose()
+        return rag.index_cache.peek("t")
+
+    index = asyncio.run(scenario())
+    assert index.dim == 8 and index.size == 12
+    # Rows without a comparable vector never rank in vector search
+    assert all(index.contents[row].startswith("Produk") for row, _ in index.search(normalize(vectors[0]), 12) if _)
+
+
+def test_ingest_is_refused_while_embeddings_are_down(tmp_path):
+    import pytest
+    from sqlalchemy import func, select
+
+    from app.adapters.governor import ProviderUnavailableError
+    from app.models.db_models import KnowledgeItemModel
+    from app.models.schemas import ChatRequest, KnowledgeItem
+    from app.services.embeddings import EmbeddingClient, EmbeddingUnavailableError
+    from app.services.rag import RAGService
+    from app.services.vector_codec import encode_embedding
+
+    client = EmbeddingClient(api_key="test", model="m")
+
+    async def circuit_open(*args, **kwargs):
+        raise ProviderUnavailableError("circuit open")
+
+    client.governor.call = circuit_open
+    rows = [(f"Produk {i}", encode_embedding([float(i + 1)] * 8, "m")) for i in range(3)]
+
+    async def scenario():
+        engine, factory = await _kb_engine(tmp_path, rows)
+        rag = RAGService(client)
+        async with factory() as session:
+            # Chat still answers from the lexical index
+            payload = ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": "produk 2"}])
+            assert (await rag.retrieve(session, payload))[0] == "Produk 2"
+            with pytest.raises(EmbeddingUnavailableError):
+                await rag.upsert(session, "t", [KnowledgeItem(title="Baru", content="Produk baru")])
+            count = await session.scalar(select(func.count()).select_from(KnowledgeItemModel))
+        await engine.dispose()
+        return count, rag.kb_version("t")
+
+    assert asyncio.run(scenario()) == (3, 0)  # nothing stored with a zero vector
+
+
+def test_streaming_scan_matches_in_memory_index(tmp_path):
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.models.db_models import Base, KnowledgeItemModel, Tenant
+    from app.models.schemas import ChatRequest, KnowledgeItem
+    from app.services.rag import RAGService
+    from app.services.vector_cache import VectorIndexCache
+    from app.services.vector_codec import encode_embedding
+
+    rng = np.random.default_rng(5)
+    vectors = rng.normal(size=(300, 8)).astype(np.float32)
+
+    class QueryClient:
+        model = "m"
+
+        async def embed(self, texts, priority="chat"):
+            return [vectors[7].tolist() for _ in texts]
+
+    now = [0.0]
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'kb.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[Tenant.__table__, KnowledgeItemModel.__table__])
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with factory() as session:
+            session.add(Tenant(tenant_id="t", api_key="k", persona={}, sop={}))
+            session.add_all(
+                KnowledgeItemModel(
+                    tenant_id="t",
+                    title=f"t{i}",
+                    content=f"c{i}",
+                    tags=["odd"] if i % 2 else [],
+                    embedding=encode_embedding(vec, "m"),
+                )
+                for i, vec in enumerate(vectors)
+            )
+            await session.commit()
+
+        payload = ChatRequest(tenant_id="t", user_id="u", messages=[{"role": "user", "content": "q"}])
+        in_memory = RAGService(QueryClient(), hybrid=False)
+        streaming = RAGService(
+            QueryClient(),
+            hybrid=False,
+            index_cache=VectorIndexCache(max_bytes=4096),
+            stream_block_size=64,
+            clock=lambda: now[0],
+        )
+        async with factory() as session:
+            expected = await in_memory.retrieve(session, payload, top_k=5)
+            got = await streaming.retrieve(session, payload, top_k=5)
+            assert "t" in streaming.streaming_tenants and "t" not in streaming.index_cache
+            assert got == expected and got[0] == "c7"
+            tagged = await streaming.retrieve(session, payload, top_k=5, tags=["ODD"])
+            assert tagged == await in_memory.retrieve(session, payload, top_k=5, tags=["odd"])
+
+            # A KB change re-checks the fit (still too big here)
+            await streaming.upsert(session, "t", [KnowledgeItem(title="baru", content="baru")])
+            assert "t" not in streaming.streaming_tenants
+            await streaming.retrieve(session, payload, top_k=5)
+            assert "t" in streaming.streaming_tenants
+
+            # So does time: once the budget has room the tenant goes back to the in-memory index
+            streaming.index_cache.max_bytes = 64 * 1024 * 1024
+            now[0] += streaming.stream_recheck_seconds
+            assert (await streaming.retrieve(session, payload, top_k=5))[0] in ("c7", "baru")
+            assert "t" not in streaming.streaming_tenants and "t" in streaming.index_cache
+        await engine.dispose()
+
+    asyncio.run(scenario())
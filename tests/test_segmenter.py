@@ -0,0 +1,69 @@
+import pathlib
+import random
+import sys
+import time
+
+# Make project importable when running as script
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.schemas import PersonaSettings  # noqa: E402
+from app.services.post_processing import PostProcessor  # noqa: E402
+from app.services.segmenter import BubbleSegmenter  # noqa: E402
+
+REPLY = (
+    "Halo kak! Terima kasih sudah menghubungi kami 😊 Untuk paket A harganya Rp150.000 per bulan, "
+    "sudah termasuk ongkir ke seluruh Jawa. Apakah kakak mau saya bantu proses pesanannya?\n\n"
+    "Berikut pilihan lainnya:\n- Paket B: Rp200.000\n- Paket C: Rp250.000 🎉\n"
+    "Semua paket bisa dicicil tanpa bunga. Promo ini berlaku sampai akhir bulan ya kak."
+)
+
+
+def _segment(text: str, target: int, chunk_sizes=None) -> list[str]:
+    segmenter = BubbleSegmenter(target)
+    out: list[str] = []
+    pos = 0
+    rng = random.Random(chunk_sizes)
+    while pos < len(text):
+        step = rng.randint(1, 12) if chunk_sizes is not None else len(text)
+        out.extend(segmenter.feed(text[pos : pos + step]))
+        pos += step
+    return out + segmenter.flush()
+
+
+def test_segmenter_cuts_at_sentence_and_paragraph_boundaries():
+    bubbles = _segment(REPLY, 120)
+    assert all(len(b) <= 120 for b in bubbles)
+    assert bubbles[0] == "Halo kak! Terima kasih sudah menghubungi kami 😊"
+    assert bubbles[1].endswith("seluruh Jawa.")
+    assert bubbles[2] == "Apakah kakak mau saya bantu proses pesanannya?"  # paragraph ends the bubble
+    assert bubbles[3] == "Berikut pilihan lainnya:\n- Paket B: Rp200.000\n- Paket C: Rp250.000 🎉"
+    assert " ".join(bubbles).replace("\n", " ").split() == REPLY.split()
+
+
+def test_segmenter_is_chunking_invariant():
+    expected = _segment(REPLY, 90)
+    for seed in range(20):
+        assert _segment(REPLY, 90, chunk_sizes=seed) == expected
+
+
+def test_segmenter_hard_cuts_unbroken_text_and_scales_linearly():
+    assert _segment("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+    text = REPLY * 400  # ~150k chars fed one character at a time
+    segmenter = BubbleSegmenter(280)
+    start = time.perf_counter()
+    count = sum(len(segmenter.feed(ch)) for ch in text) + len(segmenter.flush())
+    assert count > 400 and time.perf_counter() - start < 3.0
+
+
+def test_typing_delay_follows_length_and_persona():
+    processor = PostProcessor(max_bubble_length=120)
+    slow = PersonaSettings(typing_speed_cps=10)
+    fast = PersonaSettings(typing_speed_cps=40)
+    slow_bubbles = processor.split_bubbles(REPLY, slow)
+    fast_bubbles = processor.split_bubbles(REPLY, fast)
+    assert slow_bubbles[0].delay_ms == 0
+    assert slow_bubbles[1].delay_ms == min(4000, int(len(slow_bubbles[1].text) / 10 * 1000))
+    assert all(s.delay_ms >= f.delay_ms for s, f in zip(slow_bubbles, fast_bubbles))
+    assert all(400 <= b.delay_ms <= 4000 for b in fast_bubbles[1:])